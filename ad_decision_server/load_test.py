@@ -0,0 +1,106 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Session initialization load test against a local ad decision server:
+#   python load_test.py --sessions 20000 --concurrency 2000
+# starts server.py on a VMAP_ROOT with generated VMAPs, or, with --port,
+# targets a server that is already running.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from server import VMAP_KEY
+
+BREAK = ('<vmap:AdBreak timeOffset="00:{:02d}:00.000" breakType="linear" breakId="midroll-{}">'
+         '<vmap:AdSource id="midroll-{}-ad-1" allowMultipleAds="false" followRedirects="true">'
+         '<vmap:VASTAdData><VAST version="3.0"><Ad id="{}"><InLine><AdSystem>2.0</AdSystem>'
+         '<AdTitle>midroll-{}-ad-1</AdTitle><Impression><![CDATA[https://example.com/imp?session=[session.id]]]></Impression>'
+         '<Creatives><Creative><Linear><Duration>00:00:15</Duration><MediaFiles>'
+         '<MediaFile id="midroll-{}-ad-1" type="video/mp4" delivery="progressive" width="1920" height="1080">'
+         '<![CDATA[https://example.com/ad-{}.mp4]]></MediaFile></MediaFiles></Linear></Creative></Creatives>'
+         '</InLine></Ad></VAST></vmap:VASTAdData></vmap:AdSource></vmap:AdBreak>')
+
+def write_vmaps(root, assets, breaks):
+    for asset in range(assets):
+        path = os.path.join(root, VMAP_KEY.format('asset-{}'.format(asset)))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as vmap_file:
+            vmap_file.write('<?xml version="1.0" encoding="utf-8"?>'
+                            '<vmap:VMAP xmlns:vmap="http://www.iab.net/videosuite/vmap" version="1.0">')
+            for i in range(1, breaks + 1):
+                vmap_file.write(BREAK.format(i % 60, i, i, i, i, i, i))
+            vmap_file.write('</vmap:VMAP>')
+
+async def client(port, queue, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while True:
+            try:
+                asset, session = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            request = ('GET /assets/asset-{}/vmap/ad_breaks.vmap?session.id={} HTTP/1.1\r\n'
+                       'Host: localhost\r\n\r\n').format(asset, session)
+            start = time.perf_counter()
+            writer.write(request.encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not head.startswith(b'HTTP/1.1 200'):
+                errors.append(head.split(b'\r\n', 1)[0])
+    finally:
+        writer.close()
+
+async def run(port, sessions, concurrency, assets):
+    queue = asyncio.Queue()
+    for session in range(sessions):
+        queue.put_nowait((session % assets, session))
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(port, queue, latencies, errors) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000.0
+    print('sessions: {}, concurrency: {}, errors: {}'.format(len(latencies), concurrency, len(errors)))
+    print('throughput: {:.0f} req/s'.format(len(latencies) / elapsed))
+    print('latency ms: p50 {:.2f}, p90 {:.2f}, p99 {:.2f}, max {:.2f}'.format(
+        percentile(0.50), percentile(0.90), percentile(0.99), latencies[-1] * 1000.0))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, help='port of a running server, one is started otherwise')
+    parser.add_argument('--sessions', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--assets', type=int, default=100)
+    parser.add_argument('--breaks', type=int, default=10)
+    args = parser.parse_args()
+    if args.port:
+        asyncio.run(run(args.port, args.sessions, args.concurrency, args.assets))
+        return
+    with tempfile.TemporaryDirectory() as root:
+        write_vmaps(root, args.assets, args.breaks)
+        port = 18080
+        env = dict(os.environ, VMAP_ROOT=root, PORT=str(port))
+        server = subprocess.Popen([sys.executable, '-u', os.path.join(os.path.dirname(__file__) or '.', 'server.py')],
+                                  env=env, stdout=subprocess.PIPE)
+        try:
+            # Waiting for the server to listen
+            server.stdout.readline()
+            asyncio.run(run(port, args.sessions, args.concurrency, args.assets))
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl
+from xml.sax.saxutils import escape
+
+VMAP_KEY = 'private/assets/{}/vmap/ad_breaks.vmap'
+VMAP_PATH = re.compile(r'^/(?:private/)?assets/([^/]+)/vmap/ad_breaks\.vmap$')
+# Session macros in the document, e.g. [session.id] or [player_params.device].
+# Other bracketed names (like the [ERRORCODE] of VAST error URLs) are left to
+# the player, whatever the query string holds
+MACRO_PREFIXES = ('session', 'player_params', 'avail', 'scte')
+MACRO = re.compile(r'\[((?:{})\.[A-Za-z0-9_.]+)\]'.format('|'.join(MACRO_PREFIXES)))
+CDATA_START = '<![CDATA['
+CDATA_END = ']]>'
+# Entity tags of an If-None-Match header, weak or strong
+ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+MAX_HEADER_SIZE = 16 * 1024
+
+dataplane_bucket = os.environ.get('DATAPLANE_BUCKET', '')
+vmap_root = os.environ.get('VMAP_ROOT', '')
+cache_size = int(os.environ.get('ADS_CACHE_SIZE', 10000))
+document_ttl = float(os.environ.get('ADS_DOCUMENT_TTL_IN_SECONDS', 60))
+port = int(os.environ.get('PORT', 8080))
+workers = int(os.environ.get('ADS_WORKERS', 1))
+
+class VMAPDocument(object):
+    __slots__ = ('parts', 'in_cdata', 'etag', 'source_etag', 'checked')
+
+    def __init__(self, content, source_etag):
+        # Split once around its macros: even parts are static markup and odd
+        # parts are macro names, so a session only joins strings
+        self.parts = MACRO.split(content.decode('utf-8'))
+        # Whether each macro is in a CDATA section, from the last section
+        # start or end in the markup before it
+        self.in_cdata = []
+        in_cdata = False
+        for i in range(0, len(self.parts), 2):
+            start = self.parts[i].rfind(CDATA_START)
+            end = self.parts[i].rfind(CDATA_END)
+            if start >= 0 or end >= 0:
+                in_cdata = start > end
+            if i + 1 < len(self.parts):
+                self.in_cdata.append(in_cdata)
+            self.parts[i] = self.parts[i].encode('utf-8')
+        self.etag = hashlib.md5(content).hexdigest()
+        self.source_etag = source_etag
+        self.checked = time.monotonic()
+
+    def render(self, params):
+        if len(self.parts) == 1:
+            return self.parts[0], self.etag
+        parts = list(self.parts)
+        values = []
+        for i in range(1, len(parts), 2):
+            if parts[i] in params and self.in_cdata[i // 2]:
+                # Character data is taken as is, only a section end has to be split
+                value = params[parts[i]].replace(CDATA_END, ']]' + CDATA_END + CDATA_START + '>')
+            elif parts[i] in params:
+                value = escape(params[parts[i]], {'"': '&quot;'})
+            else:
+                value = '[{}]'.format(parts[i])
+            values.append(value)
+            parts[i] = value.encode('utf-8')
+        # Sessions with the same values share an ETag
+        digest = hashlib.md5('\x00'.join(values).encode('utf-8')).hexdigest()[:16]
+        return b''.join(parts), '{}-{}'.format(self.etag, digest)
+
+class FileSource(object):
+    # Local stand-in for the dataplane bucket, with the same key layout
+    def __init__(self, root):
+        self.root = root
+
+    def fetch(self, asset_id, source_etag=None):
+        path = os.path.join(self.root, VMAP_KEY.format(asset_id))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None, None
+        etag = '{}-{}'.format(stat.st_mtime_ns, stat.st_size)
+        if etag == source_etag:
+            return source_etag, None
+        with open(path, 'rb') as vmap_file:
+            return etag, vmap_file.read()
+
+class S3Source(object):
+    def __init__(self, bucket):
+        import boto3
+        from botocore.exceptions import ClientError
+        self.s3 = boto3.client('s3')
+        self.bucket = bucket
+        self.client_error = ClientError
+
+    def fetch(self, asset_id, source_etag=None):
+        # Returns (etag, content), content is None when the cached document
+        # is still current, and both are None when there is no VMAP
+        params = {'Bucket': self.bucket, 'Key': VMAP_KEY.format(asset_id)}
+        if source_etag is not None:
+            params['IfNoneMatch'] = source_etag
+        try:
+            response = self.s3.get_object(**params)
+        except self.client_error as error:
+            status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            if status == 304:
+                return source_etag, None
+            if status in (403, 404):
+                return None, None
+            raise
+        return response['ETag'], response['Body'].read()
+
+class AdDecisionServer(object):
+    def __init__(self, source, max_size, ttl):
+        self.source = source
+        self.max_size = max_size
+        self.ttl = ttl
+        self.documents = OrderedDict()
+        # Lookups in flight per asset, so concurrent sessions of an asset
+        # that isn't cached share one fetch
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_document(self, asset_id):
+        document = self.documents.get(asset_id)
+        if document is not None:
+            self.documents.move_to_end(asset_id)
+            if time.monotonic() - document.checked < self.ttl:
+                self.hits += 1
+                return document
+        self.misses += 1
+        if asset_id not in self.pending:
+            self.pending[asset_id] = asyncio.ensure_future(self.__load(asset_id, document))
+        return await asyncio.shield(self.pending[asset_id])
+
+    async def __load(self, asset_id, document):
+        try:
+            source_etag = document.source_etag if document is not None else None
+            loop = asyncio.get_running_loop()
+            try:
+                etag, content = await loop.run_in_executor(None, self.source.fetch, asset_id, source_etag)
+            except Exception as exception:
+                if document is None:
+                    raise
+                # Serving the cached document when it can't be revalidated
+                print('Unable to revalidate VMAP for asset {}: {}'.format(asset_id, exception))
+                document.checked = time.monotonic()
+                return document
+            if etag is None:
+                self.documents.pop(asset_id, None)
+                return None
+            if content is not None:
+                document = VMAPDocument(content, etag)
+            document.checked = time.monotonic()
+            self.documents[asset_id] = document
+            self.documents.move_to_end(asset_id)
+            # Evicting the least recently used documents
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+            return document
+        finally:
+            del self.pending[asset_id]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.__respond(writer, 431, close=True)
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.__respond(writer, 400, close=True)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                await self.__serve(writer, method, target, headers, close)
+                if close:
+                    break
+        finally:
+            writer.close()
+
+    async def __serve(self, writer, method, target, headers, close):
+        if method not in ('GET', 'HEAD'):
+            return await self.__respond(writer, 405, close=close)
+        url = urlsplit(target)
+        match = VMAP_PATH.match(url.path)
+        if match is None:
+            return await self.__respond(writer, 404, close=close)
+        try:
+            document = await self.get_document(match.group(1))
+        except Exception as exception:
+            print('Unable to get VMAP for asset {}: {}'.format(match.group(1), exception))
+            return await self.__respond(writer, 502, close=close)
+        if document is None:
+            return await self.__respond(writer, 404, close=close)
+        body, etag = document.render(dict(parse_qsl(url.query)))
+        etag = '"{}"'.format(etag)
+        if 'if-none-match' in headers and etag_matches(headers['if-none-match'], etag):
+            return await self.__respond(writer, 304, etag=etag, close=close)
+        await self.__respond(writer, 200, body, etag, close, send_body=method == 'GET')
+
+    async def __respond(self, writer, status, body=b'', etag=None, close=False, send_body=True):
+        head = ['HTTP/1.1 {} {}'.format(status, STATUS_REASONS[status])]
+        if status == 200:
+            head.append('Content-Type: application/xml')
+            head.append('Cache-Control: private, max-age=0')
+        if etag is not None:
+            head.append('ETag: {}'.format(etag))
+        head.append('Content-Length: {}'.format(len(body) if status != 304 else 0))
+        if close:
+            head.append('Connection: close')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if send_body and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+def etag_matches(if_none_match, etag):
+    # Weak comparison, as If-None-Match uses: W/ prefixes are ignored
+    if if_none_match.strip() == '*':
+        return True
+    return etag in ENTITY_TAG.findall(if_none_match)
+
+STATUS_REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    431: 'Request Header Fields Too Large',
+    502: 'Bad Gateway'
+}
+
+def create_source():
+    if vmap_root:
+        return FileSource(vmap_root)
+    if dataplane_bucket:
+        return S3Source(dataplane_bucket)
+    raise Exception('Either VMAP_ROOT or DATAPLANE_BUCKET must be set')
+
+async def serve(host='0.0.0.0', port=port, source=None):
+    server = AdDecisionServer(source or create_source(), cache_size, document_ttl)
+    listener = await asyncio.start_server(
+        server.handle, host, port, limit=MAX_HEADER_SIZE, backlog=4096, reuse_port=workers > 1)
+    print('Ad decision server listening on {}:{}'.format(host, port))
+    return server, listener
+
+async def main():
+    server, listener = await serve()
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == '__main__':
+    # One event loop per worker process, all accepting on the same port
+    for _ in range(workers - 1):
+        if os.fork() == 0:
+            break
+    asyncio.run(main())
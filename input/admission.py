@@ -0,0 +1,373 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Admission of workflow starts: the input function enqueues them and the
+# dispatcher releases them at a bounded rate, under a ceiling of workflows in
+# flight, so an upload burst doesn't exceed the MediaConvert and Rekognition
+# limits of the account.
+#   python admission.py --uploads 200 [--fifo]
+# simulates a burst of short and long-form uploads against in-memory queues.
+
+import json
+import time
+import datetime
+import itertools
+from collections import deque
+
+class InMemoryQueue(object):
+    # Local stand-in for the admission queue, with the same semantics as SQS:
+    # received messages stay hidden until they are deleted or released, and
+    # count their receives (ApproximateReceiveCount)
+    def __init__(self, clock=time.time):
+        self.visible = deque()
+        self.hidden = {}
+        self.ids = itertools.count()
+        self.clock = clock
+
+    def send(self, body):
+        message_id = str(next(self.ids))
+        self.visible.append({'Id': message_id, 'Body': body, 'SentAt': self.clock()})
+        return message_id
+
+    def receive(self, max_messages, wait_seconds=0):
+        messages = []
+        while self.visible and len(messages) < max_messages:
+            message = self.visible.popleft()
+            message['ReceiveCount'] = message.get('ReceiveCount', 0) + 1
+            self.hidden[message['Id']] = message
+            messages.append(message)
+        return messages
+
+    def delete(self, message):
+        self.hidden.pop(message['Id'], None)
+
+    def release(self, message):
+        # Back at the head of the queue, like an expired visibility timeout
+        if self.hidden.pop(message['Id'], None) is not None:
+            self.visible.appendleft(message)
+
+    def depth(self):
+        return len(self.visible) + len(self.hidden)
+
+    def oldest_age(self):
+        # Seconds the oldest waiting message has been in the queue
+        now = self.clock()
+        return max([now - message['SentAt'] for message in self.visible] or [0.0])
+
+class SQSQueue(object):
+    def __init__(self, sqs, url, cloudwatch=None):
+        # Without a CloudWatch client the age of the messages is unknown (0)
+        self.sqs = sqs
+        self.url = url
+        self.cloudwatch = cloudwatch
+
+    def send(self, body):
+        return self.sqs.send_message(QueueUrl=self.url, MessageBody=body)['MessageId']
+
+    def receive(self, max_messages, wait_seconds=0):
+        response = self.sqs.receive_message(
+            QueueUrl=self.url,
+            MaxNumberOfMessages=min(10, max_messages),
+            WaitTimeSeconds=wait_seconds
+        )
+        return [{'Id': message['ReceiptHandle'], 'Body': message['Body']}
+                for message in response.get('Messages', [])]
+
+    def delete(self, message):
+        self.sqs.delete_message(QueueUrl=self.url, ReceiptHandle=message['Id'])
+
+    def release(self, message):
+        self.sqs.change_message_visibility(QueueUrl=self.url, ReceiptHandle=message['Id'], VisibilityTimeout=0)
+
+    def depth(self):
+        attributes = self.sqs.get_queue_attributes(
+            QueueUrl=self.url,
+            AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible']
+        )['Attributes']
+        return int(attributes['ApproximateNumberOfMessages']) + int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+    def oldest_age(self):
+        # ApproximateAgeOfOldestMessage is only published to CloudWatch (every
+        # minute), reading the messages would count towards the dead-letter queue
+        if self.cloudwatch is None:
+            return 0.0
+        now = datetime.datetime.utcnow()
+        datapoints = self.cloudwatch.get_metric_statistics(
+            Namespace='AWS/SQS',
+            MetricName='ApproximateAgeOfOldestMessage',
+            Dimensions=[{'Name': 'QueueName', 'Value': self.url.rstrip('/').rsplit('/', 1)[-1]}],
+            StartTime=now - datetime.timedelta(minutes=5),
+            EndTime=now,
+            Period=60,
+            Statistics=['Maximum']
+        )['Datapoints']
+        if not datapoints:
+            return 0.0
+        return float(max(datapoints, key=lambda datapoint: datapoint['Timestamp'])['Maximum'])
+
+class Lane(object):
+    # A queue of workflow starts with its own budget of workflows in flight.
+    # Assets go to the first lane whose limits they are within, the last lane
+    # takes the rest; a lane whose oldest start has waited over aging_seconds
+    # goes ahead of the others, so a busy fast lane can't starve it
+    def __init__(self, name, queue, max_in_flight=0, max_seconds=None, max_bytes=None, aging_seconds=0):
+        self.name = name
+        self.queue = queue
+        self.max_in_flight = max_in_flight
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.aging_seconds = aging_seconds
+        self.counted = 0
+        self.started = 0
+        self.aged = False
+
+    def admits(self, duration, size):
+        # The probed duration decides when there is one, the size otherwise
+        if duration is not None and self.max_seconds is not None:
+            return duration <= self.max_seconds
+        if size is not None and self.max_bytes is not None:
+            return size <= self.max_bytes
+        return self.max_seconds is None and self.max_bytes is None
+
+def create_lanes(config, create_queue):
+    # config is a list of {Name, QueueUrl, MaxInFlight, MaxSeconds, MaxBytes, AgingSeconds}
+    return [Lane(
+        lane['Name'],
+        create_queue(lane['QueueUrl']),
+        max_in_flight=int(lane.get('MaxInFlight', 0)),
+        max_seconds=lane.get('MaxSeconds'),
+        max_bytes=lane.get('MaxBytes'),
+        aging_seconds=float(lane.get('AgingSeconds', 0))
+    ) for lane in config]
+
+def choose_lane(lanes, duration=None, size=None):
+    for lane in lanes[:-1]:
+        if lane.admits(duration, size):
+            return lane
+    return lanes[-1]
+
+def enqueue(lane, bucket, key, duration=None, size=None, clock=time.time, metadata=None):
+    # metadata is passed on to the workflow when it's started
+    body = json.dumps({
+        'S3Bucket': bucket,
+        'S3Key': key,
+        'Lane': lane.name,
+        'DurationInSeconds': duration,
+        'SizeInBytes': size,
+        'MetaData': metadata or {},
+        'EnqueuedAt': clock()
+    })
+    return {'Queued': lane.queue.send(body), 'Lane': lane.name}
+
+class TokenBucket(object):
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        if not rate > 0:
+            raise ValueError('Workflow start rate must be positive: {}'.format(rate))
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def acquire(self, deadline, count=1):
+        # Waits for a token and takes up to count of the available ones.
+        # Returns how many were taken, 0 when none is available before the deadline
+        while True:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                taken = min(count, int(self.tokens))
+                self.tokens -= taken
+                return taken
+            wait = (1.0 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return 0
+            self.sleep(wait)
+
+    def refund(self, count):
+        self.tokens = min(self.burst, self.tokens + count)
+
+class Dispatcher(object):
+    def __init__(self, lanes, start, in_flight, rate, burst, max_in_flight,
+                 poll_seconds=5, clock=time.monotonic, wall_clock=time.time, sleep=time.sleep):
+        # start(bucket, key, lane, metadata) releases one workflow and in_flight() counts
+        # the workflows running per lane name (None for unknown lanes, which
+        # count against the last lane); a max_in_flight of 0 disables a ceiling
+        self.lanes = lanes
+        self.start = start
+        self.in_flight = in_flight
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.max_in_flight = max_in_flight
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.sleep = sleep
+
+    def dispatch(self, seconds):
+        deadline = self.clock() + seconds
+        stats = {lane.name: {'DepthBefore': lane.queue.depth(), 'Started': 0, 'Failed': 0, 'Waits': []}
+                 for lane in self.lanes}
+        refresh = True
+        stopped = False
+        while not stopped and self.clock() < deadline:
+            if refresh:
+                self.__count()
+                refresh = False
+            served = False
+            blocked = False
+            # Lanes with aged starts first, then in their configured order
+            for lane in sorted(self.lanes, key=lambda lane: not lane.aged):
+                capacity = self.__capacity(lane)
+                if capacity <= 0:
+                    blocked = blocked or lane.queue.depth() > 0
+                    continue
+                # Only as many messages as can be started right away are
+                # received: each receive counts towards the dead-letter queue
+                tokens = self.bucket.acquire(deadline, capacity)
+                if not tokens:
+                    stopped = True
+                    break
+                messages = lane.queue.receive(tokens, wait_seconds=0)
+                self.bucket.refund(tokens - len(messages))
+                if not messages:
+                    lane.aged = False
+                    continue
+                released = 0
+                for message in messages:
+                    if not self.__release(lane, message, stats[lane.name]):
+                        self.bucket.refund(len(messages) - released - 1)
+                        stopped = True
+                        break
+                    released += 1
+                # Back in their order at the head of the queue
+                for message in reversed(messages[released:]):
+                    lane.queue.release(message)
+                served = True
+                # Ordering the lanes again after every batch
+                break
+            if not served and not stopped:
+                if not blocked or self.clock() + self.poll_seconds > deadline:
+                    break
+                # Waiting for running workflows to finish
+                self.sleep(self.poll_seconds)
+                refresh = True
+        for lane in self.lanes:
+            lane_stats = stats[lane.name]
+            lane_stats['DepthAfter'] = lane.queue.depth()
+            waits = sorted(lane_stats.pop('Waits'))
+            lane_stats['WaitP50'] = waits[len(waits) // 2] if waits else 0.0
+            lane_stats['WaitP95'] = waits[min(len(waits) - 1, len(waits) * 95 // 100)] if waits else 0.0
+            lane_stats['WaitMax'] = waits[-1] if waits else 0.0
+            print('Admission lane {}: queue depth {DepthBefore} -> {DepthAfter}, started {Started}, failed {Failed}, '
+                  'wait p50 {WaitP50:.1f}s, p95 {WaitP95:.1f}s, max {WaitMax:.1f}s'.format(lane.name, **lane_stats))
+        return stats
+
+    def __count(self):
+        # Aging from the queues themselves, so it holds across dispatches and
+        # before the lane has started anything
+        for lane in self.lanes:
+            lane.aged = bool(lane.aging_seconds) and lane.queue.oldest_age() >= lane.aging_seconds
+        # Asynchronous starts take a moment to be listed, so the workflows
+        # started since the last count are added to it until it's refreshed
+        counts = self.in_flight() if self.max_in_flight or any(lane.max_in_flight for lane in self.lanes) else {}
+        for lane in self.lanes:
+            lane.counted = counts.get(lane.name, 0)
+            lane.started = 0
+        self.lanes[-1].counted += sum(count for name, count in counts.items()
+                                      if name not in [lane.name for lane in self.lanes])
+
+    def __capacity(self, lane):
+        capacity = 10
+        if self.max_in_flight:
+            capacity = min(capacity, self.max_in_flight - sum(other.counted + other.started for other in self.lanes))
+        if lane.max_in_flight:
+            capacity = min(capacity, lane.max_in_flight - lane.counted - lane.started)
+        return capacity
+
+    def __release(self, lane, message, stats):
+        body = json.loads(message['Body'])
+        try:
+            self.start(body['S3Bucket'], body['S3Key'], lane.name, body.get('MetaData', {}))
+        except Exception as exception:
+            # Retried on a later dispatch, and dead-lettered by the queue eventually
+            print('Unable to start workflow for {}: {}'.format(body['S3Key'], exception))
+            stats['Failed'] += 1
+            return False
+        lane.queue.delete(message)
+        lane.started += 1
+        wait = self.wall_clock() - body['EnqueuedAt']
+        stats['Waits'].append(wait)
+        stats['Started'] += 1
+        print('Started workflow for {} after {:.1f}s in lane {}'.format(body['S3Key'], wait, lane.name))
+        return True
+
+def main():
+    import random
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uploads', type=int, default=200)
+    parser.add_argument('--long-form', type=float, default=0.2, help='share of feature length uploads')
+    parser.add_argument('--rate', type=float, default=0.2, help='workflow starts per second')
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--max-in-flight', type=int, default=10)
+    parser.add_argument('--fifo', action='store_true', help='a single lane, in arrival order')
+    parser.add_argument('--dispatch-seconds', type=float, default=50.0)
+    args = parser.parse_args()
+
+    # Simulated clock, so the burst runs in no time
+    now = [0.0]
+    def clock():
+        return now[0]
+    def sleep(seconds):
+        now[0] += seconds
+    def processing_seconds(duration):
+        return 120.0 + duration * 0.5
+
+    if args.fifo:
+        lanes = [Lane('default', InMemoryQueue(clock))]
+    else:
+        short_budget = max(1, args.max_in_flight * 6 // 10)
+        lanes = [
+            Lane('short', InMemoryQueue(clock), max_in_flight=short_budget, max_seconds=600),
+            Lane('bulk', InMemoryQueue(clock), max_in_flight=max(1, args.max_in_flight - short_budget), aging_seconds=3600)
+        ]
+    random.seed(0)
+    durations = {}
+    for i in range(args.uploads):
+        duration = random.uniform(3600, 9000) if random.random() < args.long_form else random.uniform(15, 300)
+        key = 'upload-{}.mp4'.format(i)
+        durations[key] = duration
+        enqueue(choose_lane(lanes, duration), 'input', key, duration, clock=clock)
+
+    running = {}
+    done = {}
+    def in_flight():
+        counts = {}
+        for key, (lane, end) in list(running.items()):
+            if end <= now[0]:
+                done[key] = end
+                del running[key]
+            else:
+                counts[lane] = counts.get(lane, 0) + 1
+        return counts
+    def start(bucket, key, lane, metadata):
+        running[key] = (lane, now[0] + processing_seconds(durations[key]))
+
+    dispatcher = Dispatcher(lanes, start, in_flight, args.rate, args.burst, args.max_in_flight,
+                            clock=clock, wall_clock=clock, sleep=sleep)
+    while any(lane.queue.depth() for lane in lanes) or running:
+        begin = now[0]
+        dispatcher.dispatch(args.dispatch_seconds)
+        # Next scheduled dispatch
+        now[0] = max(now[0], begin + 60.0)
+        in_flight()
+    for name, short in (('short-form', True), ('long-form', False)):
+        times = sorted(end for key, end in done.items() if (durations[key] <= 600) == short)
+        if times:
+            print('{} time to VMAP: p50 {:.0f}s, p95 {:.0f}s, max {:.0f}s ({} uploads)'.format(
+                name, times[len(times) // 2], times[min(len(times) - 1, len(times) * 95 // 100)], times[-1], len(times)))
+
+if __name__ == '__main__':
+    main()
@@ -3,74 +3,140 @@
 
 import os
 import json
-import time
-import uuid
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+from multipart_copy import copy_object, MB
+from admission import create_lanes, choose_lane, enqueue, SQSQueue
+from probe import probe_duration
+from dedupe import DedupeIndex, DynamoDBStore, fingerprint
+from workflow import start_workflow
 
 workflow_name = os.environ["WORKFLOW_NAME"]
 workflow_function = os.environ["WorkflowEndpoint"]
 dataplane_bucket = os.environ["DATAPLANE_BUCKET"]
+ingest_max_workers = int(os.environ.get("INGEST_MAX_WORKERS", 8))
+copy_multipart_threshold = int(os.environ.get("COPY_MULTIPART_THRESHOLD_IN_MB", 1024)) * MB
+copy_part_size = int(os.environ.get("COPY_PART_SIZE_IN_MB", 256)) * MB
+copy_max_workers = int(os.environ.get("COPY_MAX_WORKERS", 16))
+copy_max_attempts = int(os.environ.get("COPY_MAX_ATTEMPTS", 5))
+# Workflows are started directly when there is no admission queue
+admission_queue_url = os.environ.get("ADMISSION_QUEUE_URL", "")
+# Priority lanes (JSON list), a single lane on the admission queue otherwise
+priority_lanes = json.loads(os.environ.get("PRIORITY_LANES", "[]")) or \
+    ([{"Name": "default", "QueueUrl": admission_queue_url}] if admission_queue_url else [])
+probe_durations = os.environ.get("PROBE_DURATION", "true").lower() == "true"
+# Uploads of content already processed reuse its outputs when there is a dedupe table
+dedupe_table = os.environ.get("DEDUPE_TABLE", "")
+# Uploads whose source content has no asset after this long (a failed workflow) take its place
+dedupe_pending_timeout = int(os.environ.get("DEDUPE_PENDING_TIMEOUT_IN_SECONDS", 86400))
 
 lambda_client = boto3.client('lambda')
-s3_client = boto3.client('s3')
+# Enough connections for the part copies of every record ingested at once
+s3_client = boto3.client('s3', config=Config(max_pool_connections=ingest_max_workers * copy_max_workers))
+sqs_client = boto3.client('sqs')
+lanes = create_lanes(priority_lanes, lambda url: SQSQueue(sqs_client, url))
+dedupe_index = DedupeIndex(
+    DynamoDBStore(boto3.resource('dynamodb').Table(dedupe_table)),
+    s3_client,
+    dataplane_bucket,
+    pending_seconds=dedupe_pending_timeout
+) if dedupe_table else None
 
 def lambda_handler(event, context):
     print(event)
-    bucket_name = event['Records'][0]['s3']['bucket']['name']
-    object_key = event['Records'][0]['s3']['object']['key']
+    records = event.get('Records', [])
+    # Ingesting every record of the notification concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(ingest_max_workers, len(records)))) as executor:
+        results = list(executor.map(__ingest_record, records))
+    failed = [result for result in results if result['Status'] == 'Failed']
+    duplicates = sum(1 for result in results if result['Status'] in ('Duplicate', 'Pending'))
+    print('Ingested {} of {} records ({} duplicates)'.format(len(results) - len(failed), len(results), duplicates))
+    for result in failed:
+        print('Unable to ingest s3://{}/{}: {}'.format(result['Bucket'], result['Key'], result['Error']))
+    if failed and len(failed) == len(results):
+        # Retried by Lambda, then sent to the failure destination
+        raise Exception('Unable to ingest {} records: {}'.format(
+            len(failed), ', '.join(result['Key'] for result in failed)))
+    if failed:
+        # Retrying the whole notification would ingest the other records again
+        failed_records = [record for record, result in zip(records, results) if result['Status'] == 'Failed']
+        __retry_records(failed_records, context)
+    return {'Records': results}
 
-    # Copy object to Dataplane bucket
-    s3_client.copy_object(
-        Bucket=dataplane_bucket,
-        CopySource={
-            'Bucket': bucket_name,
-            'Key': object_key
-        },
-        Key=object_key,
+def __retry_records(records, context):
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=bytes(json.dumps({'Records': records}), encoding='utf-8')
     )
+    print('Retrying {} records in a new invocation'.format(len(records)))
 
-    # Workflow input body
-    body = {
-        "Name": workflow_name,
-        "Input":{
-            "Media":{
-                "Video":{
-                    "S3Bucket": dataplane_bucket,
-                    "S3Key": object_key
-                }
-            }
-        }
-    }
-
-    # Lambda request (with Chalice/API Gateway attributes)
-    request = {
-        "resource": "/workflow/execution",
-        "path": "/workflow/execution",
-        "httpMethod": "POST",
-        "headers": {
-            'Content-Type': 'application/json'
-        },
-        "multiValueHeaders": {},
-        "queryStringParameters": {},
-        "multiValueQueryStringParameters": {},
-        "pathParameters": {},
-        "stageVariables": {},
-        "requestContext": {
-            'resourcePath': "/workflow/execution",
-            'requestTime': time.time(),
-            'httpMethod': 'POST',
-            'requestId': 'lambda_' + str(uuid.uuid4()).split('-')[-1],
-        },
-        "body": json.dumps(body),
-        "isBase64Encoded": False
-    }
+def __ingest_record(record):
+    bucket_name = record['s3']['bucket']['name']
+    # Object keys are URL-encoded in S3 notifications
+    object_key = unquote_plus(record['s3']['object']['key'])
+    result = {'Bucket': bucket_name, 'Key': object_key}
+    try:
+        source = s3_client.head_object(Bucket=bucket_name, Key=object_key, ChecksumMode='ENABLED')
+        metadata = {}
+        if dedupe_index is not None:
+            result['Fingerprint'] = fingerprint(source)
+            found = dedupe_index.find(result['Fingerprint'], object_key)
+            if found['Status'] == 'Duplicate':
+                # Same content as an asset already processed, no copy nor workflow
+                result['AssetId'] = dedupe_index.reuse(found['AssetId'], object_key)
+                result['Status'] = 'Duplicate'
+                print('{} is a duplicate of asset {}'.format(object_key, found['AssetId']))
+                return result
+            if found['Status'] == 'Pending':
+                # Linked to the asset by the workflow already processing the same content
+                result['SourceKey'] = found['SourceKey']
+                result['Status'] = 'Pending'
+                print('{} is a duplicate of {}, waiting for its workflow'.format(object_key, found['SourceKey']))
+                return result
+            # The workflow links the duplicates that wait for it
+            metadata['Fingerprint'] = result['Fingerprint']
+        result['Copy'] = __copy_to_dataplane(bucket_name, object_key, source)
+        result['Workflow'] = __start_workflow(object_key, result['Copy']['Size'], metadata)
+        result['Status'] = 'Success'
+    except Exception as exception:
+        result['Status'] = 'Failed'
+        result['Error'] = str(exception)
+    return result
 
-    # Invoke Workflow lambda function
-    response = lambda_client.invoke(
-        FunctionName=workflow_function,
-        InvocationType='RequestResponse',
-        LogType='None',
-        Payload=bytes(json.dumps(request), encoding='utf-8')
+def __copy_to_dataplane(bucket_name, object_key, source):
+    # Copy object to Dataplane bucket (in parallel parts for large objects)
+    return copy_object(
+        s3_client,
+        bucket_name,
+        object_key,
+        dataplane_bucket,
+        object_key,
+        threshold=copy_multipart_threshold,
+        part_size=copy_part_size,
+        max_workers=copy_max_workers,
+        max_attempts=copy_max_attempts,
+        source=source
     )
-    print(response)
-    print(json.loads(response['Payload'].read()))
+
+def __start_workflow(object_key, size, metadata):
+    if lanes:
+        # Released by the dispatcher, at the admitted rate of the asset's lane
+        duration = __probe_duration(object_key, size) if len(lanes) > 1 else None
+        return enqueue(choose_lane(lanes, duration, size), dataplane_bucket, object_key, duration, size,
+                       metadata=metadata)
+    return start_workflow(lambda_client, workflow_function, workflow_name, dataplane_bucket, object_key,
+                          metadata=metadata)
+
+def __probe_duration(object_key, size):
+    if not probe_durations:
+        return None
+    try:
+        return probe_duration(s3_client, dataplane_bucket, object_key, size)
+    except Exception as exception:
+        # Lanes fall back to the object size
+        print('Unable to probe duration of {}: {}'.format(object_key, exception))
+        return None
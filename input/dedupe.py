@@ -0,0 +1,173 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Ingest-time deduplication: uploads are fingerprinted by checksum (or ETag)
+# and size, and an upload already processed under another key reuses the
+# outputs of its asset instead of starting a workflow.
+#
+# Items of the index:
+#   {'Id': <fingerprint>, 'SourceKey': <dataplane key of the upload processed for it>, 'ClaimedAt': <epoch seconds>,
+#    'Waiting': <set of the keys of duplicates uploaded while it was processed>}
+#   {'Id': 'key:<dataplane key>', 'AssetId': <asset id>}
+# The first is created once per content, and its source is only replaced when
+# it failed or lost its outputs. The second is written when the workflow of the
+# upload completes, for the upload and the duplicates waiting for it (by the
+# VMAP generation operator, from the IngestKey and Fingerprint of the workflow
+# metadata), or by a duplicate linked to it.
+#
+# Outputs are addressed by asset id (private/assets/<asset id>/, the asset_id
+# player parameter of MediaTailor), so a key linked to an asset resolves to
+# all of its outputs: HLS, proxy, loudness, slots and VMAP.
+
+import time
+import threading
+
+VMAP_KEY = 'private/assets/{}/vmap/ad_breaks.vmap'
+
+class LocalStore(object):
+    # Local stand-in for the DynamoDB table, with the same conditional writes
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, item_id):
+        item = self.items.get(item_id)
+        return dict(item) if item is not None else None
+
+    def put(self, item):
+        self.items[item['Id']] = dict(item)
+
+    def create(self, item):
+        # False when there is already an item with the id
+        with self.lock:
+            if item['Id'] in self.items:
+                return False
+            self.items[item['Id']] = dict(item)
+            return True
+
+    def replace(self, item, source_key):
+        # False when the source of the item changed since it was read, the
+        # attributes that aren't in the item are kept
+        with self.lock:
+            current = self.items.get(item['Id'])
+            if current is None or current.get('SourceKey') != source_key:
+                return False
+            current.update(item)
+            return True
+
+    def add_waiting(self, item_id, key):
+        with self.lock:
+            item = self.items[item_id]
+            item['Waiting'] = item.get('Waiting', set()) | {key}
+            return dict(item)
+
+class DynamoDBStore(object):
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, item_id):
+        return self.table.get_item(Key={'Id': item_id}, ConsistentRead=True).get('Item')
+
+    def put(self, item):
+        self.table.put_item(Item=item)
+
+    def create(self, item):
+        try:
+            self.table.put_item(Item=item, ConditionExpression='attribute_not_exists(Id)')
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def replace(self, item, source_key):
+        try:
+            self.table.update_item(
+                Key={'Id': item['Id']},
+                UpdateExpression='SET SourceKey = :key, ClaimedAt = :claimed_at',
+                ConditionExpression='SourceKey = :source_key',
+                ExpressionAttributeValues={
+                    ':key': item['SourceKey'],
+                    ':claimed_at': item['ClaimedAt'],
+                    ':source_key': source_key
+                }
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def add_waiting(self, item_id, key):
+        return self.table.update_item(
+            Key={'Id': item_id},
+            UpdateExpression='ADD Waiting :keys',
+            ExpressionAttributeValues={':keys': {key}},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+
+def fingerprint(head):
+    # A full object SHA-256 when the upload has one, the ETag otherwise. Both
+    # depend on the part size of multipart uploads, so the same content
+    # uploaded differently is a miss, never a false match
+    checksum = head.get('ChecksumSHA256')
+    if checksum:
+        return 'sha256:{}:{}'.format(checksum, head['ContentLength'])
+    return 'etag:{}:{}'.format(head['ETag'].strip('"'), head['ContentLength'])
+
+class DedupeIndex(object):
+    def __init__(self, store, s3, bucket, pending_seconds=86400, clock=time.time):
+        # A source without an asset after pending_seconds is taken as failed
+        self.store = store
+        self.s3 = s3
+        self.bucket = bucket
+        self.pending_seconds = pending_seconds
+        self.clock = clock
+
+    def find(self, fingerprint, key):
+        # {'Status': 'New'} when this upload needs a workflow of its own,
+        # 'Duplicate' with the AssetId processed for the same content, or
+        # 'Pending' with the SourceKey whose workflow will link this upload
+        claim = {'Id': fingerprint, 'SourceKey': key, 'ClaimedAt': int(self.clock())}
+        if self.store.create(claim):
+            # New content, this upload is its source
+            return {'Status': 'New'}
+        item = self.store.get(fingerprint)
+        source = self.store.get('key:' + item['SourceKey'])
+        if source is not None and self.__has_outputs(source['AssetId']):
+            return {'Status': 'Duplicate', 'AssetId': source['AssetId']}
+        pending = source is None and self.clock() - int(item.get('ClaimedAt', 0)) < self.pending_seconds
+        # The workflow of the source failed or its outputs are gone: this
+        # upload becomes the source, unless another one did first
+        if not pending and self.store.replace(claim, item['SourceKey']):
+            print('{} replaces {} as the source of its content'.format(key, item['SourceKey']))
+            return {'Status': 'New'}
+        # Still being processed: no second workflow, the upload is linked to
+        # the asset when the workflow of the source completes
+        item = self.store.add_waiting(fingerprint, key)
+        # Unless it completed before the upload was added to the waiting ones
+        asset_id = self.__asset(item['SourceKey'])
+        if asset_id is not None:
+            return {'Status': 'Duplicate', 'AssetId': asset_id}
+        return {'Status': 'Pending', 'SourceKey': item['SourceKey']}
+
+    def reuse(self, asset_id, key):
+        # Links the key to the asset, whose outputs it resolves to
+        self.store.put({'Id': 'key:' + key, 'AssetId': asset_id})
+        return asset_id
+
+    def resolve(self, key):
+        # Asset id of the uploaded key, None until its workflow completes
+        item = self.store.get('key:' + key)
+        return item['AssetId'] if item is not None else None
+
+    def __asset(self, key):
+        # Asset of the key when its outputs are available
+        item = self.store.get('key:' + key)
+        if item is not None and self.__has_outputs(item['AssetId']):
+            return item['AssetId']
+        return None
+
+    def __has_outputs(self, asset_id):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=VMAP_KEY.format(asset_id))
+        except Exception as exception:
+            print('Outputs of asset {} are not available: {}'.format(asset_id, exception))
+            return False
+        return True
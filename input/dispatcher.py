@@ -0,0 +1,44 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import boto3
+
+from admission import Dispatcher, SQSQueue, create_lanes
+from workflow import start_workflow, count_in_flight
+
+workflow_name = os.environ["WORKFLOW_NAME"]
+workflow_function = os.environ["WorkflowEndpoint"]
+admission_queue_url = os.environ.get("ADMISSION_QUEUE_URL", "")
+# Priority lanes (JSON list), a single lane on the admission queue otherwise
+priority_lanes = json.loads(os.environ.get("PRIORITY_LANES", "[]")) or \
+    [{"Name": "default", "QueueUrl": admission_queue_url}]
+start_rate = float(os.environ.get("WORKFLOW_START_RATE_PER_SECOND", 0.2))
+start_burst = int(os.environ.get("WORKFLOW_START_BURST", 5))
+max_in_flight = int(os.environ.get("WORKFLOW_MAX_IN_FLIGHT", 10))
+# Time left to the next scheduled dispatch
+dispatch_seconds = float(os.environ.get("DISPATCH_SECONDS", 50))
+
+lambda_client = boto3.client('lambda')
+sqs_client = boto3.client('sqs')
+cloudwatch_client = boto3.client('cloudwatch')
+
+def lambda_handler(event, context):
+    dispatcher = Dispatcher(
+        create_lanes(priority_lanes, lambda url: SQSQueue(sqs_client, url, cloudwatch_client)),
+        __start_workflow,
+        __count_in_flight,
+        start_rate,
+        start_burst,
+        max_in_flight
+    )
+    return dispatcher.dispatch(dispatch_seconds)
+
+def __start_workflow(bucket, key, lane, metadata):
+    # Fire and forget, the dispatcher only paces the starts
+    return start_workflow(lambda_client, workflow_function, workflow_name, bucket, key,
+                          invocation_type='Event', lane=lane, metadata=metadata)
+
+def __count_in_flight():
+    return count_in_flight(lambda_client, workflow_function, workflow_name)
@@ -0,0 +1,78 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1024 * 1024
+# S3 multipart limits
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10000
+
+def copy_object(s3, source_bucket, source_key, bucket, key, threshold=1024 * MB, part_size=256 * MB,
+                max_workers=16, max_attempts=5, source=None):
+    # Server-side copy, with a single call up to `threshold` bytes and parallel
+    # part copies above it. Returns the size, part count and duration
+    start = time.time()
+    if source is None:
+        source = s3.head_object(Bucket=source_bucket, Key=source_key)
+    size = source['ContentLength']
+    copy_source = {'Bucket': source_bucket, 'Key': source_key}
+    if size <= min(threshold, MAX_PART_SIZE):
+        s3.copy_object(Bucket=bucket, CopySource=copy_source, Key=key)
+        parts = 1
+    else:
+        parts = __copy_parts(s3, copy_source, source, bucket, key, __part_size(size, part_size),
+                             max_workers, max_attempts)
+    seconds = time.time() - start
+    print('Copied s3://{}/{} ({:.1f} MB) in {} part(s), {:.1f} s, {:.1f} MB/s'.format(
+        source_bucket, source_key, size / MB, parts, seconds, size / MB / max(seconds, 0.001)))
+    return {'Size': size, 'Parts': parts, 'Seconds': seconds}
+
+def __part_size(size, part_size):
+    # Growing the part size (in whole MB) when the object would need more
+    # parts than S3 allows
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // MAX_PARTS))
+    return min(-(-part_size // MB) * MB, MAX_PART_SIZE)
+
+def __copy_parts(s3, copy_source, source, bucket, key, part_size, max_workers, max_attempts):
+    size = source['ContentLength']
+    upload = {'Bucket': bucket, 'Key': key}
+    upload_id = s3.create_multipart_upload(
+        ContentType=source.get('ContentType', 'binary/octet-stream'),
+        Metadata=source.get('Metadata', {}),
+        **upload)['UploadId']
+    ranges = [(number, offset, min(offset + part_size, size) - 1)
+              for number, offset in enumerate(range(0, size, part_size), start=1)]
+    def copy_part(part_range):
+        number, first, last = part_range
+        # Each part is retried on its own, with exponential backoff
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = s3.upload_part_copy(
+                    CopySource=copy_source,
+                    CopySourceRange='bytes={}-{}'.format(first, last),
+                    CopySourceIfMatch=source['ETag'],
+                    PartNumber=number,
+                    UploadId=upload_id,
+                    **upload)
+                return {'ETag': response['CopyPartResult']['ETag'], 'PartNumber': number}
+            except Exception as exception:
+                if attempt == max_attempts:
+                    raise
+                print('Retrying part {} of s3://{}/{} ({}): {}'.format(number, bucket, key, attempt, exception))
+                time.sleep(min(2 ** attempt * 0.1, 5.0))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ranges)))) as executor:
+            parts = list(executor.map(copy_part, ranges))
+        s3.complete_multipart_upload(UploadId=upload_id, MultipartUpload={'Parts': parts}, **upload)
+    except Exception as exception:
+        # Not leaving the parts already copied around, and raising the copy
+        # error even when the upload can't be aborted
+        try:
+            s3.abort_multipart_upload(UploadId=upload_id, **upload)
+        except Exception as abort_exception:
+            print('Unable to abort upload {} of s3://{}/{}: {}'.format(upload_id, bucket, key, abort_exception))
+        raise exception
+    return len(parts)
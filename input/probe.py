@@ -0,0 +1,65 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Duration of MP4/QuickTime assets from their movie header, with ranged reads
+# of the box headers only, so a feature film costs a few small GETs
+
+import struct
+
+MAX_BOXES = 32
+# moov children read to find mvhd, which is normally the first of them
+MOOV_READ_SIZE = 64 * 1024
+
+def probe_duration(s3, bucket, key, size):
+    # Returns None for other containers or when there is no movie header
+    offset = 0
+    for _ in range(MAX_BOXES):
+        if offset + 8 > size:
+            return None
+        box_size, box_type, header_size = __box_header(__read(s3, bucket, key, offset, 16))
+        if box_size is None:
+            return None
+        if box_size == 0:
+            box_size = size - offset
+        if box_size < header_size:
+            return None
+        if box_type == b'moov':
+            length = min(box_size - header_size, MOOV_READ_SIZE)
+            return __mvhd_duration(__read(s3, bucket, key, offset + header_size, length))
+        offset += box_size
+    return None
+
+def __read(s3, bucket, key, offset, length):
+    response = s3.get_object(Bucket=bucket, Key=key, Range='bytes={}-{}'.format(offset, offset + length - 1))
+    return response['Body'].read()
+
+def __box_header(data):
+    if len(data) < 8:
+        return None, None, 0
+    box_size, box_type = struct.unpack('>I4s', data[:8])
+    # Box types are four printable characters, anything else isn't ISO BMFF
+    if not all(32 <= c < 127 for c in box_type):
+        return None, None, 0
+    if box_size == 1:
+        if len(data) < 16:
+            return None, None, 0
+        return struct.unpack('>Q', data[8:16])[0], box_type, 16
+    return box_size, box_type, 8
+
+def __mvhd_duration(data):
+    offset = 0
+    while offset + 8 <= len(data):
+        box_size, box_type, header_size = __box_header(data[offset:offset + 16])
+        if box_size is None or box_size < header_size:
+            return None
+        if box_type == b'mvhd':
+            body = data[offset + header_size:offset + box_size]
+            if body[:1] == b'\x01' and len(body) >= 32:
+                timescale, duration = struct.unpack('>IQ', body[20:32])
+            elif len(body) >= 20:
+                timescale, duration = struct.unpack('>II', body[12:20])
+            else:
+                return None
+            return float(duration) / timescale if timescale else None
+        offset += box_size
+    return None
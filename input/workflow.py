@@ -0,0 +1,94 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import time
+import uuid
+
+# Workflow executions that hold (or are about to hold) MediaConvert and Rekognition jobs
+IN_FLIGHT_STATUSES = ('Queued', 'Started')
+
+def workflow_request(method, resource, path, body=None, path_parameters=None):
+    # Lambda request (with Chalice/API Gateway attributes)
+    return {
+        "resource": resource,
+        "path": path,
+        "httpMethod": method,
+        "headers": {
+            'Content-Type': 'application/json'
+        },
+        "multiValueHeaders": {},
+        "queryStringParameters": {},
+        "multiValueQueryStringParameters": {},
+        "pathParameters": path_parameters or {},
+        "stageVariables": {},
+        "requestContext": {
+            'resourcePath': resource,
+            'requestTime': time.time(),
+            'httpMethod': method,
+            'requestId': 'lambda_' + str(uuid.uuid4()).split('-')[-1],
+        },
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False
+    }
+
+def start_workflow(lambda_client, function_name, workflow_name, bucket, key, invocation_type='RequestResponse', lane=None,
+                   metadata=None):
+    # Workflow input body
+    body = {
+        "Name": workflow_name,
+        "Input":{
+            "Media":{
+                "Video":{
+                    "S3Bucket": bucket,
+                    "S3Key": key
+                }
+            },
+            # The operators rewrite the media keys, the ingest dedupe index
+            # records the asset under the uploaded one
+            "MetaData":dict(metadata or {}, IngestKey=key)
+        }
+    }
+    if lane is not None:
+        # Kept with the execution, so workflows in flight can be counted per lane
+        body["Input"]["MetaData"]["AdmissionLane"] = lane
+    request = workflow_request('POST', '/workflow/execution', '/workflow/execution', body)
+
+    # Invoke Workflow lambda function
+    response = lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType=invocation_type,
+        LogType='None',
+        Payload=bytes(json.dumps(request), encoding='utf-8')
+    )
+    print(response)
+    if invocation_type != 'RequestResponse':
+        # Asynchronous invocations only report that the request was accepted
+        return {'StatusCode': response['StatusCode']}
+    payload = json.loads(response['Payload'].read())
+    print(payload)
+    return payload
+
+def count_in_flight(lambda_client, function_name, workflow_name):
+    # Executions of the workflow per admission lane, None for the ones without
+    counts = {}
+    for status in IN_FLIGHT_STATUSES:
+        path = '/workflow/execution/status/{}'.format(status)
+        request = workflow_request('GET', '/workflow/execution/status/{Status}', path,
+                                   path_parameters={'Status': status})
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            LogType='None',
+            Payload=bytes(json.dumps(request), encoding='utf-8')
+        )
+        payload = json.loads(response['Payload'].read())
+        if payload.get('statusCode', 200) != 200:
+            raise Exception('Unable to list {} workflow executions: {}'.format(status, payload.get('body')))
+        executions = json.loads(payload['body']) if 'body' in payload else payload
+        for execution in executions:
+            if execution.get('Workflow', {}).get('Name', workflow_name) != workflow_name:
+                continue
+            lane = execution.get('Globals', {}).get('MetaData', {}).get('AdmissionLane')
+            counts[lane] = counts.get(lane, 0) + 1
+    return counts
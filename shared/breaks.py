@@ -0,0 +1,45 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import heapq
+from itertools import islice
+from bisect import bisect_left
+
+def select_breaks(slots, count, min_gap=0.0, pre_roll=0.0, post_roll=0.0, duration=None):
+    # Slots are visited best first and kept when they are out of the
+    # pre-roll/post-roll zones and at least min_gap away from the breaks
+    # already kept, which are looked up in a sorted timeline
+    latest = float("inf") if duration is None else duration - post_roll
+    timeline = []
+    selected = []
+    if count <= 0:
+        return selected
+    for slot in __ranked(slots, count * 4):
+        timestamp = float(slot["Timestamp"])
+        if timestamp < pre_roll or timestamp > latest:
+            continue
+        position = bisect_left(timeline, timestamp)
+        if position > 0 and timestamp - timeline[position - 1] < min_gap:
+            continue
+        if position < len(timeline) and timeline[position] - timestamp < min_gap:
+            continue
+        timeline.insert(position, timestamp)
+        selected.append(slot)
+        if len(selected) == count:
+            break
+    # Lowest score first, same order as sorting the slots by score
+    selected.reverse()
+    return selected
+
+def __ranked(slots, batch):
+    # Slots best first (the last slot first among equal scores): the first
+    # batch out of a bounded heap, and the rest sorted once, only when too
+    # many of the best slots were rejected
+    scores = [slot["Score"] for slot in slots]
+    best = heapq.nlargest(batch, zip(scores, range(len(slots))))
+    for _, i in best:
+        yield slots[i]
+    if len(best) < len(slots):
+        # Reversing a stable sort keeps the last slot first among equal scores
+        ranked = sorted(slots, key=lambda slot: slot["Score"])
+        yield from islice(reversed(ranked), len(best), None)
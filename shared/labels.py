@@ -0,0 +1,43 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+class LabelVocabulary(object):
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def label_id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def bitset(self, names):
+        bits = 0
+        for name in names:
+            bits |= 1 << self.label_id(name)
+        return bits
+
+    def lookup(self, names):
+        # Bitset of the known names and count of the unknown ones, without
+        # adding them to the vocabulary
+        bits = 0
+        unknown = set()
+        for name in names:
+            if name in self.ids:
+                bits |= 1 << self.ids[name]
+            else:
+                unknown.add(name)
+        return bits, len(unknown)
+
+def popcount(bits):
+    # int.bit_count() is only available from Python 3.10
+    return bin(bits).count("1")
+
+def jaccard(bits1, bits2, unknown=0):
+    # unknown: names of the first set left out of its bitset, which are in
+    # the union only
+    union = popcount(bits1 | bits2) + unknown
+    if not union:
+        return 0.0
+    return popcount(bits1 & bits2) / union
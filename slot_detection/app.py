@@ -2,14 +2,19 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
+import queue
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from MediaInsightsEngineLambdaHelper import MediaInsightsOperationHelper
 from MediaInsightsEngineLambdaHelper import MasExecutionError
 from MediaInsightsEngineLambdaHelper import DataPlane
 
-from silence import detect_silences
-from segment import detect_technical_cues, detect_shots
-from score import calculate_scores
+from silence import detect_silences, detect_silent_runs
+from segment import detect_technical_cues, detect_shots, iter_technical_cues, iter_shots
+from score import calculate_scores, REK_OPERATOR_KEYS, REASON_CODES
 
 REKOGNITION_OPERATORS = {
     "celebrityRecognition",
@@ -20,6 +25,17 @@ REKOGNITION_OPERATORS = {
     "shotDetection"
 }
 
+TECHNICAL_CUE_REASONS = {
+    "BlackFrames": "BlackFrame",
+    "EndCredits": "EndCredits"
+}
+
+min_confidence = int(os.environ["CONTEXT_MIN_CONFIDENCE"])
+silence_detector = os.environ.get("SILENCE_DETECTOR", "threshold")
+metadata_retrieval = os.environ.get("METADATA_RETRIEVAL", "sequential")
+metadata_max_workers = int(os.environ.get("METADATA_MAX_WORKERS", len(REKOGNITION_OPERATORS)))
+metadata_page_queue_size = int(os.environ.get("METADATA_PAGE_QUEUE_SIZE", 4))
+
 dataplane = DataPlane()
 
 def lambda_handler(event, context):
@@ -36,39 +52,20 @@ def lambda_handler(event, context):
         operator_object.add_workflow_metadata(
             SlotDetectionError="Missing a required metadata key {e}".format(e=exception))
         raise MasExecutionError(operator_object.return_output_object())
-    # Get asset metadata from dataplane
-    try:
-        asset_metadata = __get_asset_metadata(asset_id)
-    except Exception as exception:
-        operator_object.update_workflow_status("Error")
-        operator_object.add_workflow_metadata(
-            SlotDetectionError="Unable to retrieve metadata for asset {}: {}".format(asset_id, exception))
-        raise MasExecutionError(operator_object.return_output_object())
+    # Get asset metadata from dataplane (streamed along with scoring otherwise)
+    if metadata_retrieval != "streaming":
+        try:
+            asset_metadata = __get_asset_metadata(asset_id)
+        except Exception as exception:
+            operator_object.update_workflow_status("Error")
+            operator_object.add_workflow_metadata(
+                SlotDetectionError="Unable to retrieve metadata for asset {}: {}".format(asset_id, exception))
+            raise MasExecutionError(operator_object.return_output_object())
     try:
-        # Get detected reasons' timestamps from media and asset metadata
-        silences = detect_silences(loudness_bucket, loudness_key)
-        black_frames, end_credits = detect_technical_cues(asset_metadata)
-        shots = detect_shots(asset_metadata)
-        reasons_timestamps = {
-            "Silence": silences,
-            "BlackFrame": black_frames,
-            "ShotChange": shots,
-            "EndCredits": end_credits
-        }
-        media_info = asset_metadata["shotDetection"]["VideoMetadata"][0]
-        # Create slots from reasons' timestamps
-        print("reasons_timestamps: {}".format(reasons_timestamps))
-        slots = []
-        for reason in reasons_timestamps:
-            for timestamp in reasons_timestamps[reason]:
-                slots.append({
-                    "Timestamp": float(timestamp),
-                    "Score": 1.0,
-                    "Reasons": [reason]
-                })
-        print("slots: {}".format(slots))
-        # Consolidate slots and calculate scores
-        slots = calculate_scores(slots, media_info, asset_metadata)
+        if metadata_retrieval == "streaming":
+            slots = __detect_slots_streaming(asset_id, loudness_bucket, loudness_key)
+        else:
+            slots = __detect_slots(asset_metadata, loudness_bucket, loudness_key)
         print("scored_slots: {}".format(slots))
     except Exception as exception:
         operator_object.update_workflow_status("Error")
@@ -102,18 +99,239 @@ def lambda_handler(event, context):
 
     return operator_object.return_output_object()
 
+def __detect_slots(asset_metadata, loudness_bucket, loudness_key):
+    # Get detected reasons' timestamps from media and asset metadata
+    silences, silence_scores = __detect_silences(loudness_bucket, loudness_key)
+    black_frames, end_credits = detect_technical_cues(asset_metadata)
+    shots = detect_shots(asset_metadata)
+    reasons_timestamps = {
+        "Silence": silences,
+        "BlackFrame": black_frames,
+        "ShotChange": shots,
+        "EndCredits": end_credits
+    }
+    media_info = asset_metadata["shotDetection"]["VideoMetadata"][0]
+    # Create slots from reasons' timestamps
+    print("reasons_timestamps: {}".format(reasons_timestamps))
+    slots = []
+    for reason in reasons_timestamps:
+        for i, timestamp in enumerate(reasons_timestamps[reason]):
+            score = silence_scores[i] if reason == "Silence" and silence_scores else 1.0
+            slots.append(__candidate(reason, timestamp, score))
+    print("slots: {}".format(slots))
+    # Consolidate slots and calculate scores
+    return calculate_scores(slots, media_info, asset_metadata)
+
+def __detect_slots_streaming(asset_id, loudness_bucket, loudness_key):
+    # Segment pages are paged on their own threads, so context results never
+    # wait for a worker held by a page producer waiting for room in its queue
+    with ThreadPoolExecutor(max_workers=metadata_max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=2) as page_executor:
+        stop = threading.Event()
+        try:
+            # Context results are needed in full before scoring starts, while
+            # segment pages are turned into slot candidates as they arrive
+            context_futures = {
+                operator: executor.submit(__get_operator_metadata, asset_id, operator)
+                for operator in REK_OPERATOR_KEYS
+            }
+            technical_cue_pages = __stream_operator_pages(page_executor, stop, asset_id, "technicalCueDetection")
+            shot_pages = __stream_operator_pages(page_executor, stop, asset_id, "shotDetection")
+            silences, silence_scores = __detect_silences(loudness_bucket, loudness_key)
+            media_info, shot_pages = __peek_media_info(shot_pages)
+            asset_metadata = {operator: context_futures[operator].result() for operator in context_futures}
+            return __score_merged_candidates([
+                (__candidate("Silence", timestamp, silence_scores[i] if silence_scores else 1.0)
+                 for i, timestamp in enumerate(silences)),
+                (__candidate(TECHNICAL_CUE_REASONS[cue_type], timestamp)
+                 for cue_type, timestamp in iter_technical_cues(technical_cue_pages)),
+                (__candidate("ShotChange", timestamp) for timestamp in iter_shots(shot_pages))
+            ], media_info, asset_metadata)
+        finally:
+            # Releasing page producers still waiting for room in their queue
+            stop.set()
+
+def __score_merged_candidates(sources, media_info, asset_metadata):
+    # Every source is expected in timestamp order, so a k-way merge replaces
+    # sorting. Sources are checked as they are read, and the candidates are
+    # sorted and scored again if one of them is not
+    order = {"Sorted": True}
+    received = []
+    sources = [__check_order(source, received, order) for source in sources]
+    candidates = heapq.merge(*sources, key=__merge_key)
+    slots = calculate_scores(__while_sorted(candidates, order), media_info, asset_metadata, ordered=True)
+    if order["Sorted"]:
+        return slots
+    # Reading what is left of the sources, which keeps their candidates
+    for source in sources:
+        for _ in source:
+            pass
+    received.sort(key=lambda candidate: (candidate[0], REASON_CODES[candidate[1]]))
+    print("Slot candidates out of timestamp order, scoring {} sorted candidates".format(len(received)))
+    candidates = [__candidate(reason, timestamp, score) for timestamp, reason, score in received]
+    return calculate_scores(candidates, media_info, asset_metadata, ordered=True)
+
+def __merge_key(candidate):
+    return (candidate["Timestamp"], REASON_CODES[candidate["Reasons"][0]])
+
+def __check_order(candidates, received, order):
+    # Keeping each candidate as read (scoring updates the slots in place)
+    previous = None
+    for candidate in candidates:
+        key = __merge_key(candidate)
+        if previous is not None and key < previous:
+            order["Sorted"] = False
+        previous = key
+        received.append((candidate["Timestamp"], candidate["Reasons"][0], candidate["Score"]))
+        yield candidate
+
+def __while_sorted(candidates, order):
+    for candidate in candidates:
+        if not order["Sorted"]:
+            return
+        yield candidate
+
+def __detect_silences(loudness_bucket, loudness_key):
+    if silence_detector == "runlength":
+        silent_runs = detect_silent_runs(loudness_bucket, loudness_key)
+        return [run["Start"] for run in silent_runs], [run["Score"] for run in silent_runs]
+    return detect_silences(loudness_bucket, loudness_key), None
+
+def __candidate(reason, timestamp, score=1.0):
+    return {
+        "Timestamp": float(timestamp),
+        "Score": score,
+        "Reasons": [reason]
+    }
+
+def __peek_media_info(shot_pages):
+    # Video metadata comes along with the shot detection pages
+    pages = []
+    for results in shot_pages:
+        pages.append(results)
+        if results.get("VideoMetadata"):
+            return results["VideoMetadata"][0], itertools.chain(pages, shot_pages)
+    raise Exception("Missing VideoMetadata in shotDetection results")
+
 def __get_asset_metadata(asset_id):
+    if metadata_retrieval == "parallel":
+        return __get_asset_metadata_parallel(asset_id)
     asset_metadata = {operator: {} for operator in REKOGNITION_OPERATORS}
     params = {"asset_id": asset_id}
     while True:
         response = dataplane.retrieve_asset_metadata(**params)
         if "operator" in response and response["operator"] in REKOGNITION_OPERATORS:
-            __update_and_merge_lists(asset_metadata[response["operator"]], response["results"])
+            __update_and_merge_lists(
+                asset_metadata[response["operator"]],
+                __project_results(response["operator"], response["results"]))
         if "cursor" not in response:
             break
         params["cursor"] = response["cursor"]
     return asset_metadata
 
+def __get_asset_metadata_parallel(asset_id):
+    # Paging through each operator's metadata on its own thread
+    asset_metadata = {}
+    with ThreadPoolExecutor(max_workers=metadata_max_workers) as executor:
+        futures = {
+            operator: executor.submit(__get_operator_metadata, asset_id, operator)
+            for operator in REKOGNITION_OPERATORS
+        }
+        for operator in futures:
+            asset_metadata[operator] = futures[operator].result()
+    return asset_metadata
+
+def __get_operator_metadata(asset_id, operator):
+    operator_metadata = {}
+    for results in __iter_operator_pages(asset_id, operator):
+        __update_and_merge_lists(operator_metadata, results)
+    return operator_metadata
+
+def __iter_operator_pages(asset_id, operator):
+    params = {"asset_id": asset_id, "operator_name": operator}
+    while True:
+        response = dataplane.retrieve_asset_metadata(**params)
+        if "operator" in response and response["operator"] == operator:
+            yield __project_results(operator, response["results"])
+        if "cursor" not in response:
+            break
+        params["cursor"] = response["cursor"]
+
+def __stream_operator_pages(executor, stop, asset_id, operator):
+    # Paging on a worker thread and handing pages over through a queue, which
+    # holds a few pages at most
+    pages = queue.Queue(maxsize=metadata_page_queue_size)
+    future = executor.submit(__put_operator_pages, pages, stop, asset_id, operator)
+    return __get_queued_pages(pages, future)
+
+def __put_operator_pages(pages, stop, asset_id, operator):
+    try:
+        for results in __iter_operator_pages(asset_id, operator):
+            if not __put_page(pages, stop, results):
+                return
+    finally:
+        __put_page(pages, stop, None)
+
+def __put_page(pages, stop, results):
+    # Waiting for room in the queue until the pages are no longer read
+    while not stop.is_set():
+        try:
+            pages.put(results, timeout=1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def __get_queued_pages(pages, future):
+    while True:
+        results = pages.get()
+        if results is None:
+            break
+        yield results
+    # Raising paging errors, if any
+    future.result()
+
+def __project_results(operator, results):
+    # Keeping only the fields read by segment and score modules, and dropping
+    # context results below the minimum confidence, as each page arrives
+    if operator == "shotDetection":
+        projected = {
+            "Segments": [{
+                "Type": segment["Type"],
+                "StartTimestampMillis": segment["StartTimestampMillis"]
+            } for segment in results.get("Segments", []) if segment["Type"] == "SHOT"]
+        }
+        if "VideoMetadata" in results:
+            projected["VideoMetadata"] = [
+                {"DurationMillis": video["DurationMillis"]} for video in results["VideoMetadata"]]
+        return projected
+    if operator == "technicalCueDetection":
+        return {
+            "Segments": [{
+                "TechnicalCueSegment": {"Type": segment["TechnicalCueSegment"]["Type"]},
+                "StartTimestampMillis": segment["StartTimestampMillis"]
+            } for segment in results.get("Segments", [])
+                if segment["TechnicalCueSegment"]["Type"] in ("BlackFrames", "EndCredits")]
+        }
+    list_key, item_key = REK_OPERATOR_KEYS[operator]
+    projected_results = []
+    for result in results.get(list_key, []):
+        item = __project_item(result[item_key])
+        if item is not None:
+            projected_results.append({"Timestamp": result["Timestamp"], item_key: item})
+    return {list_key: projected_results}
+
+def __project_item(item):
+    if "Emotions" in item:
+        emotions = [{
+            "Type": emotion["Type"],
+            "Confidence": emotion["Confidence"]
+        } for emotion in item["Emotions"] if float(emotion["Confidence"]) >= min_confidence]
+        return {"Emotions": emotions} if emotions else None
+    if float(item["Confidence"]) >= min_confidence:
+        return {"Name": item["Name"], "Confidence": item["Confidence"]}
+    return None
+
 def __update_and_merge_lists(dict1, dict2):
     for key in dict2:
         if key in dict1:
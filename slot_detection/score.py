@@ -3,6 +3,10 @@
 
 import os
 import math
+import numpy as np
+
+from labels import LabelVocabulary, jaccard
+from breaks import select_breaks
 
 SCORE_ADJUSTMENTS = {
     "Silence": 0.7,
@@ -11,15 +15,41 @@ SCORE_ADJUSTMENTS = {
     "EndCredits": 1.0
 }
 
+REK_OPERATOR_KEYS = {
+    "celebrityRecognition": ["Celebrities", "Celebrity"],
+    "faceDetection": ["Faces", "Face"],
+    "labelDetection": ["Labels", "Label"],
+    "contentModeration": ["ModerationLabels", "ModerationLabel"]
+}
+
+REASONS = list(SCORE_ADJUSTMENTS)
+REASON_CODES = {reason: code for code, reason in enumerate(REASONS)}
+REASON_ADJUSTMENTS = np.array([SCORE_ADJUSTMENTS[reason] for reason in REASONS])
+
+MIN_SLOT_INTERVAL = 0.50
+BLOCK_RATIO = 0.25
+
 context_interval = int(os.environ["CONTEXT_INTERVAL_IN_SECONDS"])
 min_confidence = int(os.environ["CONTEXT_MIN_CONFIDENCE"])
+scoring_engine = os.environ.get("SCORING_ENGINE", "python")
+context_slots = os.environ.get("CONTEXT_SLOTS", "all")
+# Break selection of the VMAP generation operator, for CONTEXT_SLOTS=breaks
+top_slots_qty = int(os.environ.get("TOP_SLOTS_QTY", 0))
+min_break_gap = float(os.environ.get("MIN_BREAK_GAP_IN_SECONDS", 0))
+pre_roll_exclusion = float(os.environ.get("PRE_ROLL_EXCLUSION_IN_SECONDS", 0))
+post_roll_exclusion = float(os.environ.get("POST_ROLL_EXCLUSION_IN_SECONDS", 0))
+
+def calculate_scores(slots, media_info, asset_metadata, ordered=False):
+    # Slots can be any iterable when they already come in timestamp order
+    if scoring_engine == "numpy":
+        return __calculate_scores_numpy(slots, media_info, asset_metadata)
 
-def calculate_scores(slots, media_info, asset_metadata):
     # Sorting by slot time
-    slots.sort(key=lambda slot: slot["Timestamp"])
+    if not ordered:
+        slots.sort(key=lambda slot: slot["Timestamp"])
 
-    min_slot_interval = 0.50
-    block_ratio = 0.25
+    min_slot_interval = MIN_SLOT_INTERVAL
+    block_ratio = BLOCK_RATIO
 
     consolidated = []
     prev_slot = {}
@@ -27,6 +57,11 @@ def calculate_scores(slots, media_info, asset_metadata):
     # Getting video duration
     total_duration = float(media_info["DurationMillis"]) / 1000.0
 
+    # Indexing context results once for the whole asset
+    context_index = __build_context_index(asset_metadata)
+    label_index = __build_label_index(context_index)
+    context_timestamps = []
+
     for slot in slots:
         # Adjusting base slot score
         slot["Score"] = slot["Score"] * SCORE_ADJUSTMENTS[slot["Reasons"][0]]
@@ -57,52 +92,203 @@ def calculate_scores(slots, media_info, asset_metadata):
                         dist_from_prev / total_duration, 0.05)
 
         # Score adjustment: labels before and after
-        slot["Context"] = __get_context_metadata(slot["Timestamp"], asset_metadata)
-        pre_labels = set(label["Name"] for label in slot["Context"]["Labels"]["Before"])
-        post_labels = set(label["Name"] for label in slot["Context"]["Labels"]["After"])
-        if pre_labels or post_labels:
-            distance = 1.0 - (len(pre_labels.intersection(post_labels)) / len(pre_labels.union(post_labels)))
-            slot["Score"] = __disjunction(slot["Score"], math.pow(distance, 4.0))
+        if context_slots == "breaks":
+            context_timestamps.append(slot["Timestamp"])
+        else:
+            slot["Context"] = __get_context_metadata(slot["Timestamp"], context_index)
+        context_score = __get_label_score(slot["Timestamp"], label_index)
+        if context_score is not None:
+            slot["Score"] = __disjunction(slot["Score"], context_score)
 
         consolidated.append(slot)
         prev_slot = slot
 
+    if context_slots == "breaks":
+        __attach_break_contexts(consolidated, context_timestamps, context_index, total_duration)
+    return consolidated
+
+def __calculate_scores_numpy(slots, media_info, asset_metadata):
+    # Same adjustments as the loop above, applied to timestamp, reason and
+    # score columns instead of one slot dict at a time
+    columns = [(slot["Timestamp"], REASON_CODES[slot["Reasons"][0]], slot["Score"]) for slot in slots]
+    if not columns:
+        return []
+    total_duration = float(media_info["DurationMillis"]) / 1000.0
+    context_index = __build_context_index(asset_metadata)
+
+    # Sorting by slot time
+    timestamps, reason_codes, scores = (np.array(column) for column in zip(*columns))
+    order = np.argsort(timestamps, kind="stable")
+    timestamps = timestamps[order].astype(float)
+    reason_codes = reason_codes[order]
+    scores = scores[order].astype(float)
+
+    # Adjusting base slot scores
+    scores = scores * REASON_ADJUSTMENTS[reason_codes]
+
+    # Score adjustment: distance from beginning
+    positions = timestamps / total_duration
+    early = positions < BLOCK_RATIO
+    scores[early] = scores[early] * np.power(positions[early], 0.30)
+
+    # Consolidating runs of slots closer than MIN_SLOT_INTERVAL, each run is
+    # kept at its first slot and merged with the disjunction of the others
+    heads = np.flatnonzero(np.concatenate(([True], np.diff(timestamps) >= MIN_SLOT_INTERVAL)))
+    tails = np.append(heads[1:], len(timestamps)) - 1
+    head_scores = scores[heads]
+    complements = 1.0 - scores
+    complements[heads] = 1.0
+    merged_complements = np.multiply.reduceat(complements, heads)
+
+    # Reasons of each run, in the order they first appear
+    slot_indexes = np.arange(len(timestamps))
+    first_seen = np.empty((len(heads), len(REASONS)), dtype=int)
+    for code in range(len(REASONS)):
+        first_seen[:, code] = np.minimum.reduceat(
+            np.where(reason_codes == code, slot_indexes, len(timestamps)), heads)
+    reason_order = np.argsort(first_seen, axis=1, kind="stable")
+
+    # Score adjustment: labels before and after
+    head_timestamps = timestamps[heads].tolist()
+    contexts = None
+    if context_slots != "breaks":
+        contexts = [__get_context_metadata(timestamp, context_index) for timestamp in head_timestamps]
+    label_index = __build_label_index(context_index)
+    context_scores = [__get_label_score(timestamp, label_index) for timestamp in head_timestamps]
+    context_scores = np.array(context_scores, dtype=float)
+    has_context = ~np.isnan(context_scores)
+    context_scores[~has_context] = 0.0
+
+    # Score adjustment: distance between slots, both outcomes are computed up
+    # front and only the comparison with the previous run is left sequential
+    gaps = np.full(len(heads), np.inf)
+    gaps[1:] = timestamps[heads[1:]] - timestamps[tails[:-1]]
+    close = gaps / total_duration < BLOCK_RATIO
+    penalties = np.ones(len(heads))
+    penalties[close] = np.power(gaps[close] / total_duration, 0.05)
+    unpenalized = 1.0 - (1.0 - __disjunction(head_scores, context_scores)) * merged_complements
+    penalized = 1.0 - (1.0 - __disjunction(head_scores * penalties, context_scores)) * merged_complements
+
+    head_scores = head_scores.tolist()
+    penalties = penalties.tolist()
+    penalized = penalized.tolist()
+    run_scores = unpenalized.tolist()
+    for run in np.flatnonzero(close).tolist():
+        if head_scores[run] < run_scores[run - 1]:
+            run_scores[run] = penalized[run]
+        else:
+            run_scores[run - 1] = run_scores[run - 1] * penalties[run]
+
+    consolidated = []
+    for run, tail in enumerate(tails.tolist()):
+        slot = {
+            "Timestamp": timestamps[tail].item(),
+            "Score": run_scores[run],
+            "Reasons": [REASONS[code] for code in reason_order[run].tolist()
+                        if first_seen[run, code] < len(timestamps)]
+        }
+        if contexts is not None:
+            slot["Context"] = contexts[run]
+        consolidated.append(slot)
+
+    if context_slots == "breaks":
+        __attach_break_contexts(consolidated, head_timestamps, context_index, total_duration)
     return consolidated
 
 def __disjunction(x, y):
     return 1.0 - ((1.0 - x) * (1.0 - y))
 
-def __get_context_metadata(slot_timestamp, asset_metadata):
-    rek_operator_keys = {
-        "celebrityRecognition": ["Celebrities", "Celebrity"],
-        "faceDetection": ["Faces", "Face"],
-        "labelDetection": ["Labels", "Label"],
-        "contentModeration": ["ModerationLabels", "ModerationLabel"]
+def __attach_break_contexts(consolidated, context_timestamps, context_index, total_duration):
+    # Scores are final at this point, so full contexts are only built for the
+    # slots the VMAP generation operator selects as breaks, the other slots
+    # get an empty context
+    breaks = select_breaks(
+        consolidated,
+        top_slots_qty,
+        min_gap=min_break_gap,
+        pre_roll=pre_roll_exclusion,
+        post_roll=post_roll_exclusion,
+        duration=total_duration if post_roll_exclusion > 0 else None)
+    selected = set(id(slot) for slot in breaks)
+    for slot, timestamp in zip(consolidated, context_timestamps):
+        if id(slot) in selected:
+            slot["Context"] = __get_context_metadata(timestamp, context_index)
+        else:
+            slot["Context"] = {}
+    print("Context lookups skipped: {} of {}".format(len(consolidated) - len(selected), len(consolidated)))
+
+def __build_label_index(context_index):
+    # Label names of every labelDetection result as a bitset, which is all
+    # the context score needs, in both CONTEXT_SLOTS modes
+    vocabulary = LabelVocabulary()
+    return {
+        "Timestamps": context_index["labelDetection"]["Timestamps"],
+        "Bitsets": [vocabulary.bitset(label["Name"] for label in labels)
+                    for labels in context_index["labelDetection"]["Labels"]],
+        "Start": 0
     }
+
+def __get_label_score(slot_timestamp, label_index):
+    # Jaccard distance between the labels before and after the slot, the same
+    # labels as the "Labels" entry of its context, without building it
+    timestamps = label_index["Timestamps"]
+    bitsets = label_index["Bitsets"]
+    start = label_index["Start"]
+    while start < len(timestamps) and timestamps[start] < slot_timestamp - context_interval:
+        start += 1
+    label_index["Start"] = start
+    before = 0
+    after = 0
+    for i in range(start, len(timestamps)):
+        if timestamps[i] > slot_timestamp + context_interval:
+            break
+        if timestamps[i] <= slot_timestamp:
+            before |= bitsets[i]
+        else:
+            after |= bitsets[i]
+    if not (before or after):
+        return None
+    distance = 1.0 - jaccard(before, after)
+    return math.pow(distance, 4.0)
+
+def __build_context_index(asset_metadata):
+    # Sorting each operator's results by timestamp once per asset, with their
+    # labels already extracted, so slots only walk the results in their window
+    context_index = {}
+    for operator in REK_OPERATOR_KEYS:
+        list_key, item_key = REK_OPERATOR_KEYS[operator]
+        results = sorted(asset_metadata[operator][list_key], key=lambda result: result["Timestamp"])
+        context_index[operator] = {
+            "Timestamps": [result["Timestamp"] / 1000.0 for result in results],
+            "Labels": [__labels_from_result(result, item_key) for result in results],
+            "Start": 0
+        }
+    return context_index
+
+def __get_context_metadata(slot_timestamp, context_index):
     context = {}
-    for operator in rek_operator_keys:
-        list_key = rek_operator_keys[operator][0]
+    for operator in REK_OPERATOR_KEYS:
+        list_key = REK_OPERATOR_KEYS[operator][0]
+        timestamps = context_index[operator]["Timestamps"]
+        labels = context_index[operator]["Labels"]
+        # Moving the window start forward (slots are visited in timestamp order)
+        start = context_index[operator]["Start"]
+        while start < len(timestamps) and timestamps[start] < slot_timestamp - context_interval:
+            start += 1
+        context_index[operator]["Start"] = start
         before = {}
         after = {}
-        for result in asset_metadata[operator][list_key]:
-            result_timestamp = result["Timestamp"] / 1000.0
-            item_key = rek_operator_keys[operator][1]
-            if slot_timestamp - context_interval <= result_timestamp <= slot_timestamp:
-                for label in __labels_from_result(result, item_key):
-                    if label["Name"] in before: 
-                        if before[label["Name"]]["Confidence"] < label["Confidence"]:
-                            before[label["Name"]] = label
-                    else:
-                        before[label["Name"]] = label
-            elif slot_timestamp <= result_timestamp <= slot_timestamp + context_interval:
-                for label in __labels_from_result(result, item_key):
-                    if label["Name"] in after:
-                        if after[label["Name"]]["Confidence"] < label["Confidence"]:
-                            after[label["Name"]] = label
-                    else:
-                        after[label["Name"]] = label
-            elif result_timestamp > slot_timestamp + context_interval:
+        for i in range(start, len(timestamps)):
+            result_timestamp = timestamps[i]
+            if result_timestamp > slot_timestamp + context_interval:
                 break
+            window = before if result_timestamp <= slot_timestamp else after
+            for label in labels[i]:
+                if label["Name"] in window:
+                    if window[label["Name"]]["Confidence"] < label["Confidence"]:
+                        window[label["Name"]] = label
+                else:
+                    window[label["Name"]] = label
         context[list_key] = {
             "Before": list(before.values()),
             "After": list(after.values())
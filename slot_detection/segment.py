@@ -4,16 +4,24 @@
 def detect_technical_cues(asset_metadata):
     black_frames = []
     end_credits = []
-    for segment in asset_metadata["technicalCueDetection"]["Segments"]:
-        if segment["TechnicalCueSegment"]["Type"] == "BlackFrames":
-            black_frames.append(float(segment["StartTimestampMillis"]) / 1000.0)
-        elif segment["TechnicalCueSegment"]["Type"] == "EndCredits":
-            end_credits.append(float(segment["StartTimestampMillis"]) / 1000.0)
+    for cue_type, timestamp in iter_technical_cues([asset_metadata["technicalCueDetection"]]):
+        if cue_type == "BlackFrames":
+            black_frames.append(timestamp)
+        elif cue_type == "EndCredits":
+            end_credits.append(timestamp)
     return (black_frames, end_credits)
 
 def detect_shots(asset_metadata):
-    shots = []
-    for segment in asset_metadata["shotDetection"]["Segments"]:
-        if segment["Type"] == "SHOT":
-            shots.append(float(segment["StartTimestampMillis"]) / 1000.0)
-    return shots
+    return list(iter_shots([asset_metadata["shotDetection"]]))
+
+def iter_technical_cues(pages):
+    for results in pages:
+        for segment in results["Segments"]:
+            if segment["TechnicalCueSegment"]["Type"] in ("BlackFrames", "EndCredits"):
+                yield (segment["TechnicalCueSegment"]["Type"], float(segment["StartTimestampMillis"]) / 1000.0)
+
+def iter_shots(pages):
+    for results in pages:
+        for segment in results["Segments"]:
+            if segment["Type"] == "SHOT":
+                yield float(segment["StartTimestampMillis"]) / 1000.0
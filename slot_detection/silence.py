@@ -2,9 +2,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
-import tempfile
+import math
+import itertools
+import numpy as np
 import boto3
 
+LOUDNESS_CHUNK_SIZE = 1024 * 1024
+
 s3 = boto3.client("s3")
 
 def detect_silences(loudness_bucket, loudness_key):
@@ -12,19 +16,69 @@ def detect_silences(loudness_bucket, loudness_key):
     # silent audio has loudness lower than threshold
     silent_threshold = float(os.environ['SILENT_THRESHOLD'])
     silences = []
-    with tempfile.TemporaryFile() as tmp:
-        s3.download_fileobj(loudness_bucket, loudness_key, tmp)
-        tmp.seek(0)
-        is_silent = False
-        for line in tmp.readlines()[1:]:
-            line = line.decode('utf-8')
-            short_term_loudness = float(line.split(',')[3])
-            if short_term_loudness < silent_threshold:
-                if not is_silent:
-                    second = float(line.split(',')[0])
-                    if second > start_threshold:
-                        silences.append(second)
-                        is_silent = True
-            else:
-                is_silent = False
-    return silences
\ No newline at end of file
+    is_silent = False
+    for second, short_term_loudness in __read_loudness(loudness_bucket, loudness_key):
+        if short_term_loudness < silent_threshold:
+            if not is_silent:
+                if second > start_threshold:
+                    silences.append(second)
+                    is_silent = True
+        else:
+            is_silent = False
+    return silences
+
+def detect_silent_runs(loudness_bucket, loudness_key):
+    start_threshold = float(os.environ['START_THRESHOLD_IN_SECONDS'])
+    # audio turns silent below the silent threshold and stays silent until
+    # its loudness reaches the exit threshold
+    enter_threshold = float(os.environ['SILENT_THRESHOLD'])
+    exit_threshold = float(os.environ.get('SILENT_EXIT_THRESHOLD', enter_threshold))
+    min_duration = float(os.environ.get('MIN_SILENCE_IN_SECONDS', 0))
+    loudness = np.fromiter(
+        itertools.chain.from_iterable(__read_loudness(loudness_bucket, loudness_key)),
+        dtype=float).reshape(-1, 2)
+    loudness = loudness[loudness[:, 0] > start_threshold]
+    seconds = loudness[:, 0]
+    short_term_loudness = loudness[:, 1]
+    # Samples between both thresholds keep the state of the last sample outside them
+    decided = (short_term_loudness < enter_threshold) | (short_term_loudness >= exit_threshold)
+    last_decided = np.maximum.accumulate(np.where(decided, np.arange(len(seconds)), -1))
+    silent = np.zeros(len(seconds), dtype=bool)
+    known = last_decided >= 0
+    silent[known] = short_term_loudness[last_decided[known]] < enter_threshold
+    # Run-length encoding of the silent state
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    if len(starts) == 0:
+        return []
+    ends = np.flatnonzero(edges == -1)
+    start_seconds = seconds[starts]
+    end_seconds = seconds[np.minimum(ends, len(seconds) - 1)]
+    # Depth of each run is how far its quietest sample is below the silent threshold
+    depths = enter_threshold - np.minimum.reduceat(np.where(silent, short_term_loudness, np.inf), starts)
+    keep = end_seconds - start_seconds >= min_duration
+    silent_runs = []
+    for start, end, depth in zip(start_seconds[keep].tolist(), end_seconds[keep].tolist(), depths[keep].tolist()):
+        silent_runs.append({
+            "Start": start,
+            "End": end,
+            "Depth": depth,
+            "Score": 1.0 - math.pow(10.0, -depth / 20.0)
+        })
+    return silent_runs
+
+def __read_loudness(loudness_bucket, loudness_key):
+    # Streaming the loudness log in chunks and parsing the time and short-term
+    # loudness columns straight from bytes, so memory does not grow with duration
+    body = s3.get_object(Bucket=loudness_bucket, Key=loudness_key)["Body"]
+    try:
+        lines = body.iter_lines(chunk_size=LOUDNESS_CHUNK_SIZE)
+        # Skipping header
+        next(lines, None)
+        for line in lines:
+            if not line:
+                continue
+            columns = line.split(b",", 4)
+            yield float(columns[0]), float(columns[3])
+    finally:
+        body.close()
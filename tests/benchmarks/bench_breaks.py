@@ -0,0 +1,99 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Break selection (bounded heap, then a single sort when needed) against the
+# baseline sort-and-slice of every slot, followed by the same gap filter, and
+# against growing nlargest batches. With the default gap most of the best
+# slots are rejected (the best slots are bunched up at the start):
+#   python tests/benchmarks/bench_breaks.py --slots 100000 --count 12 --min-gap 600
+
+import os
+import sys
+import time
+import heapq
+import random
+import argparse
+from bisect import bisect_left
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import conftest  # noqa: F401 (function directories and environment)
+from breaks import select_breaks
+
+def sorted_select_breaks(slots, count, min_gap=0.0):
+    # Baseline: every slot sorted by score and the best ones sliced, walked
+    # best first through the gap filter when there is a minimum gap
+    ranked = sorted(slots, key=lambda slot: slot["Score"])
+    if not min_gap:
+        return ranked[-count:] if count > 0 else []
+    timeline = []
+    selected = []
+    for slot in reversed(ranked):
+        if len(selected) == count:
+            break
+        timestamp = float(slot["Timestamp"])
+        position = bisect_left(timeline, timestamp)
+        if position > 0 and timestamp - timeline[position - 1] < min_gap:
+            continue
+        if position < len(timeline) and timeline[position] - timestamp < min_gap:
+            continue
+        timeline.insert(position, timestamp)
+        selected.append(slot)
+    selected.reverse()
+    return selected
+
+def batched_select_breaks(slots, count, min_gap=0.0):
+    # Previous selection: nlargest again for every batch of 4x more slots
+    scores = [slot["Score"] for slot in slots]
+    timeline = []
+    selected = []
+    visited = 0
+    batch = count
+    while len(selected) < count and visited < len(slots):
+        batch = min(batch * 4, len(slots))
+        ranked = heapq.nlargest(batch, zip(scores, range(len(slots))))
+        for _, i in ranked[visited:]:
+            timestamp = float(slots[i]["Timestamp"])
+            position = bisect_left(timeline, timestamp)
+            if position > 0 and timestamp - timeline[position - 1] < min_gap:
+                continue
+            if position < len(timeline) and timeline[position] - timestamp < min_gap:
+                continue
+            timeline.insert(position, timestamp)
+            selected.append(slots[i])
+            if len(selected) == count:
+                break
+        visited = batch
+    selected.reverse()
+    return selected
+
+def timed(select, slots, count, min_gap):
+    start = time.perf_counter()
+    selected = select(slots, count, min_gap=min_gap)
+    return selected, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slots", type=int, default=100000)
+    parser.add_argument("--count", type=int, default=12)
+    parser.add_argument("--min-gap", type=float, default=600.0)
+    parser.add_argument("--duration", type=float, default=7200.0)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    # The best slots are bunched up at the start of the video
+    slots = [{"Timestamp": rng.uniform(0, args.duration), "Score": rng.random()} for _ in range(args.slots)]
+    for slot in slots:
+        slot["Score"] = 1.0 - slot["Timestamp"] / args.duration * rng.random()
+    print("{} slots".format(len(slots)))
+    for min_gap in (0.0, args.min_gap):
+        expected, sorted_seconds = timed(sorted_select_breaks, slots, args.count, min_gap)
+        batched, batched_seconds = timed(batched_select_breaks, slots, args.count, min_gap)
+        actual, heap_seconds = timed(select_breaks, slots, args.count, min_gap)
+        print("{} breaks, minimum gap {:.0f} s".format(len(actual), min_gap))
+        print("  sort and slice:   {:.3f} s".format(sorted_seconds))
+        print("  nlargest batches: {:.3f} s ({:.1f}x)".format(batched_seconds, sorted_seconds / batched_seconds))
+        print("  select_breaks:    {:.3f} s ({:.1f}x)".format(heap_seconds, sorted_seconds / heap_seconds))
+        print("  same breaks: {}".format(actual == expected and batched == expected))
+
+if __name__ == "__main__":
+    main()
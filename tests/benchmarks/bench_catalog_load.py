@@ -0,0 +1,74 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Cold start of the VMAP generation operator with a compiled ads catalog in
+# /tmp: reading the cache file, parsing its JSON, decoding the hex bitsets
+# and indexing the catalog, each timed on its own, then a whole
+# CatalogLoader.get() revalidated with a 304:
+#   python tests/benchmarks/bench_catalog_load.py --ads 100000 --labels 2000
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import conftest  # noqa: F401 (function directories and environment)
+from botocore.exceptions import ClientError
+from catalog import AdCatalog, compile_ads
+from catalog_loader import CatalogLoader, encode_compiled, decode_compiled
+
+class NotModifiedS3(object):
+    def get_object(self, **params):
+        raise ClientError({'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+
+def random_ads(rng, count, labels):
+    names = ['Label{}'.format(i) for i in range(labels)]
+    return [{
+        'url': 'https://ads.example.com/{}.mp4'.format(i),
+        'labels': rng.sample(names, rng.randint(1, 8)),
+        'category': 'category-{}'.format(i % 50)
+    } for i in range(count)]
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def read(path):
+    with open(path, 'rb') as cache_file:
+        return cache_file.read()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ads', type=int, default=100000)
+    parser.add_argument('--labels', type=int, default=2000)
+    args = parser.parse_args()
+
+    compiled = compile_ads(random_ads(random.Random(0), args.ads, args.labels))
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, 'ads_catalog.json')
+        with open(cache_path, 'w') as cache_file:
+            json.dump({'Bucket': 'bucket', 'Key': 'ads.catalog.json', 'ETag': '"1"',
+                       'Compiled': encode_compiled(compiled)}, cache_file, separators=(',', ':'))
+
+        data, read_time = timed(read, cache_path)
+        cached, parse_time = timed(json.loads, data)
+        decoded, decode_time = timed(decode_compiled, cached['Compiled'])
+        _, index_time = timed(AdCatalog, decoded)
+        assert decoded == compiled
+        loader = CatalogLoader(NotModifiedS3(), 'bucket', 'ads.catalog.json', cache_path)
+        _, load_time = timed(loader.get)
+
+    total = read_time + parse_time + decode_time + index_time
+    print('{} ads, {} labels, {:.1f} MB cached'.format(args.ads, args.labels, len(data) / 1e6))
+    for name, seconds in (('read', read_time), ('json parse', parse_time), ('decode bitsets', decode_time),
+                          ('index catalog', index_time)):
+        print('{:<16} {:.3f} s ({:.0%})'.format(name + ':', seconds, seconds / total))
+    print('{:<16} {:.3f} s'.format('CatalogLoader:', load_time))
+
+if __name__ == '__main__':
+    main()
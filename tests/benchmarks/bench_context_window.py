@@ -0,0 +1,51 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Slot scoring with the sliding context window against the per-slot scan
+# of every result, on synthetic metadata of a long asset:
+#   python tests/benchmarks/bench_context_window.py --duration 7200 --shots 3000 --results 6000
+
+import os
+import io
+import sys
+import copy
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import conftest  # noqa: F401 (function directories and environment)
+import score
+import synthetic
+import reference_scores
+
+def timed(calculate_scores, slots, metadata):
+    slots = copy.deepcopy(slots)
+    start = time.perf_counter()
+    # Consolidation is logged per slot
+    with contextlib.redirect_stdout(io.StringIO()):
+        scored = calculate_scores(slots, synthetic.media_info(metadata), metadata)
+    return scored, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=int, default=7200)
+    parser.add_argument("--shots", type=int, default=3000)
+    parser.add_argument("--results", type=int, default=6000)
+    args = parser.parse_args()
+
+    score.scoring_engine = "python"
+    score.context_slots = "all"
+    metadata = synthetic.asset_metadata(args.duration, args.shots, args.results)
+    slots = synthetic.slot_candidates(metadata)
+    expected, scan_seconds = timed(reference_scores.calculate_scores, slots, metadata)
+    actual, window_seconds = timed(score.calculate_scores, slots, metadata)
+    print("{} candidates, {} slots".format(len(slots), len(actual)))
+    print("per-slot scan:  {:.3f} s".format(scan_seconds))
+    print("sliding window: {:.3f} s ({:.1f}x)".format(window_seconds, scan_seconds / window_seconds))
+    same = [(slot["Timestamp"], slot["Score"], slot["Reasons"]) for slot in actual] == \
+        [(slot["Timestamp"], slot["Score"], slot["Reasons"]) for slot in expected]
+    print("same slots: {}".format(same))
+
+if __name__ == "__main__":
+    main()
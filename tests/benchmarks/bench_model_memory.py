@@ -0,0 +1,71 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Memory held by built VMAP documents, as built (lists of children) and once
+# frozen (tuples) and serialized, as the VMAP generation operator does:
+#   python tests/benchmarks/bench_model_memory.py --vmaps 5000 --breaks 10
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import conftest  # noqa: F401 (function directories and environment)
+from vmap_xml.vmap import VMAP
+from vast_xml.vast import VAST
+
+def build_vmap(breaks):
+    vmap = VMAP()
+    for i in range(1, breaks + 1):
+        vast = VAST()
+        ad = vast.attachAd({
+            'id': str(i),
+            'structure': 'inline',
+            'AdSystem': {'name': '2.0'},
+            'AdTitle': 'midroll-{}-ad-1'.format(i)
+        })
+        ad.attachImpression({})
+        creative = ad.attachCreative('Linear', {'Duration': '00:00:15'})
+        creative.attachMediaFile('https://ads.example.com/{}.mp4'.format(i), {
+            'id': 'midroll-{}-ad-1'.format(i),
+            'type': 'video/mp4',
+            'delivery': 'progressive',
+            'width': '1920',
+            'height': '1080'
+        })
+        ad_break = vmap.attachAdBreak({
+            'timeOffset': '00:{:02d}:00.000'.format(i),
+            'breakType': 'linear',
+            'breakId': 'midroll-{}'.format(i)
+        })
+        ad_break.attachAdSource('midroll-{}-ad-1'.format(i), 'false', 'true', 'VASTAdData', vast)
+    return vmap
+
+def held(vmaps, breaks, serialize):
+    tracemalloc.start()
+    documents = []
+    for _ in range(vmaps):
+        vmap = build_vmap(breaks)
+        if serialize:
+            vmap.freeze()
+            vmap.serialize()
+        documents.append(vmap)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vmaps", type=int, default=5000)
+    parser.add_argument("--breaks", type=int, default=10)
+    args = parser.parse_args()
+
+    built = held(args.vmaps, args.breaks, False)
+    frozen = held(args.vmaps, args.breaks, True)
+    print("{} VMAPs of {} breaks".format(args.vmaps, args.breaks))
+    print("built:      {:.1f} MB".format(built / 1e6))
+    print("frozen:     {:.1f} MB ({:.0%})".format(frozen / 1e6, frozen / built))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Each Lambda function directory is its own import root, as it is once
+# deployed, so tests import its modules directly
+
+import os
+import sys
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Function directories, and the shared layer they import from (the last one
+# first, which is the one whose app module is imported as app)
+FUNCTION_DIRS = ["shared", "input", "ad_decision_server", "vmap_generation", "slot_detection"]
+
+os.environ.setdefault("CONTEXT_INTERVAL_IN_SECONDS", "2")
+os.environ.setdefault("CONTEXT_MIN_CONFIDENCE", "70")
+# Clients are created at import time, and never called by the tests
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("DataplaneEndpoint", "dataplane")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+for function_dir in FUNCTION_DIRS:
+    sys.path.insert(0, os.path.join(ROOT, function_dir))
+
+def load_app(function_dir):
+    # The app module of another function directory, under its own name
+    spec = importlib.util.spec_from_file_location(
+        "{}_app".format(function_dir), os.path.join(ROOT, function_dir, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,66 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Synthetic slot detection inputs: Rekognition results in the dataplane
+# layout, already projected, and the slot candidates of every reason
+
+import random
+
+LABELS = ["Person", "Car", "Tree", "Sea", "Beach", "Dog", "Snow", "Guitar", "Ice", "Robot", "Hair", "Sport"]
+EMOTIONS = ["HAPPY", "SAD", "CALM", "ANGRY"]
+
+def asset_metadata(duration=7200, shots=3000, results=6000, seed=1):
+    rng = random.Random(seed)
+    duration_millis = duration * 1000
+
+    def timestamp():
+        return rng.randint(0, duration_millis)
+
+    def timeline(items):
+        return sorted(items, key=lambda item: item["Timestamp"])
+
+    return {
+        "labelDetection": {"Labels": timeline([{
+            "Timestamp": timestamp(),
+            "Label": {"Name": rng.choice(LABELS), "Confidence": rng.uniform(50, 100)}
+        } for _ in range(results)])},
+        "celebrityRecognition": {"Celebrities": timeline([{
+            "Timestamp": timestamp(),
+            "Celebrity": {"Name": "Celebrity{}".format(rng.randint(0, 20)), "Confidence": rng.uniform(50, 100)}
+        } for _ in range(results // 10)])},
+        "faceDetection": {"Faces": timeline([{
+            "Timestamp": timestamp(),
+            "Face": {"Emotions": [{"Type": rng.choice(EMOTIONS), "Confidence": rng.uniform(0, 100)} for _ in range(3)]}
+        } for _ in range(results // 2)])},
+        "contentModeration": {"ModerationLabels": timeline([{
+            "Timestamp": timestamp(),
+            "ModerationLabel": {"Name": "Moderation{}".format(rng.randint(0, 5)), "Confidence": rng.uniform(50, 100)}
+        } for _ in range(results // 20)])},
+        "shotDetection": {
+            "Segments": [{"Type": "SHOT", "StartTimestampMillis": timestamp()} for _ in range(shots)],
+            "VideoMetadata": [{"DurationMillis": duration_millis}]
+        },
+        "technicalCueDetection": {"Segments": [{
+            "TechnicalCueSegment": {"Type": rng.choice(["BlackFrames", "EndCredits"])},
+            "StartTimestampMillis": timestamp()
+        } for _ in range(shots // 20)]},
+        "Silences": [rng.uniform(3, duration) for _ in range(shots // 10)]
+    }
+
+def slot_candidates(metadata):
+    def cues(cue_type):
+        return [float(segment["StartTimestampMillis"]) / 1000.0
+                for segment in metadata["technicalCueDetection"]["Segments"]
+                if segment["TechnicalCueSegment"]["Type"] == cue_type]
+    reasons_timestamps = {
+        "Silence": metadata["Silences"],
+        "BlackFrame": cues("BlackFrames"),
+        "ShotChange": [float(segment["StartTimestampMillis"]) / 1000.0
+                       for segment in metadata["shotDetection"]["Segments"]],
+        "EndCredits": cues("EndCredits")
+    }
+    return [{"Timestamp": float(timestamp), "Score": 1.0, "Reasons": [reason]}
+            for reason in reasons_timestamps for timestamp in reasons_timestamps[reason]]
+
+def media_info(metadata):
+    return metadata["shotDetection"]["VideoMetadata"][0]
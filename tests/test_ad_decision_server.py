@@ -0,0 +1,92 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import asyncio
+import xml.etree.ElementTree as ElementTree
+import pytest
+
+import server
+from server import VMAPDocument, FileSource, etag_matches, VMAP_KEY
+
+VMAP = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<vmap:VMAP xmlns:vmap="http://www.iab.net/videosuite/vmap" version="1.0">'
+    '<vmap:AdBreak breakId="[session.id]" breakType="linear" timeOffset="00:00:10.000">'
+    '<vmap:AdSource allowMultipleAds="false" followRedirects="true" id="midroll-1-ad-1">'
+    '<vmap:AdTagURI templateType="vast3"><![CDATA[https://ads.example.com/vast?device=[player_params.device]'
+    '&avail=[avail.index]]]></vmap:AdTagURI>'
+    '</vmap:AdSource>'
+    '<vmap:TrackingEvents><vmap:Tracking event="error"><![CDATA[https://ads.example.com/error?code=[ERRORCODE]]]>'
+    '</vmap:Tracking></vmap:TrackingEvents>'
+    '<Title>[player_params.title]</Title>'
+    '</vmap:AdBreak></vmap:VMAP>'
+).encode('utf-8')
+
+def render(params):
+    body, etag = VMAPDocument(VMAP, '"source"').render(params)
+    return ElementTree.fromstring(body), etag
+
+def test_only_known_macros_are_substituted():
+    document, _ = render({'ERRORCODE': '900', 'session.id': 'abc'})
+    tracking = document.find('.//{http://www.iab.net/videosuite/vmap}Tracking')
+    assert tracking.text == 'https://ads.example.com/error?code=[ERRORCODE]'
+    assert document.find('.//{http://www.iab.net/videosuite/vmap}AdBreak').get('breakId') == 'abc'
+
+def test_macro_values_are_escaped_for_their_context():
+    tricky = 'a&b<c>"d"]]>e'
+    document, _ = render({'session.id': tricky, 'player_params.device': tricky, 'player_params.title': tricky})
+    ad_break = document.find('.//{http://www.iab.net/videosuite/vmap}AdBreak')
+    # In an attribute and in text, escaped
+    assert ad_break.get('breakId') == tricky
+    assert ad_break.find('Title').text == tricky
+    # In CDATA, as is (the section is split around ]]>)
+    ad_tag = document.find('.//{http://www.iab.net/videosuite/vmap}AdTagURI')
+    assert ad_tag.text == 'https://ads.example.com/vast?device={}&avail=[avail.index]'.format(tricky)
+
+def test_sessions_with_the_same_values_share_an_etag():
+    _, etag = render({'session.id': 'abc', 'other': '1'})
+    assert render({'session.id': 'abc', 'other': '2'})[1] == etag
+    assert render({'session.id': 'def'})[1] != etag
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ('*', True),
+    ('"abcd"', False),
+    ('"xabc"', False),
+    ('"ab", "c"', False),
+    ('', False)
+])
+def test_if_none_match_is_parsed(header, matches):
+    assert etag_matches(header, '"abc"') == matches
+
+def test_conditional_requests(tmp_path):
+    path = tmp_path / VMAP_KEY.format('asset')
+    os.makedirs(str(path.parent))
+    path.write_bytes(VMAP)
+
+    async def request(port, if_none_match=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        head = 'GET /assets/asset/vmap/ad_breaks.vmap?session.id=abc HTTP/1.1\r\nHost: test\r\nConnection: close\r\n'
+        if if_none_match is not None:
+            head += 'If-None-Match: {}\r\n'.format(if_none_match)
+        writer.write((head + '\r\n').encode('latin-1'))
+        response = await reader.read()
+        writer.close()
+        lines = response.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        headers = dict(line.split(': ', 1) for line in lines[1:])
+        return int(lines[0].split(' ')[1]), headers.get('ETag')
+
+    async def run():
+        _, listener = await server.serve('127.0.0.1', 0, FileSource(str(tmp_path)))
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            status, etag = await request(port)
+            assert status == 200
+            assert (await request(port, etag))[0] == 304
+            assert (await request(port, '"other", W/{}'.format(etag)))[0] == 304
+            assert (await request(port, etag[:-2] + '"'))[0] == 200
+
+    asyncio.run(run())
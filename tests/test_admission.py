@@ -0,0 +1,174 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import datetime
+import pytest
+
+from admission import Dispatcher, InMemoryQueue, Lane, SQSQueue, TokenBucket, choose_lane, enqueue
+
+# Receives before SQS moves a message to the dead-letter queue (template.yaml)
+MAX_RECEIVE_COUNT = 10
+
+class Clock(object):
+    # Simulated time, advanced by the sleeps of the dispatcher
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def receive_counts(queue):
+    return [message.get('ReceiveCount', 0) for message in list(queue.visible) + list(queue.hidden.values())]
+
+def dispatcher(lanes, clock, started, running=None, rate=0.2, burst=5, max_in_flight=0):
+    def start(bucket, key, lane, metadata):
+        started.append((clock(), key, lane))
+    def in_flight():
+        return running() if running is not None else {}
+    return Dispatcher(lanes, start, in_flight, rate, burst, max_in_flight,
+                      clock=clock, wall_clock=clock, sleep=clock.sleep)
+
+def test_token_bucket_rejects_a_rate_that_is_not_positive():
+    for rate in (0, 0.0, -1):
+        with pytest.raises(ValueError):
+            TokenBucket(rate, 5)
+
+def test_token_bucket_takes_available_tokens_only():
+    clock = Clock()
+    bucket = TokenBucket(1.0, 3, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire(10.0, count=5) == 3
+    # Waits for the next token, then only that one is available
+    assert bucket.acquire(10.0, count=5) == 1
+    assert clock.now == pytest.approx(1.0)
+    bucket.refund(1)
+    assert bucket.acquire(clock.now, count=5) == 1
+    assert bucket.acquire(clock.now + 0.5) == 0
+
+def test_waiting_messages_are_not_received_again_and_again():
+    # 60 uploads at 0.2 starts per second: most of them wait for several
+    # dispatches, but none is received more than once
+    clock = Clock()
+    lane = Lane('default', InMemoryQueue())
+    for i in range(60):
+        enqueue(lane, 'input', 'upload-{}.mp4'.format(i), clock=clock)
+    started = []
+    dispatch = dispatcher([lane], clock, started)
+    while lane.queue.depth():
+        begin = clock.now
+        dispatch.dispatch(50.0)
+        assert max(receive_counts(lane.queue) or [0]) <= 1
+        clock.now = max(clock.now, begin + 60.0)
+    assert sorted(key for _, key, _ in started) == sorted('upload-{}.mp4'.format(i) for i in range(60))
+
+def test_starts_keep_to_the_rate():
+    clock = Clock()
+    lane = Lane('default', InMemoryQueue())
+    for i in range(30):
+        enqueue(lane, 'input', 'upload-{}.mp4'.format(i), clock=clock)
+    started = []
+    stats = dispatcher([lane], clock, started, rate=0.5, burst=5).dispatch(20.0)
+    # The burst, then one start every 2 seconds
+    assert stats['default']['Started'] == len(started) == 5 + 10
+    for i, (at, _, _) in enumerate(started[5:]):
+        assert at == pytest.approx(2.0 * (i + 1))
+    assert lane.queue.depth() == 15
+    assert receive_counts(lane.queue) == [0] * 15
+
+def test_full_lanes_are_not_received_from():
+    clock = Clock()
+    lanes = [Lane('short', InMemoryQueue(), max_in_flight=2, max_seconds=600), Lane('bulk', InMemoryQueue())]
+    for i in range(6):
+        duration = 60 if i % 2 else 3600
+        enqueue(choose_lane(lanes, duration), 'input', 'upload-{}.mp4'.format(i), duration, clock=clock)
+    started = []
+    def running():
+        counts = {}
+        for _, _, lane in started:
+            counts[lane] = counts.get(lane, 0) + 1
+        return counts
+    dispatch = dispatcher(lanes, clock, started, running=running, rate=10.0, burst=10)
+    dispatch.dispatch(20.0)
+    assert [lane for _, _, lane in started].count('short') == 2
+    assert [lane for _, _, lane in started].count('bulk') == 3
+    # The short-form uploads left wait for running workflows, unreceived
+    assert lanes[0].queue.depth() == 1
+    assert receive_counts(lanes[0].queue) == [0]
+
+def test_failed_starts_return_to_the_queue():
+    clock = Clock()
+    lane = Lane('default', InMemoryQueue())
+    for i in range(3):
+        enqueue(lane, 'input', 'upload-{}.mp4'.format(i), clock=clock)
+    def start(bucket, key, lane, metadata):
+        raise Exception('Workflow API is unavailable')
+    stats = Dispatcher([lane], start, dict, 1.0, 5, 0, clock=clock, wall_clock=clock,
+                       sleep=clock.sleep).dispatch(10.0)
+    assert stats['default']['Failed'] == 1
+    assert lane.queue.depth() == 3
+    assert [json.loads(message['Body'])['S3Key'] for message in lane.queue.visible] == \
+        ['upload-{}.mp4'.format(i) for i in range(3)]
+    assert all(count < MAX_RECEIVE_COUNT for count in receive_counts(lane.queue))
+
+def test_aged_lanes_are_served_first_in_a_new_dispatch():
+    # Lanes are created again by every invocation: aging comes from the age
+    # of the oldest start of the queue, before the lane has started anything
+    clock = Clock()
+    queues = [InMemoryQueue(clock), InMemoryQueue(clock)]
+    def lanes():
+        return [Lane('short', queues[0], max_seconds=600), Lane('bulk', queues[1], aging_seconds=3600)]
+    enqueue(lanes()[1], 'input', 'feature.mp4', 5400, clock=clock)
+    clock.now = 3000.0
+    for i in range(3):
+        enqueue(lanes()[0], 'input', 'clip-{}.mp4'.format(i), 30, clock=clock)
+    started = []
+    dispatcher(lanes(), clock, started, rate=1.0, burst=1).dispatch(1.5)
+    assert [key for _, key, _ in started] == ['clip-0.mp4', 'clip-1.mp4']
+
+    clock.now = 3600.0
+    enqueue(lanes()[0], 'input', 'clip-3.mp4', 30, clock=clock)
+    started = []
+    dispatcher(lanes(), clock, started, rate=1.0, burst=1).dispatch(1.5)
+    assert [key for _, key, _ in started] == ['feature.mp4', 'clip-2.mp4']
+
+def test_oldest_age_of_in_memory_queues():
+    clock = Clock()
+    queue = InMemoryQueue(clock)
+    assert queue.oldest_age() == 0.0
+    queue.send('first')
+    clock.now = 10.0
+    queue.send('second')
+    clock.now = 25.0
+    assert queue.oldest_age() == 25.0
+    message = queue.receive(1)[0]
+    assert queue.oldest_age() == 15.0
+    queue.release(message)
+    assert queue.oldest_age() == 25.0
+
+class CloudWatch(object):
+    def __init__(self, datapoints):
+        self.datapoints = datapoints
+        self.requests = []
+
+    def get_metric_statistics(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'Datapoints': self.datapoints}
+
+def test_oldest_age_of_sqs_queues_from_cloudwatch():
+    url = 'https://sqs.us-east-1.amazonaws.com/123456789012/WorkflowAdmissionQueue'
+    assert SQSQueue(None, url).oldest_age() == 0.0
+    assert SQSQueue(None, url, CloudWatch([])).oldest_age() == 0.0
+    now = datetime.datetime.utcnow()
+    cloudwatch = CloudWatch([
+        {'Timestamp': now - datetime.timedelta(minutes=2), 'Maximum': 4000.0},
+        {'Timestamp': now - datetime.timedelta(minutes=1), 'Maximum': 120.0}
+    ])
+    # The latest datapoint, not the largest
+    assert SQSQueue(None, url, cloudwatch).oldest_age() == 120.0
+    request = cloudwatch.requests[0]
+    assert request['Namespace'] == 'AWS/SQS'
+    assert request['MetricName'] == 'ApproximateAgeOfOldestMessage'
+    assert request['Dimensions'] == [{'Name': 'QueueName', 'Value': 'WorkflowAdmissionQueue'}]
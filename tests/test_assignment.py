@@ -0,0 +1,111 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+from collections import Counter
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from assignment import assign_ads, similarity_matrix
+from catalog import AdCatalog, compile_ads
+
+LABELS = ["Beach", "Sea", "Car", "Road", "City", "Food", "Kitchen", "Dog", "Park", "Snow", "Mountain", "Music"]
+
+def catalog_of(ads):
+    return AdCatalog(compile_ads(ads))
+
+def random_ads(rng, count, categories):
+    return [{
+        "url": "https://ads.example.com/{}.mp4".format(i),
+        "labels": rng.sample(LABELS, rng.randint(1, 4)),
+        "category": "category-{}".format(i % categories) if categories else None
+    } for i in range(count)]
+
+def random_slots(rng, count):
+    # Timestamps out of slot order, so timeline positions differ from indexes
+    labels = [rng.sample(LABELS, rng.randint(1, 5)) for _ in range(count)]
+    timestamps = rng.sample(range(0, 60 * count, 60), count)
+    return labels, [float(timestamp) for timestamp in timestamps]
+
+def test_similarity_matrix_is_the_weighted_jaccard_of_slots_and_ads():
+    rng = random.Random(0)
+    ads = random_ads(rng, 20, 0)
+    slot_labels, _ = random_slots(rng, 6)
+    weights = {"Beach": 2.0, "Car": 0.0, "Music": 0.5}
+    similarities = similarity_matrix(catalog_of(ads), slot_labels, weights)
+    for row, labels in enumerate(slot_labels):
+        for column, ad in enumerate(ads):
+            labels_set, ad_set = set(labels), set(ad["labels"])
+            shared = sum(weights.get(name, 1.0) for name in labels_set & ad_set)
+            total = sum(weights.get(name, 1.0) for name in labels_set | ad_set)
+            assert similarities[row, column] == pytest.approx(shared / total if total else 0.0, abs=1e-6)
+
+@pytest.mark.parametrize("frequency_cap", [1, 2, 3])
+def test_frequency_cap_is_respected(frequency_cap):
+    rng = random.Random(frequency_cap)
+    ads = random_ads(rng, 12, 0)
+    slot_labels, slot_timestamps = random_slots(rng, 12)
+    assigned = assign_ads(catalog_of(ads), slot_labels, slot_timestamps, random.Random(0),
+                          frequency_cap=frequency_cap, separation=0)
+    assert len(assigned) == len(slot_labels)
+    assert max(Counter(assigned).values()) <= frequency_cap
+
+def test_best_ad_is_assigned_when_it_is_not_capped():
+    ads = [
+        {"url": "beach", "labels": ["Beach", "Sea"], "category": "travel"},
+        {"url": "car", "labels": ["Car", "Road"], "category": "auto"},
+        {"url": "food", "labels": ["Food", "Kitchen"], "category": "food"}
+    ]
+    slot_labels = [["Food", "Kitchen"], ["Beach", "Sea"], ["Car", "Road"]]
+    assert assign_ads(catalog_of(ads), slot_labels, [0.0, 60.0, 120.0], random.Random(0)) == [2, 0, 1]
+
+@pytest.mark.parametrize("separation", [1, 2, 3])
+def test_same_category_ads_are_kept_apart(separation):
+    rng = random.Random(separation)
+    ads = random_ads(rng, 40, 10)
+    for seed in range(10):
+        slot_labels, slot_timestamps = random_slots(rng, 10)
+        catalog = catalog_of(ads)
+        assigned = assign_ads(catalog, slot_labels, slot_timestamps, random.Random(seed),
+                              frequency_cap=1, separation=separation)
+        timeline = [catalog.categories[ad] for _, ad in sorted(zip(slot_timestamps, assigned))]
+        for position, category in enumerate(timeline):
+            assert category not in timeline[position + 1:position + 1 + separation]
+
+def test_slots_without_similar_ads_get_random_eligible_ads():
+    ads = [{"url": str(i), "labels": ["Beach"], "category": None} for i in range(3)]
+    # No label in common with any ad: every slot falls back, within the cap
+    assigned = assign_ads(catalog_of(ads), [["Snow"], ["Dog"], ["Music"]], [0.0, 60.0, 120.0],
+                          random.Random(0), frequency_cap=1)
+    assert sorted(assigned) == [0, 1, 2]
+
+def test_slots_get_any_ad_when_every_candidate_is_blocked():
+    # Two ads of the same category and three adjacent slots: the middle and
+    # last slots have every ad closed by the cap or the separation
+    ads = [
+        {"url": "first", "labels": ["Beach"], "category": "travel"},
+        {"url": "second", "labels": ["Sea"], "category": "travel"}
+    ]
+    slot_labels = [["Beach"], ["Sea"], ["Beach", "Sea"]]
+    for seed in range(20):
+        assigned = assign_ads(catalog_of(ads), slot_labels, [0.0, 60.0, 120.0], random.Random(seed),
+                              frequency_cap=1, separation=1)
+        assert len(assigned) == 3
+        assert all(ad in (0, 1) for ad in assigned)
+
+def test_no_slots_get_no_ads():
+    ads = [{"url": "first", "labels": ["Beach"]}]
+    assert assign_ads(catalog_of(ads), [], [], random.Random(0)) == []
+
+def test_assignment_is_deterministic_for_a_seeded_rng():
+    rng = random.Random(7)
+    # Few labels, so many ties are broken by the rng
+    ads = [{"url": str(i), "labels": [LABELS[i % 3]], "category": "category-{}".format(i % 4)} for i in range(24)]
+    slot_labels = [[LABELS[i % 3]] for i in range(12)] + [["Unknown"]] * 4
+    slot_timestamps = [float(timestamp) for timestamp in rng.sample(range(0, 960, 60), 16)]
+    catalog = catalog_of(ads)
+    runs = [assign_ads(catalog, slot_labels, slot_timestamps, random.Random(seed), frequency_cap=1, separation=2)
+            for seed in (1, 1, 2)]
+    assert runs[0] == runs[1]
+    assert runs[0] != runs[2]
@@ -0,0 +1,28 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pytest
+
+from audience import parse_audience_segments
+
+def test_valid_segments_are_loaded():
+    segments = [
+        {'Name': 'sports_fans-1', 'CatalogKey': 'sports.json', 'LabelWeights': {'Sport': 2, 'Ball': 0.5, 'Car': 0}},
+        {'Name': 'default'}
+    ]
+    assert parse_audience_segments(json.dumps(segments)) == segments
+
+@pytest.mark.parametrize("name", ['', '../default', 'a/b', 'a b', 'ü', 'x' * 65, None, 1])
+def test_unsafe_segment_names_are_rejected(name):
+    with pytest.raises(ValueError):
+        parse_audience_segments(json.dumps([{'Name': name}]))
+
+def test_duplicate_segment_names_are_rejected():
+    with pytest.raises(ValueError):
+        parse_audience_segments(json.dumps([{'Name': 'a'}, {'Name': 'a'}]))
+
+@pytest.mark.parametrize("weight", [-1, -0.5, '2', None, True, float('nan'), float('inf'), [1]])
+def test_invalid_label_weights_are_rejected(weight):
+    with pytest.raises(ValueError):
+        parse_audience_segments(json.dumps([{'Name': 'a', 'LabelWeights': {'Sport': weight}}]))
@@ -0,0 +1,46 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import pytest
+
+from breaks import select_breaks
+
+def sorted_select_breaks(slots, count, min_gap=0.0, pre_roll=0.0, post_roll=0.0, duration=None):
+    # Every slot sorted by score, the last one first among equal scores
+    selected = []
+    if count == 0:
+        return selected
+    for i in sorted(range(len(slots)), key=lambda i: (slots[i]["Score"], i), reverse=True):
+        timestamp = slots[i]["Timestamp"]
+        if timestamp < pre_roll or (duration is not None and timestamp > duration - post_roll):
+            continue
+        if any(abs(timestamp - other["Timestamp"]) < min_gap for other in selected):
+            continue
+        selected.append(slots[i])
+        if len(selected) == count:
+            break
+    selected.reverse()
+    return selected
+
+@pytest.mark.parametrize("count, min_gap, pre_roll, post_roll, seed", [
+    (3, 0.0, 0.0, 0.0, 1),
+    (12, 600.0, 0.0, 0.0, 2),
+    (12, 60.0, 120.0, 300.0, 3),
+    (50, 1000.0, 0.0, 0.0, 4),
+    (0, 0.0, 0.0, 0.0, 5)
+])
+def test_select_breaks_matches_sorting_every_slot(count, min_gap, pre_roll, post_roll, seed):
+    rng = random.Random(seed)
+    duration = 7200.0
+    # Rounded scores, so there are ties
+    slots = [{"Timestamp": rng.uniform(0, duration), "Score": round(rng.random(), 2)} for _ in range(2000)]
+    expected = sorted_select_breaks(slots, count, min_gap, pre_roll, post_roll, duration)
+    actual = select_breaks(slots, count, min_gap=min_gap, pre_roll=pre_roll, post_roll=post_roll, duration=duration)
+    assert [id(slot) for slot in actual] == [id(slot) for slot in expected]
+
+def test_select_breaks_returns_fewer_breaks_when_slots_run_out():
+    # Breaks exactly min_gap apart are kept
+    slots = [{"Timestamp": 10.0 * i, "Score": 1.0} for i in range(10)]
+    breaks = select_breaks(slots, 5, min_gap=30.0)
+    assert sorted(slot["Timestamp"] for slot in breaks) == [0.0, 30.0, 60.0, 90.0]
@@ -0,0 +1,48 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import random
+import pytest
+
+from catalog import AdCatalog, compile_ads
+from conftest import ROOT
+
+with open(os.path.join(ROOT, "vmap_generation", "ads.json")) as json_file:
+    ADS = json.load(json_file)["ads"]
+
+def similarity(labels, ad):
+    labels = set(labels)
+    ad_labels = set(ad["labels"])
+    return len(labels & ad_labels) / len(labels | ad_labels)
+
+@pytest.mark.parametrize("minhash_bands", [0, 16])
+def test_select_does_not_add_slot_labels_to_the_vocabulary(minhash_bands):
+    catalog = AdCatalog(compile_ads(ADS), minhash_bands=minhash_bands)
+    names = list(catalog.vocabulary.names)
+    for i in range(100):
+        catalog.select(["Beach", "Sea", "Unknown{}".format(i)], random.Random(i))
+    catalog.select(["Unknown"], random.Random(0))
+    assert catalog.vocabulary.names == names
+    assert len(catalog.vocabulary.ids) == len(names)
+
+def test_unknown_labels_count_in_the_similarity():
+    catalog = AdCatalog(compile_ads(ADS))
+    labels = ["Beach", "Sea", "Sand Castle", "Surfboard", "Sea"]
+    ad, top_similarity = catalog.select(labels, random.Random(0))
+    assert ad["url"] == ADS[0]["url"]
+    assert top_similarity == pytest.approx(similarity(labels, ADS[0]))
+    assert top_similarity == max(similarity(labels, other) for other in ADS)
+
+def test_unknown_labels_only_select_a_random_ad():
+    catalog = AdCatalog(compile_ads(ADS))
+    ad, top_similarity = catalog.select(["Unknown"], random.Random(0))
+    assert top_similarity == 0.0
+    assert ad["url"] in [other["url"] for other in ADS]
+
+def test_ad_labels_are_the_catalog_labels():
+    catalog = AdCatalog(compile_ads(ADS))
+    for i, ad in enumerate(ADS):
+        assert catalog.ad(i)["url"] == ad["url"]
+        assert sorted(catalog.ad(i)["labels"]) == sorted(set(ad["labels"]))
@@ -0,0 +1,67 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import os
+import json
+import pickle
+import pytest
+
+pytest.importorskip("botocore")
+
+from botocore.exceptions import ClientError
+
+from catalog import compile_ads
+from catalog_loader import CatalogLoader, load_compiled, encode_compiled
+from conftest import ROOT
+
+with open(os.path.join(ROOT, "vmap_generation", "ads.json")) as json_file:
+    ADS = json.load(json_file)["ads"]
+
+class CatalogS3(object):
+    # Conditional GETs of one object
+    def __init__(self, body, etag='"1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.requests.append(IfNoneMatch)
+        if IfNoneMatch == self.etag:
+            raise ClientError({'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        return {'Body': io.BytesIO(self.body), 'ETag': self.etag}
+
+def test_compiled_catalog_round_trips_through_json():
+    # Label bitsets wider than the digit limit of int() on decimal strings
+    ads = ADS + [{'url': 'https://ads.example.com/{}.mp4'.format(i), 'labels': ['Label{}'.format(i)]}
+                 for i in range(20000)]
+    compiled = compile_ads(ads)
+    assert load_compiled(json.dumps(encode_compiled(compiled))) == compiled
+    assert load_compiled(json.dumps({'ads': ads})) == compiled
+
+def test_pickled_catalogs_are_rejected():
+    with pytest.raises(ValueError):
+        load_compiled(pickle.dumps(compile_ads(ADS)))
+    with pytest.raises(ValueError):
+        load_compiled(json.dumps({'Names': [], 'Urls': [], 'Bitsets': [], 'Postings': []}))
+
+def test_cached_catalog_is_revalidated(tmp_path):
+    cache_path = str(tmp_path / 'ads_catalog.json')
+    s3 = CatalogS3(json.dumps({'ads': ADS}).encode('utf-8'))
+    catalog = CatalogLoader(s3, 'bucket', 'ads.json', cache_path).get()
+    with open(cache_path) as cache_file:
+        assert json.load(cache_file)['ETag'] == '"1"'
+    # A new container starts from the cache and only revalidates it
+    cached = CatalogLoader(s3, 'bucket', 'ads.json', cache_path).get()
+    assert s3.requests == [None, '"1"']
+    assert cached.urls == catalog.urls
+    assert cached.bitsets == catalog.bitsets
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    cache_path = str(tmp_path / 'ads_catalog.json')
+    with open(cache_path, 'wb') as cache_file:
+        pickle.dump({'Bucket': 'bucket', 'Key': 'ads.json'}, cache_file)
+    s3 = CatalogS3(json.dumps({'ads': ADS}).encode('utf-8'))
+    catalog = CatalogLoader(s3, 'bucket', 'ads.json', cache_path).get()
+    assert s3.requests == [None]
+    assert len(catalog.urls) == len(ADS)
@@ -0,0 +1,234 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import os
+import json
+import copy
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import ROOT, load_app
+from dedupe import VMAP_KEY, DedupeIndex, DynamoDBStore, LocalStore
+from workflow import start_workflow
+
+PENDING_SECONDS = 3600
+FINGERPRINT = 'etag:abc:100'
+# Outputs of an asset, named after it
+OUTPUTS = [
+    'private/assets/{0}/hls/{0}_hls.m3u8',
+    'private/assets/{0}/proxy/{0}_proxy.mp4',
+    'private/assets/{0}/loudness/{0}_loudness.csv',
+    VMAP_KEY
+]
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+class S3(object):
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise Exception('Not Found')
+        return {'ContentLength': len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+class Table(object):
+    # DynamoDB table with the expressions of the dedupe index only
+    class meta(object):
+        class client(object):
+            class exceptions(object):
+                ConditionalCheckFailedException = ConditionalCheckFailedException
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get(Key['Id'])
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None):
+        with self.lock:
+            if ConditionExpression == 'attribute_not_exists(Id)' and Item['Id'] in self.items:
+                raise ConditionalCheckFailedException()
+            self.items[Item['Id']] = copy.deepcopy(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ReturnValues=None):
+        values = ExpressionAttributeValues
+        with self.lock:
+            item = self.items.setdefault(Key['Id'], dict(Key))
+            if ConditionExpression == 'SourceKey = :source_key' and item.get('SourceKey') != values[':source_key']:
+                raise ConditionalCheckFailedException()
+            if UpdateExpression == 'SET SourceKey = :key, ClaimedAt = :claimed_at':
+                item.update(SourceKey=values[':key'], ClaimedAt=values[':claimed_at'])
+            elif UpdateExpression == 'ADD Waiting :keys':
+                item['Waiting'] = item.get('Waiting', set()) | values[':keys']
+            elif UpdateExpression == 'DELETE Waiting :keys':
+                item['Waiting'] = item.get('Waiting', set()) - values[':keys']
+                if not item['Waiting']:
+                    del item['Waiting']
+            else:
+                raise ValueError(UpdateExpression)
+            return {'Attributes': copy.deepcopy(item)}
+
+@pytest.fixture(params=['local', 'dynamodb'])
+def dedupe(request):
+    clock = Clock()
+    s3 = S3()
+    store = LocalStore() if request.param == 'local' else DynamoDBStore(Table())
+    return DedupeIndex(store, s3, 'dataplane', pending_seconds=PENDING_SECONDS, clock=clock), s3, clock
+
+def complete(dedupe_index, s3, key, asset_id):
+    # Outputs of the workflow of the key, and the item the VMAP generation operator records
+    for output in OUTPUTS:
+        s3.objects[output.format(asset_id)] = '{} of {}'.format(output, asset_id).encode('utf-8')
+    dedupe_index.store.put({'Id': 'key:' + key, 'AssetId': asset_id})
+
+def test_new_content_is_claimed_by_its_first_upload(dedupe):
+    dedupe_index, s3, clock = dedupe
+    assert dedupe_index.find(FINGERPRINT, 'first.mp4') == {'Status': 'New'}
+    assert dedupe_index.store.get(FINGERPRINT) == \
+        {'Id': FINGERPRINT, 'SourceKey': 'first.mp4', 'ClaimedAt': int(clock.now)}
+
+def test_duplicates_resolve_to_the_outputs_of_the_source(dedupe):
+    dedupe_index, s3, clock = dedupe
+    dedupe_index.find(FINGERPRINT, 'first.mp4')
+    complete(dedupe_index, s3, 'first.mp4', 'asset-1')
+    assert dedupe_index.resolve('second.mp4') is None
+    assert dedupe_index.find(FINGERPRINT, 'second.mp4') == {'Status': 'Duplicate', 'AssetId': 'asset-1'}
+    assert dedupe_index.reuse('asset-1', 'second.mp4') == 'asset-1'
+    # Every output of the source, read through the key of the duplicate
+    asset_id = dedupe_index.resolve('second.mp4')
+    for output in OUTPUTS:
+        body = s3.get_object(Bucket='dataplane', Key=output.format(asset_id))['Body'].read()
+        assert body == '{} of asset-1'.format(output).encode('utf-8')
+    assert dedupe_index.store.get(FINGERPRINT)['SourceKey'] == 'first.mp4'
+
+def test_duplicates_wait_for_the_content_being_processed(dedupe):
+    dedupe_index, s3, clock = dedupe
+    dedupe_index.find(FINGERPRINT, 'first.mp4')
+    clock.now += PENDING_SECONDS - 1
+    # No second workflow, and the source stays
+    assert dedupe_index.find(FINGERPRINT, 'second.mp4') == {'Status': 'Pending', 'SourceKey': 'first.mp4'}
+    assert dedupe_index.find(FINGERPRINT, 'third.mp4') == {'Status': 'Pending', 'SourceKey': 'first.mp4'}
+    item = dedupe_index.store.get(FINGERPRINT)
+    assert item['SourceKey'] == 'first.mp4' and set(item['Waiting']) == {'second.mp4', 'third.mp4'}
+
+def test_duplicates_find_a_workflow_that_completed_while_they_were_added(dedupe):
+    dedupe_index, s3, clock = dedupe
+    dedupe_index.find(FINGERPRINT, 'first.mp4')
+    add_waiting = dedupe_index.store.add_waiting
+    def completed_meanwhile(item_id, key):
+        complete(dedupe_index, s3, 'first.mp4', 'asset-1')
+        return add_waiting(item_id, key)
+    dedupe_index.store.add_waiting = completed_meanwhile
+    assert dedupe_index.find(FINGERPRINT, 'second.mp4') == {'Status': 'Duplicate', 'AssetId': 'asset-1'}
+
+def test_failed_sources_are_replaced(dedupe):
+    dedupe_index, s3, clock = dedupe
+    dedupe_index.find(FINGERPRINT, 'first.mp4')
+    dedupe_index.find(FINGERPRINT, 'second.mp4')
+    clock.now += PENDING_SECONDS
+    assert dedupe_index.find(FINGERPRINT, 'third.mp4') == {'Status': 'New'}
+    item = dedupe_index.store.get(FINGERPRINT)
+    assert item['SourceKey'] == 'third.mp4' and item['ClaimedAt'] == int(clock.now)
+    # The duplicates waiting for the failed source wait for the new one
+    assert set(item['Waiting']) == {'second.mp4'}
+
+def test_sources_without_outputs_are_replaced(dedupe):
+    dedupe_index, s3, clock = dedupe
+    dedupe_index.find(FINGERPRINT, 'first.mp4')
+    complete(dedupe_index, s3, 'first.mp4', 'asset-1')
+    s3.objects.clear()
+    assert dedupe_index.find(FINGERPRINT, 'second.mp4') == {'Status': 'New'}
+    assert dedupe_index.store.get(FINGERPRINT)['SourceKey'] == 'second.mp4'
+    complete(dedupe_index, s3, 'second.mp4', 'asset-2')
+    assert dedupe_index.find(FINGERPRINT, 'third.mp4') == {'Status': 'Duplicate', 'AssetId': 'asset-2'}
+
+def test_concurrent_uploads_start_a_single_workflow(dedupe):
+    dedupe_index, s3, clock = dedupe
+    keys = ['upload-{}.mp4'.format(i) for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        found = list(executor.map(lambda key: dedupe_index.find(FINGERPRINT, key), keys))
+    assert [result['Status'] for result in found].count('New') == 1
+    item = dedupe_index.store.get(FINGERPRINT)
+    assert set(item['Waiting']) == set(keys) - {item['SourceKey']}
+
+def test_local_store_conditional_writes():
+    store = LocalStore()
+    assert store.create({'Id': 'a', 'SourceKey': 'first.mp4', 'ClaimedAt': 1})
+    assert not store.create({'Id': 'a', 'SourceKey': 'second.mp4', 'ClaimedAt': 2})
+    store.add_waiting('a', 'second.mp4')
+    assert not store.replace({'Id': 'a', 'SourceKey': 'third.mp4', 'ClaimedAt': 3}, 'second.mp4')
+    assert store.replace({'Id': 'a', 'SourceKey': 'third.mp4', 'ClaimedAt': 3}, 'first.mp4')
+    assert store.get('a') == {'Id': 'a', 'SourceKey': 'third.mp4', 'ClaimedAt': 3, 'Waiting': {'second.mp4'}}
+    assert not store.replace({'Id': 'b', 'SourceKey': 'first.mp4', 'ClaimedAt': 1}, 'first.mp4')
+
+class Operator(object):
+    def __init__(self, metadata):
+        self.input = {'Media': {'Video': {'S3Bucket': 'dataplane', 'S3Key': 'private/assets/x/input/first.mp4'}},
+                      'MetaData': metadata}
+
+class DynamoDB(object):
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+def test_completed_workflows_link_the_duplicates_waiting_for_them(monkeypatch):
+    pytest.importorskip("boto3")
+    pytest.importorskip("MediaInsightsEngineLambdaHelper")
+    monkeypatch.setenv("TOP_SLOTS_QTY", "3")
+    monkeypatch.setenv("DEDUPE_TABLE", "dedupe")
+    # The bundled ads catalog is read from the function directory
+    monkeypatch.chdir(os.path.join(ROOT, "vmap_generation"))
+    app = load_app("vmap_generation")
+    table = Table()
+    monkeypatch.setattr(app.boto3, "resource", lambda name: DynamoDB(table), raising=False)
+    s3 = S3()
+    dedupe_index = DedupeIndex(DynamoDBStore(table), s3, 'dataplane', pending_seconds=PENDING_SECONDS, clock=Clock())
+    assert dedupe_index.find(FINGERPRINT, 'first.mp4') == {'Status': 'New'}
+    assert dedupe_index.find(FINGERPRINT, 'second.mp4')['Status'] == 'Pending'
+
+    s3.objects[VMAP_KEY.format('asset-1')] = b'<vmap:VMAP/>'
+    getattr(app, "__record_asset")(Operator({'IngestKey': 'first.mp4', 'Fingerprint': FINGERPRINT}), 'asset-1')
+    assert dedupe_index.resolve('first.mp4') == dedupe_index.resolve('second.mp4') == 'asset-1'
+    assert 'Waiting' not in table.items[FINGERPRINT]
+    assert dedupe_index.find(FINGERPRINT, 'third.mp4') == {'Status': 'Duplicate', 'AssetId': 'asset-1'}
+
+    # Workflows started without the ingest key are not recorded
+    getattr(app, "__record_asset")(Operator({}), 'asset-2')
+    assert 'key:private/assets/x/input/first.mp4' not in table.items
+
+class LambdaClient(object):
+    def __init__(self):
+        self.requests = []
+
+    def invoke(self, **kwargs):
+        self.requests.append(json.loads(json.loads(kwargs['Payload'])['body']))
+        return {'StatusCode': 200, 'Payload': io.BytesIO(b'{}')}
+
+def test_workflows_carry_the_ingest_key():
+    lambda_client = LambdaClient()
+    start_workflow(lambda_client, 'workflow', 'SmartAdBreaksWorkflow', 'dataplane', 'uploads/first.mp4')
+    start_workflow(lambda_client, 'workflow', 'SmartAdBreaksWorkflow', 'dataplane', 'uploads/second.mp4',
+                   lane='short', metadata={'Fingerprint': FINGERPRINT})
+    assert [request['Input']['MetaData'] for request in lambda_client.requests] == [
+        {'IngestKey': 'uploads/first.mp4'},
+        {'IngestKey': 'uploads/second.mp4', 'Fingerprint': FINGERPRINT, 'AdmissionLane': 'short'}
+    ]
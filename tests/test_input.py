@@ -0,0 +1,61 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import pytest
+
+pytest.importorskip("boto3")
+
+from conftest import load_app
+
+os.environ.setdefault("WORKFLOW_NAME", "SmartAdBreaksWorkflow")
+os.environ.setdefault("WorkflowEndpoint", "workflow")
+os.environ.setdefault("DATAPLANE_BUCKET", "dataplane")
+
+app = load_app("input")
+
+class Context(object):
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:input"
+
+class LambdaClient(object):
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, **kwargs):
+        self.invocations.append(kwargs)
+        return {"StatusCode": 202}
+
+def notification(*keys):
+    return {"Records": [{"s3": {"bucket": {"name": "input"}, "object": {"key": key}}} for key in keys]}
+
+@pytest.fixture
+def lambda_client(monkeypatch):
+    client = LambdaClient()
+    monkeypatch.setattr(app, "lambda_client", client)
+    # Keys starting with "bad" fail to ingest
+    def ingest_record(record):
+        key = record["s3"]["object"]["key"]
+        if key.startswith("bad"):
+            return {"Bucket": "input", "Key": key, "Status": "Failed", "Error": "failed"}
+        return {"Bucket": "input", "Key": key, "Status": "Success"}
+    monkeypatch.setattr(app, "__ingest_record", ingest_record)
+    return client
+
+def test_ingested_records_are_not_retried(lambda_client):
+    response = app.lambda_handler(notification("a.mp4", "b.mp4"), Context())
+    assert [result["Status"] for result in response["Records"]] == ["Success", "Success"]
+    assert lambda_client.invocations == []
+
+def test_only_failed_records_are_retried(lambda_client):
+    event = notification("a.mp4", "bad1.mp4", "b.mp4", "bad2.mp4")
+    app.lambda_handler(event, Context())
+    invocation, = lambda_client.invocations
+    assert invocation["FunctionName"] == Context.invoked_function_arn
+    assert invocation["InvocationType"] == "Event"
+    assert json.loads(invocation["Payload"]) == {"Records": [event["Records"][1], event["Records"][3]]}
+
+def test_invocation_fails_when_every_record_fails(lambda_client):
+    with pytest.raises(Exception, match="bad1.mp4, bad2.mp4"):
+        app.lambda_handler(notification("bad1.mp4", "bad2.mp4"), Context())
+    assert lambda_client.invocations == []
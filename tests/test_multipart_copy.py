@@ -0,0 +1,114 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import threading
+import pytest
+
+import multipart_copy
+from multipart_copy import copy_object, MB
+
+class LocalS3(object):
+    # Local stand-in for the S3 calls of a copy, objects held in memory
+    def __init__(self, fail_parts=(), fail_abort=False):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.attempts = {}
+        self.fail_parts = dict(fail_parts)
+        self.fail_abort = fail_abort
+        self.lock = threading.Lock()
+
+    def put(self, bucket, key, body, content_type='video/mp4'):
+        self.objects[(bucket, key)] = {
+            'Body': body,
+            'ETag': '"{}"'.format(hashlib.md5(body).hexdigest()),
+            'ContentType': content_type,
+            'Metadata': {'source': 'test'}
+        }
+
+    def head_object(self, Bucket, Key):
+        item = self.objects[(Bucket, Key)]
+        return {'ContentLength': len(item['Body']), 'ETag': item['ETag'],
+                'ContentType': item['ContentType'], 'Metadata': item['Metadata']}
+
+    def copy_object(self, Bucket, CopySource, Key):
+        self.objects[(Bucket, Key)] = dict(self.objects[(CopySource['Bucket'], CopySource['Key'])])
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, Metadata):
+        upload_id = 'upload-{}'.format(len(self.uploads) + 1)
+        self.uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'ContentType': ContentType,
+                                   'Metadata': Metadata, 'Parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part_copy(self, Bucket, Key, CopySource, CopySourceRange, CopySourceIfMatch, PartNumber, UploadId):
+        with self.lock:
+            self.attempts[PartNumber] = self.attempts.get(PartNumber, 0) + 1
+            # Parts fail the given number of times
+            if self.attempts[PartNumber] <= self.fail_parts.get(PartNumber, 0):
+                raise Exception('Part {} failed'.format(PartNumber))
+        source = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+        if source['ETag'] != CopySourceIfMatch:
+            raise Exception('PreconditionFailed')
+        first, last = (int(offset) for offset in CopySourceRange[len('bytes='):].split('-'))
+        body = source['Body'][first:last + 1]
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        self.uploads[UploadId]['Parts'][PartNumber] = (etag, body)
+        return {'CopyPartResult': {'ETag': etag}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(numbers)
+        for part in MultipartUpload['Parts']:
+            assert upload['Parts'][part['PartNumber']][0] == part['ETag']
+        body = b''.join(upload['Parts'][number][1] for number in numbers)
+        self.put(Bucket, Key, body, upload['ContentType'])
+        self.objects[(Bucket, Key)]['Metadata'] = upload['Metadata']
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        if self.fail_abort:
+            raise Exception('AccessDenied')
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(multipart_copy.time, "sleep", lambda seconds: None)
+
+def body(size):
+    return (bytes(range(251)) * (size // 251 + 1))[:size]
+
+def test_small_objects_are_copied_in_one_call():
+    s3 = LocalS3()
+    s3.put('input', 'video.mp4', body(3 * MB))
+    result = copy_object(s3, 'input', 'video.mp4', 'dataplane', 'video.mp4', threshold=5 * MB)
+    assert result['Parts'] == 1
+    assert s3.objects[('dataplane', 'video.mp4')]['Body'] == body(3 * MB)
+
+def test_large_objects_are_copied_in_parts():
+    s3 = LocalS3(fail_parts={2: 2})
+    s3.put('input', 'video.mp4', body(23 * MB))
+    result = copy_object(s3, 'input', 'video.mp4', 'dataplane', 'video.mp4', threshold=5 * MB, part_size=5 * MB)
+    # 5 MB parts, the last one shorter, and part 2 retried
+    assert result['Parts'] == 5
+    assert s3.attempts[2] == 3
+    copied = s3.objects[('dataplane', 'video.mp4')]
+    assert copied['Body'] == body(23 * MB)
+    assert copied['Metadata'] == {'source': 'test'}
+    assert s3.uploads == {}
+
+def test_failed_copies_are_aborted():
+    s3 = LocalS3(fail_parts={3: 5})
+    s3.put('input', 'video.mp4', body(23 * MB))
+    with pytest.raises(Exception, match='Part 3 failed'):
+        copy_object(s3, 'input', 'video.mp4', 'dataplane', 'video.mp4', threshold=5 * MB, part_size=5 * MB,
+                    max_attempts=5)
+    assert s3.aborted == ['upload-1']
+    assert ('dataplane', 'video.mp4') not in s3.objects
+
+def test_copy_error_is_raised_when_abort_fails():
+    s3 = LocalS3(fail_parts={3: 5}, fail_abort=True)
+    s3.put('input', 'video.mp4', body(23 * MB))
+    with pytest.raises(Exception, match='Part 3 failed'):
+        copy_object(s3, 'input', 'video.mp4', 'dataplane', 'video.mp4', threshold=5 * MB, part_size=5 * MB)
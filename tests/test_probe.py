@@ -0,0 +1,99 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import re
+import struct
+import pytest
+
+from probe import probe_duration
+
+class S3(object):
+    # Ranged GETs of a single object, recorded
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(value) for value in re.match(r'bytes=(\d+)-(\d+)$', Range).groups())
+        self.ranges.append((start, end))
+        return {'Body': io.BytesIO(self.data[start:end + 1])}
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def large_box(box_type, payload=b''):
+    # 64-bit size, after a size of 1
+    return struct.pack('>I4sQ', 1, box_type, 16 + len(payload)) + payload
+
+def mvhd(timescale, duration, version=0):
+    if version == 1:
+        header = struct.pack('>B3xQQIQ', 1, 0, 0, timescale, duration)
+    else:
+        header = struct.pack('>B3xIIII', 0, 0, 0, timescale, duration)
+    # Rate, volume, matrix, pre-defined and next track id
+    return box(b'mvhd', header + b'\x00' * 80)
+
+def moov(*children):
+    return box(b'moov', b''.join(children))
+
+FTYP = box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2mp41')
+MDAT = box(b'mdat', b'\x00' * 200000)
+
+def probe(data):
+    s3 = S3(data)
+    return probe_duration(s3, 'dataplane', 'upload.mp4', len(data)), s3
+
+def test_duration_from_a_movie_header_before_the_media():
+    duration, s3 = probe(FTYP + moov(mvhd(1000, 95500), box(b'trak', b'\x00' * 64)) + MDAT)
+    assert duration == pytest.approx(95.5)
+    # Box headers only, then the movie box
+    assert len(s3.ranges) == 3
+
+def test_duration_from_a_movie_header_after_the_media():
+    duration, s3 = probe(FTYP + box(b'free', b'\x00' * 16) + MDAT + moov(mvhd(600, 600 * 5400)))
+    assert duration == pytest.approx(5400.0)
+    # The media data is skipped over, never read
+    assert sum(end - start + 1 for start, end in s3.ranges) < 1024
+
+def test_duration_from_a_version_1_movie_header():
+    # 64-bit duration, over 2^32 units of a 90 kHz timescale (about 13 hours)
+    duration, _ = probe(FTYP + moov(mvhd(90000, 90000 * 48000, version=1)) + MDAT)
+    assert duration == pytest.approx(48000.0)
+
+def test_duration_after_boxes_with_64_bit_sizes():
+    duration, _ = probe(FTYP + large_box(b'mdat', b'\x00' * 5000) + moov(mvhd(1000, 12000)))
+    assert duration == pytest.approx(12.0)
+
+def test_movie_header_after_other_movie_children():
+    duration, _ = probe(FTYP + moov(box(b'udta', b'\x00' * 32), mvhd(25, 2500)) + MDAT)
+    assert duration == pytest.approx(100.0)
+
+def test_last_box_may_extend_to_the_end_of_the_file():
+    data = FTYP + moov(mvhd(1000, 30000)) + struct.pack('>I4s', 0, b'mdat') + b'\x00' * 1000
+    assert probe(data)[0] == pytest.approx(30.0)
+    # Media data to the end of the file, without a movie box
+    assert probe(FTYP + struct.pack('>I4s', 0, b'mdat') + b'\x00' * 1000)[0] is None
+
+@pytest.mark.parametrize('data', [
+    # MPEG transport stream packets
+    b'\x47\x40\x00\x10' + b'\xff' * 184 * 4,
+    # Matroska/WebM EBML header
+    b'\x1a\x45\xdf\xa3\x93\x42\x82\x88matroska' + b'\x00' * 64,
+    # Text
+    b'not a video at all, just some text',
+    # Too short for a box header
+    b'\x00\x00',
+    b''
+])
+def test_other_containers_have_no_duration(data):
+    assert probe(data)[0] is None
+
+def test_broken_movie_files_have_no_duration():
+    # No movie header, no timescale, truncated header, box smaller than its header
+    assert probe(FTYP + moov(box(b'trak', b'\x00' * 32)) + MDAT)[0] is None
+    assert probe(FTYP + moov(mvhd(0, 1000)))[0] is None
+    assert probe(FTYP + moov(box(b'mvhd', b'\x00' * 8)))[0] is None
+    assert probe(FTYP + struct.pack('>I4s', 4, b'free') + moov(mvhd(1000, 1000)))[0] is None
+    # Movie box announced past the end of the file
+    assert probe(FTYP + MDAT + struct.pack('>I4s', 64, b'mo'))[0] is None
@@ -0,0 +1,169 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import math
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("boto3")
+
+import silence
+
+HEADER = b"Time,Momentary,Integrated,ShortTerm,TruePeak\n"
+
+class Body(object):
+    # Streaming body of S3 responses: lines are split out of chunks of
+    # chunk_size bytes, a line across two chunks is joined (as in botocore)
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.closed = False
+
+    def iter_lines(self, chunk_size=1024):
+        pending = b""
+        while True:
+            chunk = self.stream.read(chunk_size)
+            if not chunk:
+                break
+            lines = (pending + chunk).splitlines(True)
+            for line in lines[:-1]:
+                yield line.splitlines()[0]
+            pending = lines[-1]
+        if pending:
+            yield pending.splitlines()[0]
+
+    def close(self):
+        self.closed = True
+
+class S3(object):
+    def __init__(self, data):
+        self.body = Body(data)
+
+    def get_object(self, Bucket, Key):
+        return {"Body": self.body}
+
+def loudness_log(samples):
+    lines = [HEADER]
+    for second, short_term in samples:
+        lines.append("{},-30.0,-23.0,{},-1.0\n".format(second, short_term).encode("utf-8"))
+    return b"".join(lines)
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    monkeypatch.setenv("START_THRESHOLD_IN_SECONDS", "3")
+    monkeypatch.setenv("SILENT_THRESHOLD", "-50")
+    monkeypatch.setenv("SILENT_EXIT_THRESHOLD", "-45")
+    monkeypatch.setenv("MIN_SILENCE_IN_SECONDS", "0")
+    return monkeypatch
+
+def silent_runs(monkeypatch, samples):
+    monkeypatch.setattr(silence, "s3", S3(loudness_log(samples)))
+    return silence.detect_silent_runs("bucket", "loudness")
+
+def test_runs_enter_below_the_threshold_and_exit_at_the_exit_threshold(thresholds):
+    runs = silent_runs(thresholds, [
+        (4.0, -40.0),
+        # Silent below -50, and still silent between both thresholds
+        (5.0, -52.0), (6.0, -47.0), (7.0, -49.9),
+        # Loud from -45, and still loud between both thresholds
+        (8.0, -45.0), (9.0, -47.0), (10.0, -49.0),
+        (11.0, -51.0), (12.0, -40.0)
+    ])
+    assert [(run["Start"], run["End"]) for run in runs] == [(5.0, 8.0), (11.0, 12.0)]
+    assert [run["Depth"] for run in runs] == pytest.approx([2.0, 1.0])
+
+def test_loudness_at_the_silent_threshold_is_not_silent(thresholds):
+    assert silent_runs(thresholds, [(4.0, -40.0), (5.0, -50.0), (6.0, -50.0), (7.0, -40.0)]) == []
+
+def test_samples_between_thresholds_before_any_decision_are_not_silent(thresholds):
+    runs = silent_runs(thresholds, [(4.0, -47.0), (5.0, -48.0), (6.0, -55.0), (7.0, -48.0)])
+    # Silent until the end of the log
+    assert [(run["Start"], run["End"]) for run in runs] == [(6.0, 7.0)]
+
+def test_samples_before_the_start_threshold_are_ignored(thresholds):
+    runs = silent_runs(thresholds, [(1.0, -60.0), (2.0, -60.0), (3.0, -60.0), (4.0, -60.0), (5.0, -40.0)])
+    assert [(run["Start"], run["End"]) for run in runs] == [(4.0, 5.0)]
+
+def test_runs_shorter_than_the_minimum_duration_are_dropped(thresholds):
+    thresholds.setenv("MIN_SILENCE_IN_SECONDS", "1.5")
+    runs = silent_runs(thresholds, [
+        (4.0, -60.0), (5.0, -40.0),
+        (6.0, -60.0), (7.0, -60.0), (8.0, -40.0),
+        (9.0, -60.0), (10.0, -60.0), (10.25, -40.0),
+        # As long as the minimum duration
+        (11.0, -60.0), (12.5, -40.0)
+    ])
+    assert [(run["Start"], run["End"]) for run in runs] == [(6.0, 8.0), (11.0, 12.5)]
+
+def test_exit_threshold_defaults_to_the_silent_threshold(thresholds):
+    thresholds.delenv("SILENT_EXIT_THRESHOLD")
+    runs = silent_runs(thresholds, [(4.0, -55.0), (5.0, -47.0), (6.0, -55.0), (7.0, -40.0)])
+    assert [(run["Start"], run["End"]) for run in runs] == [(4.0, 5.0), (6.0, 7.0)]
+
+@pytest.mark.parametrize("depth, score", [
+    (1.0, 1.0 - 10.0 ** -0.05),
+    (6.0, 0.4988),
+    (20.0, 0.9),
+    (40.0, 0.99)
+])
+def test_runs_are_scored_by_their_depth_as_an_amplitude_ratio(thresholds, depth, score):
+    runs = silent_runs(thresholds, [(4.0, -40.0), (5.0, -50.0 - depth), (6.0, -48.0), (7.0, -40.0)])
+    assert runs[0]["Depth"] == pytest.approx(depth)
+    assert runs[0]["Score"] == pytest.approx(score, abs=1e-4)
+    assert runs[0]["Score"] == pytest.approx(1.0 - math.pow(10.0, -depth / 20.0))
+
+def test_deeper_runs_score_higher(thresholds):
+    runs = silent_runs(thresholds, [
+        (4.0, -51.0), (5.0, -40.0),
+        (6.0, -70.0), (7.0, -40.0),
+        (8.0, -56.0), (9.0, -40.0)
+    ])
+    assert sorted(runs, key=lambda run: run["Score"]) == [runs[0], runs[2], runs[1]]
+
+def read_loudness(monkeypatch, data, chunk_size=None):
+    s3 = S3(data)
+    monkeypatch.setattr(silence, "s3", s3)
+    if chunk_size is not None:
+        monkeypatch.setattr(silence, "LOUDNESS_CHUNK_SIZE", chunk_size)
+    rows = list(getattr(silence, "__read_loudness")("bucket", "loudness"))
+    assert s3.body.closed
+    return rows
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 13, 64, 1024 * 1024])
+def test_loudness_lines_split_across_chunks_are_parsed_whole(monkeypatch, chunk_size):
+    samples = [(round(3.0 + 0.1 * i, 1), round(-20.0 - 0.37 * i, 2)) for i in range(50)]
+    assert read_loudness(monkeypatch, loudness_log(samples), chunk_size) == samples
+
+def test_loudness_header_and_trailing_newlines_are_skipped(monkeypatch):
+    data = HEADER + b"0.4,-30.0,-23.0,-41.5,-1.0\n0.5,-31.0,-23.0,-60.25,-1.0\n\n"
+    assert read_loudness(monkeypatch, data, 4) == [(0.4, -41.5), (0.5, -60.25)]
+    # Without a trailing newline, and with Windows line endings
+    data = HEADER.replace(b"\n", b"\r\n") + b"0.4,-30.0,-23.0,-41.5,-1.0\r\n0.5,-31.0,-23.0,-60.25,-1.0"
+    assert read_loudness(monkeypatch, data, 4) == [(0.4, -41.5), (0.5, -60.25)]
+
+def test_loudness_columns_after_the_short_term_loudness_are_not_parsed(monkeypatch):
+    # More columns, and values that aren't numbers past the fourth one
+    data = HEADER + b"1.0,-30.0,-23.0,-45.0,-1.0,n/a,extra\n"
+    assert read_loudness(monkeypatch, data) == [(1.0, -45.0)]
+
+def test_empty_loudness_logs_have_no_samples(monkeypatch):
+    assert read_loudness(monkeypatch, b"") == []
+    assert read_loudness(monkeypatch, HEADER) == []
+
+def test_threshold_detector_reads_the_streamed_log(thresholds):
+    thresholds.setattr(silence, "LOUDNESS_CHUNK_SIZE", 5)
+    thresholds.setattr(silence, "s3", S3(loudness_log([
+        (2.0, -60.0), (4.0, -40.0), (5.0, -55.0), (6.0, -58.0), (7.0, -40.0), (8.0, -51.0)
+    ])))
+    assert silence.detect_silences("bucket", "loudness") == [5.0, 8.0]
+
+def test_loudness_is_parsed_from_botocore_streaming_bodies(monkeypatch):
+    response = pytest.importorskip("botocore.response")
+    samples = [(round(3.0 + 0.1 * i, 1), round(-20.0 - 0.37 * i, 2)) for i in range(50)]
+    data = loudness_log(samples)
+    class StreamingS3(object):
+        def get_object(self, Bucket, Key):
+            return {"Body": response.StreamingBody(io.BytesIO(data), len(data))}
+    monkeypatch.setattr(silence, "s3", StreamingS3())
+    monkeypatch.setattr(silence, "LOUDNESS_CHUNK_SIZE", 7)
+    assert list(getattr(silence, "__read_loudness")("bucket", "loudness")) == samples
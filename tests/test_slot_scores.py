@@ -0,0 +1,116 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import pytest
+
+pytest.importorskip("numpy")
+
+import score
+from breaks import select_breaks
+import synthetic
+import reference_scores
+
+def canonical(slots):
+    # Context labels are compared regardless of their order in each window
+    return [(
+        round(slot["Timestamp"], 9),
+        round(slot["Score"], 9),
+        tuple(slot["Reasons"]),
+        {key: (sorted((label["Name"], label["Confidence"]) for label in window["Before"]),
+               sorted((label["Name"], label["Confidence"]) for label in window["After"]))
+         for key, window in slot["Context"].items()}
+    ) for slot in slots]
+
+@pytest.mark.parametrize("duration, shots, results, seed", [
+    (7200, 600, 2000, 1),
+    (600, 400, 1500, 2),
+    (30, 50, 40, 3)
+])
+def test_context_window_matches_per_slot_scan(monkeypatch, duration, shots, results, seed):
+    monkeypatch.setattr(score, "scoring_engine", "python")
+    monkeypatch.setattr(score, "context_slots", "all")
+    metadata = synthetic.asset_metadata(duration, shots, results, seed)
+    slots = synthetic.slot_candidates(metadata)
+    expected = reference_scores.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    actual = score.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    assert canonical(actual) == canonical(expected)
+
+def test_context_window_includes_results_at_the_edges(monkeypatch):
+    monkeypatch.setattr(score, "scoring_engine", "python")
+    monkeypatch.setattr(score, "context_slots", "all")
+    metadata = synthetic.asset_metadata(60, 0, 0)
+    # Results exactly at the slot go before it, results at slot +/- interval are in the window
+    metadata["labelDetection"]["Labels"] = [
+        {"Timestamp": 8000, "Label": {"Name": "Edge", "Confidence": 90.0}},
+        {"Timestamp": 10000, "Label": {"Name": "At", "Confidence": 90.0}},
+        {"Timestamp": 12000, "Label": {"Name": "After", "Confidence": 90.0}},
+        {"Timestamp": 12001, "Label": {"Name": "Outside", "Confidence": 90.0}}
+    ]
+    slots = [{"Timestamp": 10.0, "Score": 1.0, "Reasons": ["ShotChange"]}]
+    expected = reference_scores.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    actual = score.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    assert canonical(actual) == canonical(expected)
+    assert [label["Name"] for label in actual[0]["Context"]["Labels"]["Before"]] == ["Edge", "At"]
+    assert [label["Name"] for label in actual[0]["Context"]["Labels"]["After"]] == ["After"]
+
+@pytest.mark.parametrize("duration, shots, results, seed", [
+    (7200, 600, 2000, 1),
+    (600, 400, 1500, 2),
+    (100, 300, 500, 3),
+    (30, 50, 40, 4)
+])
+def test_numpy_engine_matches_python_loop(monkeypatch, duration, shots, results, seed):
+    monkeypatch.setattr(score, "context_slots", "all")
+    metadata = synthetic.asset_metadata(duration, shots, results, seed)
+    slots = synthetic.slot_candidates(metadata)
+    scored = {}
+    for engine in ("python", "numpy"):
+        monkeypatch.setattr(score, "scoring_engine", engine)
+        scored[engine] = score.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    assert len(scored["numpy"]) == len(scored["python"])
+    for expected, actual in zip(scored["python"], scored["numpy"]):
+        assert actual["Timestamp"] == expected["Timestamp"]
+        assert actual["Score"] == pytest.approx(expected["Score"], rel=1e-9, abs=1e-12)
+        assert actual["Reasons"] == expected["Reasons"]
+        assert actual["Context"] == expected["Context"]
+
+def test_numpy_engine_consolidates_close_slots(monkeypatch):
+    monkeypatch.setattr(score, "context_slots", "all")
+    metadata = synthetic.asset_metadata(600, 0, 0)
+    slots = [
+        {"Timestamp": 300.0, "Score": 1.0, "Reasons": ["ShotChange"]},
+        {"Timestamp": 300.2, "Score": 0.5, "Reasons": ["Silence"]},
+        {"Timestamp": 300.4, "Score": 1.0, "Reasons": ["ShotChange"]},
+        {"Timestamp": 450.0, "Score": 1.0, "Reasons": ["BlackFrame"]}
+    ]
+    scored = {}
+    for engine in ("python", "numpy"):
+        monkeypatch.setattr(score, "scoring_engine", engine)
+        scored[engine] = score.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    assert [slot["Reasons"] for slot in scored["numpy"]] == [["ShotChange", "Silence"], ["BlackFrame"]]
+    assert [slot["Timestamp"] for slot in scored["numpy"]] == [300.4, 450.0]
+    assert [slot["Score"] for slot in scored["numpy"]] == pytest.approx([slot["Score"] for slot in scored["python"]])
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_break_contexts_keep_the_full_context_scores(monkeypatch, engine):
+    # Label bitsets (breaks) and built contexts (every slot) give the same scores
+    monkeypatch.setattr(score, "scoring_engine", engine)
+    monkeypatch.setattr(score, "top_slots_qty", 5)
+    monkeypatch.setattr(score, "min_break_gap", 30.0)
+    monkeypatch.setattr(score, "pre_roll_exclusion", 60.0)
+    metadata = synthetic.asset_metadata(600, 400, 1500, 5)
+    slots = synthetic.slot_candidates(metadata)
+    scored = {}
+    for context_slots in ("all", "breaks"):
+        monkeypatch.setattr(score, "context_slots", context_slots)
+        scored[context_slots] = score.calculate_scores(copy.deepcopy(slots), synthetic.media_info(metadata), metadata)
+    assert [slot["Score"] for slot in scored["breaks"]] == pytest.approx([slot["Score"] for slot in scored["all"]])
+    # Every slot has a context, built for the breaks selected with the same settings
+    breaks = select_breaks(scored["breaks"], 5, min_gap=30.0, pre_roll=60.0)
+    assert len(breaks) == 5
+    for slot, full in zip(scored["breaks"], scored["all"]):
+        if any(slot is selected for selected in breaks):
+            assert slot["Context"] == full["Context"]
+        else:
+            assert slot["Context"] == {}
@@ -0,0 +1,88 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("boto3")
+pytest.importorskip("MediaInsightsEngineLambdaHelper")
+
+import app
+import synthetic
+
+PAGE_SIZE = 50
+
+class PagedDataPlane(object):
+    # Operator results split in pages, as the dataplane returns them
+    def __init__(self, metadata):
+        self.pages = []
+        self.calls = 0
+        for operator in app.REKOGNITION_OPERATORS:
+            list_key = "Segments" if operator in ("shotDetection", "technicalCueDetection") else \
+                app.REK_OPERATOR_KEYS[operator][0]
+            items = metadata[operator][list_key]
+            for start in range(0, max(len(items), 1), PAGE_SIZE):
+                results = {list_key: items[start:start + PAGE_SIZE]}
+                if start == 0 and "VideoMetadata" in metadata[operator]:
+                    results["VideoMetadata"] = metadata[operator]["VideoMetadata"]
+                self.pages.append({"operator": operator, "results": results})
+
+    def retrieve_asset_metadata(self, asset_id, operator_name=None, cursor=None):
+        self.calls += 1
+        pages = [page for page in self.pages if operator_name is None or page["operator"] == operator_name]
+        position = int(cursor or 0)
+        response = dict(pages[position])
+        if position + 1 < len(pages):
+            response["cursor"] = str(position + 1)
+        return response
+
+def detect(monkeypatch, metadata, retrieval):
+    monkeypatch.setattr(app, "dataplane", PagedDataPlane(metadata))
+    monkeypatch.setattr(app, "__detect_silences", lambda bucket, key: (list(metadata["Silences"]), None))
+    if retrieval == "streaming":
+        return getattr(app, "__detect_slots_streaming")("asset", "bucket", "loudness")
+    return getattr(app, "__detect_slots")(getattr(app, "__get_asset_metadata")("asset"), "bucket", "loudness")
+
+def in_order(metadata):
+    metadata = copy.deepcopy(metadata)
+    metadata["Silences"].sort()
+    for operator in ("shotDetection", "technicalCueDetection"):
+        metadata[operator]["Segments"].sort(key=lambda segment: segment["StartTimestampMillis"])
+    return metadata
+
+def test_streaming_matches_sequential_detection(monkeypatch):
+    metadata = in_order(synthetic.asset_metadata(1800, 600, 1500, 1))
+    assert detect(monkeypatch, metadata, "streaming") == detect(monkeypatch, metadata, "sequential")
+
+def test_streaming_sorts_sources_out_of_order(monkeypatch, capsys):
+    # Synthetic shots, cues and silences are in random order
+    metadata = synthetic.asset_metadata(1800, 600, 1500, 2)
+    assert detect(monkeypatch, metadata, "streaming") == detect(monkeypatch, metadata, "sequential")
+    assert "out of timestamp order" in capsys.readouterr().out
+
+def test_page_producer_stops_with_the_reader(monkeypatch):
+    monkeypatch.setattr(app, "metadata_page_queue_size", 2)
+    metadata = synthetic.asset_metadata(1800, 1000, 0, 3)
+    dataplane = PagedDataPlane(metadata)
+    monkeypatch.setattr(app, "dataplane", dataplane)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pages = getattr(app, "__stream_operator_pages")(executor, stop, "asset", "shotDetection")
+        next(pages)
+        # 20 pages for a queue of 2: the producer waits, and returns once the reader stops
+        stop.set()
+    assert dataplane.calls < 20
+
+def test_page_queue_is_bounded():
+    pages = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    timer = threading.Timer(0.5, stop.set)
+    timer.start()
+    put_page = getattr(app, "__put_page")
+    assert put_page(pages, stop, 1) and put_page(pages, stop, 2)
+    assert not put_page(pages, stop, 3)
+    assert pages.qsize() == 2
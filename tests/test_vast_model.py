@@ -0,0 +1,76 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+
+from vmap_xml.vmap import VMAP
+from vast_xml.vast import VAST
+from vast_xml.companionad import CompanionAd
+
+URL = 'https://ads.example.com/ad.mp4'
+
+def build_vast():
+    vast = VAST()
+    ad = vast.attachAd({'id': '1', 'structure': 'inline', 'AdSystem': {'name': '2.0'}, 'AdTitle': 'ad'})
+    ad.attachImpression({'url': URL})
+    ad.attachImpression({'url': URL + '?second'})
+    creative = ad.attachCreative('Linear', {'Duration': '00:00:15'})
+    creative.attachMediaFile(URL, {'id': 'media-1'})
+    creative.attachMediaFile(URL + '?hd', {'id': 'media-2'})
+    creative.attachTrackingEvent('start', URL)
+    creative.attachTrackingEvent('complete', URL)
+    creative.attachVideoClick('ClickThrough', URL)
+    creative.attachClickThrough(URL)
+    creative.attachResource('StaticResource', URL, 'image/png')
+    creative.attachIcon({'program': 'icon'}).setResource('StaticResource', URL)
+    return vast
+
+def test_every_mutator_appends():
+    creative = build_vast().ads[0].creatives[0]
+    assert [media.attributes['id'] for media in creative.mediaFiles] == ['media-1', 'media-2']
+    assert [event.event for event in creative.trackingEvents] == ['start', 'complete']
+    assert len(creative.videoClicks) == len(creative.clickThroughs) == len(creative.resources) == len(creative.icons) == 1
+    companion = CompanionAd({'type': 'StaticResource', 'uri': URL})
+    companion.attachTrackingEvent('creativeView', URL)
+    companion.attachTrackingEvent('creativeView', URL + '?second')
+    assert len(companion.trackingEvents) == 2
+
+def test_documents_can_be_built_after_serialization():
+    # Without video clicks nor icons, which the minidom serializer fails on
+    vast = VAST()
+    ad = vast.attachAd({'id': '1', 'structure': 'inline', 'AdSystem': {'name': '2.0'}, 'AdTitle': 'ad'})
+    ad.attachImpression({'url': URL})
+    ad.attachCreative('Linear', {'Duration': '00:00:15'}).attachMediaFile(URL, {'id': 'media-1'})
+    vmap = VMAP()
+    ad_break = vmap.attachAdBreak({'timeOffset': '00:00:10.000', 'breakType': 'linear'})
+    ad_break.attachAdSource('midroll-1-ad-1', 'false', 'true', 'VASTAdData', vast)
+    ad_break.attachEvent('breakStart', URL)
+    content = vmap.serialize()
+    xml = vmap.xml()
+    ad = vast.ads[0]
+    assert isinstance(vmap.adBreaks, list) and isinstance(ad.impressions, list)
+    ad.attachImpression({'url': URL + '?third'})
+    ad.creatives[0].attachMediaFile(URL + '?4k', {'id': 'media-3'})
+    vast.attachAd({'id': '2', 'structure': 'inline', 'AdSystem': {'name': '2.0'}, 'AdTitle': 'second'})
+    vmap.attachAdBreak({'timeOffset': '00:00:20.000', 'breakType': 'linear'}).attachAdSource(
+        'midroll-2-ad-1', 'false', 'true', 'AdTagURI', URL, {'templateType': 'vast3'})
+    assert len(vmap.serialize()) > len(content)
+    assert len(vmap.xml()) > len(xml)
+    assert b'media-3' in vmap.serialize() and b'midroll-2-ad-1' in vmap.xml()
+
+def test_frozen_documents_are_opt_in():
+    vast = build_vast()
+    vmap = VMAP()
+    ad_break = vmap.attachAdBreak({'timeOffset': '00:00:10.000', 'breakType': 'linear'})
+    ad_break.attachAdSource('midroll-1-ad-1', 'false', 'true', 'VASTAdData', vast)
+    ad_break.attachEvent('breakStart', URL)
+    content = vmap.serialize()
+    vmap.freeze()
+    ad = vast.ads[0]
+    assert isinstance(vmap.adBreaks, tuple) and isinstance(ad_break.trackingEvents, tuple)
+    assert isinstance(vast.ads, tuple) and isinstance(ad.impressions, tuple)
+    assert isinstance(ad.creatives[0].mediaFiles, tuple)
+    # Freezing a document doesn't change its markup
+    assert vmap.serialize() == content
+    with pytest.raises(AttributeError):
+        ad.attachImpression({'url': URL})
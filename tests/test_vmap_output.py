@@ -0,0 +1,87 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import json
+import zlib
+import hashlib
+
+import vmap_output
+from vmap_output import write_variants, CONTENT_TYPE, IMMUTABLE_CACHE_CONTROL
+
+KEY = 'private/assets/asset-1/vmap/ad_breaks.vmap'
+CONTENT = b'<?xml version="1.0" encoding="utf-8"?><vmap:VMAP version="1.0">' + b'<vmap:AdBreak/>' * 100 + \
+    b'</vmap:VMAP>'
+
+class S3(object):
+    def __init__(self):
+        self.puts = []
+
+    def put_object(self, **params):
+        self.puts.append(params)
+
+class Brotli(object):
+    # Stand-in for the brotli module, deflate under another name
+    @staticmethod
+    def compress(content, quality=11):
+        return b'br' + zlib.compress(content, 9)
+
+def version_of(content):
+    return hashlib.sha256(content).hexdigest()[:16]
+
+def test_variants_are_content_hashed_and_immutable(monkeypatch):
+    monkeypatch.setattr(vmap_output, "brotli", Brotli)
+    s3 = S3()
+    manifest = write_variants(s3, 'dataplane', KEY, CONTENT)
+    version = version_of(CONTENT)
+    versioned_key = 'private/assets/asset-1/vmap/ad_breaks.{}.vmap'.format(version)
+    variants = {put['Key']: put for put in s3.puts[:-1]}
+    assert sorted(variants) == sorted([versioned_key, versioned_key + '.gz', versioned_key + '.br'])
+    for put in variants.values():
+        assert put['Bucket'] == 'dataplane'
+        assert put['ContentType'] == CONTENT_TYPE
+        assert put['CacheControl'] == IMMUTABLE_CACHE_CONTROL
+    assert variants[versioned_key]['Body'] == CONTENT
+    assert 'ContentEncoding' not in variants[versioned_key]
+    assert variants[versioned_key + '.gz']['ContentEncoding'] == 'gzip'
+    assert gzip.decompress(variants[versioned_key + '.gz']['Body']) == CONTENT
+    assert variants[versioned_key + '.br']['ContentEncoding'] == 'br'
+    assert zlib.decompress(variants[versioned_key + '.br']['Body'][2:]) == CONTENT
+    assert manifest == {
+        'Version': version,
+        'ContentType': CONTENT_TYPE,
+        'Size': len(CONTENT),
+        'Variants': {
+            encoding: {'Key': variants[key]['Key'], 'Size': len(variants[key]['Body'])}
+            for encoding, key in (('identity', versioned_key), ('gzip', versioned_key + '.gz'),
+                                  ('br', versioned_key + '.br'))
+        }
+    }
+
+def test_manifest_is_written_last(monkeypatch):
+    monkeypatch.setattr(vmap_output, "brotli", Brotli)
+    s3 = S3()
+    manifest = write_variants(s3, 'dataplane', KEY, CONTENT)
+    put = s3.puts[-1]
+    assert [put['Key'] for put in s3.puts].index('private/assets/asset-1/vmap/manifest.json') == len(s3.puts) - 1
+    assert put['ContentType'] == 'application/json'
+    assert put['CacheControl'] == 'no-cache'
+    assert json.loads(put['Body']) == manifest
+
+def test_brotli_variant_is_skipped_without_brotli(monkeypatch):
+    monkeypatch.setattr(vmap_output, "brotli", None)
+    s3 = S3()
+    manifest = write_variants(s3, 'dataplane', KEY, CONTENT)
+    assert sorted(manifest['Variants']) == ['gzip', 'identity']
+    assert [put['Key'].rsplit('.', 1)[-1] for put in s3.puts] == ['vmap', 'gz', 'json']
+    assert not any(put.get('ContentEncoding') == 'br' for put in s3.puts)
+
+def test_versions_change_with_the_content_only():
+    first, second, third = S3(), S3(), S3()
+    write_variants(first, 'dataplane', KEY, CONTENT)
+    write_variants(second, 'dataplane', KEY, CONTENT)
+    write_variants(third, 'dataplane', KEY, CONTENT + b'\n')
+    # Same bytes for the same content, gzip without a timestamp included
+    assert first.puts == second.puts
+    assert first.puts[0]['Key'] != third.puts[0]['Key']
+    assert version_of(CONTENT + b'\n') in third.puts[0]['Key']
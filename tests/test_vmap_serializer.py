@@ -0,0 +1,98 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import xml.etree.ElementTree as ElementTree
+
+from vmap_xml.vmap import VMAP
+from vast_xml.vast import VAST
+from fragment_cache import VASTFragment, placeholder
+from xml_writer import XMLWriter
+
+# Attribute and text values markup has to escape
+TRICKY = 'Tom & Jerry <"Live"> \'at\' 5 > 3'
+URL = 'https://ads.example.com/ad.mp4?campaign=a&b=<c>&d="e"'
+WHITESPACE = ' two  spaces\ttab\nnewline\r\nend '
+
+def build_vast(ad_id, title, media_file_id, url):
+    vast = VAST()
+    ad = vast.attachAd({
+        'id': ad_id,
+        'structure': 'inline',
+        'AdSystem': {'name': '2.0 & <up>'},
+        'AdTitle': title,
+        'Description': 'Description with & and <markup>',
+        'Error': 'https://ads.example.com/error?code=[ERRORCODE]&id=1'
+    })
+    ad.attachImpression({'url': URL})
+    creative = ad.attachCreative('Linear', {'Duration': '00:00:15', 'skipoffset': '00:00:05'})
+    creative.attachMediaFile(url, {
+        'id': media_file_id,
+        'type': 'video/mp4',
+        'delivery': 'progressive',
+        'width': '1920',
+        'height': '1080',
+        'codec': TRICKY
+    })
+    creative.attachTrackingEvent('start', URL)
+    creative.attachTrackingEvent('progress', URL, offset='00:00:05.000')
+    icon = creative.attachIcon({'program': TRICKY, 'width': '10', 'height': '10'})
+    icon.setResource('StaticResource', URL, 'image/png')
+    icon.setClickThrough(URL)
+    return vast
+
+def build_vmap(title=TRICKY, media_file_id=TRICKY):
+    vmap = VMAP()
+    inline = vmap.attachAdBreak({'timeOffset': '00:00:10.000', 'breakType': 'linear', 'breakId': TRICKY})
+    inline.attachAdSource('midroll-1-ad-1', 'false', 'true', 'VASTAdData', build_vast('1', title, media_file_id, URL))
+    inline.attachEvent('breakStart', URL)
+    wrapper = VAST()
+    wrapper.attachAd({
+        'id': '2',
+        'structure': 'wrapper',
+        'AdSystem': {'name': '2.0'},
+        'VASTAdTagURI': URL
+    }).attachImpression({})
+    wrapped = vmap.attachAdBreak({'timeOffset': '00:01:10.000', 'breakType': 'linear', 'breakId': 'midroll-2'})
+    wrapped.attachAdSource('midroll-2-ad-1', 'false', 'true', 'VASTAdData', wrapper)
+    tag = vmap.attachAdBreak({'timeOffset': '00:02:10.000', 'breakType': 'linear', 'breakId': 'midroll-3'})
+    tag.attachAdSource('midroll-3-ad-1', 'false', 'true', 'AdTagURI', URL, {'templateType': 'vast3'})
+    return vmap
+
+def test_stream_serializer_matches_minidom():
+    vmap = build_vmap()
+    assert vmap.serialize() == vmap.xml()
+
+def test_standalone_vast_matches_minidom():
+    vast = build_vast(TRICKY, TRICKY, TRICKY, URL)
+    assert vast.serialize() == vast.xml()
+
+def test_attribute_whitespace_survives_parsing():
+    # Parsers normalize literal whitespace in attribute values to spaces, so
+    # it is written as character references
+    document = ElementTree.fromstring(build_vmap(media_file_id=WHITESPACE).serialize())
+    media_file = document.find('.//MediaFile')
+    assert media_file.get('id') == WHITESPACE
+    assert media_file.text == URL
+
+def test_attribute_whitespace_differs_from_minidom_before_3_13():
+    # The only tab and line breaks of the document are in the MediaFile id,
+    # minidom writes them as is before Python 3.13 (python3.9 in Lambda)
+    vmap = build_vmap(media_file_id=WHITESPACE)
+    expected = vmap.xml()
+    if sys.version_info < (3, 13):
+        assert vmap.serialize() != expected
+        expected = expected.replace(b'\r', b'&#13;').replace(b'\n', b'&#10;').replace(b'\t', b'&#9;')
+    assert vmap.serialize() == expected
+    assert b' id=" two  spaces&#9;tab&#10;newline&#13;&#10;end "' in vmap.serialize()
+
+def test_text_whitespace_matches_minidom():
+    vmap = build_vmap(title=WHITESPACE)
+    assert vmap.serialize() == vmap.xml()
+    assert ElementTree.fromstring(vmap.serialize()).find('.//AdTitle').text == WHITESPACE.replace('\r\n', '\n')
+
+def test_fragment_matches_rendered_vast():
+    fields = {'AdId': TRICKY, 'AdTitle': TRICKY, 'MediaFileId': TRICKY}
+    fragment = VASTFragment(build_vast(*[placeholder(name) for name in fields], URL))
+    expected = build_vast(*fields.values(), URL).writeTo(XMLWriter()).getstring()
+    assert fragment.bind(fields).writeTo(XMLWriter()).getstring() == expected
@@ -3,6 +3,7 @@
 
 import os
 import json
+import hashlib
 import datetime
 import random
 import boto3
@@ -13,17 +14,76 @@ from MediaInsightsEngineLambdaHelper import DataPlane
 
 from vmap_xml.vmap import VMAP
 from vast_xml.vast import VAST
+from assignment import assign_ads
+from audience import parse_audience_segments
+from breaks import select_breaks
+from catalog import AdCatalog, compile_ads
+from catalog_loader import CatalogLoader
+from fragment_cache import FragmentCache, VASTFragment, placeholder
+from vmap_output import write_variants, CONTENT_TYPE, IMMUTABLE_CACHE_CONTROL, MUTABLE_CACHE_CONTROL
 
 ADS_FILE = 'ads.json'
+VAST_KEY = 'private/vast/{}.xml'
+SEGMENT_VMAP_KEY = 'private/assets/{}/vmap/segments/{}/ad_breaks.vmap'
+
+AD_DURATION = '00:00:15'
+AD_MEDIA_FILE = {
+    'type': 'video/mp4',
+    'delivery': 'progressive',
+    'width': '1920',
+    'height': '1080'
+}
 
 top_slots_qty = int(os.environ['TOP_SLOTS_QTY'])
+min_break_gap = float(os.environ.get('MIN_BREAK_GAP_IN_SECONDS', 0))
+pre_roll_exclusion = float(os.environ.get('PRE_ROLL_EXCLUSION_IN_SECONDS', 0))
+post_roll_exclusion = float(os.environ.get('POST_ROLL_EXCLUSION_IN_SECONDS', 0))
+ad_selection = os.environ.get('AD_SELECTION', 'index')
+minhash_bands = int(os.environ.get('MINHASH_BANDS', 16))
+minhash_rows = int(os.environ.get('MINHASH_ROWS', 4))
+vmap_serializer = os.environ.get('VMAP_SERIALIZER', 'stream')
+vast_fragment_cache_size = int(os.environ.get('VAST_FRAGMENT_CACHE_SIZE', 1024))
+vmap_output = os.environ.get('VMAP_OUTPUT', 'single')
+vast_delivery = os.environ.get('VAST_DELIVERY', 'inline')
+vast_base_url = os.environ.get('VAST_BASE_URL', '')
+ad_decision = os.environ.get('AD_DECISION', 'slot')
+ad_frequency_cap = int(os.environ.get('AD_FREQUENCY_CAP', 1))
+ad_category_separation = int(os.environ.get('AD_CATEGORY_SEPARATION', 1))
+ads_catalog_bucket = os.environ.get('ADS_CATALOG_BUCKET', '')
+ads_catalog_key = os.environ.get('ADS_CATALOG_KEY', ADS_FILE)
+ads_catalog_cache = os.environ.get('ADS_CATALOG_CACHE', '/tmp/ads_catalog.json')
+audience_segments = parse_audience_segments(os.environ.get('AUDIENCE_SEGMENTS', '[]'))
+# Ingest dedupe index, told which asset the uploaded video became
+dedupe_table = os.environ.get('DEDUPE_TABLE', '')
 
 s3 = boto3.client('s3')
 dataplane = DataPlane()
 
-# Reading ads from JSON file
-with open(ADS_FILE) as json_file:
-    ads = json.load(json_file)['ads']
+catalog_options = {
+    'minhash_bands': minhash_bands if ad_selection == 'minhash' else 0,
+    'minhash_rows': minhash_rows
+}
+
+# Indexing ads by label once per container, either from the bundled JSON file
+# or from a catalog in S3 that is revalidated on every invocation
+catalog = None
+catalog_loader = None
+if ads_catalog_bucket:
+    catalog_loader = CatalogLoader(s3, ads_catalog_bucket, ads_catalog_key, ads_catalog_cache, **catalog_options)
+else:
+    with open(ADS_FILE) as json_file:
+        catalog = AdCatalog(compile_ads(json.load(json_file)['ads']), **catalog_options)
+
+# Catalogs of the audience segments, by catalog key
+segment_catalogs = {}
+
+# Rendered VAST fragments per creative, kept across warm invocations
+fragment_cache = None
+if vmap_serializer != 'minidom' and vast_fragment_cache_size > 0:
+    fragment_cache = FragmentCache(vast_fragment_cache_size)
+
+# Shared creative VAST documents already stored by this container
+stored_vast_keys = set()
 
 def lambda_handler(event, context):
     print("We got the following event:\n", event)
@@ -55,13 +115,23 @@ def lambda_handler(event, context):
             VmapGenerationError="Unable to retrieve metadata for asset {}: {}".format(asset_id, exception))
         raise MasExecutionError(operator_object.return_output_object())
     try:
-        # Select slots with highest scores
-        slots["slots"].sort(key=lambda slot: slot["Score"])
-        top_slots = slots["slots"][-top_slots_qty:]
+        # Select slots with highest scores, spaced by at least the minimum gap
+        duration = __get_duration(asset_id) if post_roll_exclusion > 0 else None
+        top_slots = select_breaks(
+            slots["slots"],
+            top_slots_qty,
+            min_gap=min_break_gap,
+            pre_roll=pre_roll_exclusion,
+            post_roll=post_roll_exclusion,
+            duration=duration)
         # Generate VMAP and add object
         key = 'private/assets/{}/vmap/ad_breaks.vmap'.format(asset_id)
-        __write_vmap(top_slots, bucket, key)
+        __write_vmap(top_slots, bucket, key, __get_catalog())
         operator_object.add_media_object("VMAP", bucket, key)
+        if audience_segments:
+            __write_segment_vmaps(top_slots, bucket, asset_id)
+        if dedupe_table:
+            __record_asset(operator_object, asset_id)
         # Set workflow status complete
         operator_object.update_workflow_status("Complete")
         return operator_object.return_output_object()
@@ -83,56 +153,230 @@ def __update_and_merge_lists(dict1, dict2):
         else:
             dict1[key] = dict2[key]
 
-def __write_vmap(slots, bucket, key):
+def __record_asset(operator_object, asset_id):
+    # Later uploads of the same content reuse this asset's outputs. The key
+    # of the upload comes from the workflow metadata, the media keys are
+    # rewritten by the operators
+    metadata = operator_object.input.get("MetaData", {})
+    ingest_key = metadata.get("IngestKey")
+    if not ingest_key:
+        print("No ingest key for asset {}, not recorded in the dedupe index".format(asset_id))
+        return
+    try:
+        table = boto3.resource('dynamodb').Table(dedupe_table)
+        table.put_item(Item={'Id': 'key:' + ingest_key, 'AssetId': asset_id})
+        if metadata.get("Fingerprint"):
+            # Duplicates uploaded while the content was processed, after the
+            # key is recorded so a duplicate added later finds the asset itself
+            content = table.get_item(Key={'Id': metadata["Fingerprint"]}, ConsistentRead=True).get('Item', {})
+            waiting = set(content.get('Waiting', set()))
+            for key in waiting:
+                table.put_item(Item={'Id': 'key:' + key, 'AssetId': asset_id})
+            if waiting:
+                table.update_item(
+                    Key={'Id': metadata["Fingerprint"]},
+                    UpdateExpression='DELETE Waiting :keys',
+                    ExpressionAttributeValues={':keys': waiting})
+                print("Linked {} duplicates to asset {}".format(len(waiting), asset_id))
+    except Exception as exception:
+        print("Unable to record asset {} in the dedupe index: {}".format(asset_id, exception))
+
+def __get_duration(asset_id):
+    # Video duration in seconds, from the shot detection video metadata
+    params = {"asset_id": asset_id, "operator_name": "shotDetection"}
+    while True:
+        resp = dataplane.retrieve_asset_metadata(**params)
+        if resp.get("results", {}).get("VideoMetadata"):
+            return float(resp["results"]["VideoMetadata"][0]["DurationMillis"]) / 1000.0
+        if "cursor" not in resp:
+            raise Exception("Missing VideoMetadata in shotDetection results")
+        params["cursor"] = resp["cursor"]
+
+def __get_catalog():
+    if catalog_loader is not None:
+        return catalog_loader.get()
+    return catalog
+
+def __get_segment_catalog(segment):
+    catalog_key = segment.get('CatalogKey')
+    if not catalog_key:
+        return __get_catalog()
+    if catalog_key not in segment_catalogs:
+        if ads_catalog_bucket:
+            cache_path = '{}.{}'.format(ads_catalog_cache, hashlib.sha256(catalog_key.encode('utf-8')).hexdigest()[:16])
+            segment_catalogs[catalog_key] = CatalogLoader(
+                s3, ads_catalog_bucket, catalog_key, cache_path, **catalog_options)
+        else:
+            with open(catalog_key) as json_file:
+                segment_catalogs[catalog_key] = AdCatalog(compile_ads(json.load(json_file)['ads']), **catalog_options)
+    segment_catalog = segment_catalogs[catalog_key]
+    if isinstance(segment_catalog, CatalogLoader):
+        return segment_catalog.get()
+    return segment_catalog
+
+def __write_vmap(slots, bucket, key, catalog):
+    # Seeding ad selection with the VMAP key so regenerations are reproducible
+    rng = random.Random(key)
+    slot_labels = [__get_slot_labels(slot) for slot in slots]
+    if ad_decision == 'batch':
+        # Deciding the ads of all breaks at once
+        ad_urls = __assign_ads(catalog, slot_labels, [float(slot['Timestamp']) for slot in slots], rng)
+    else:
+        ad_urls = [__select_ad(catalog, labels, rng) for labels in slot_labels]
+    __put_vmap(__render_vmap(__get_time_offsets(slots), ad_urls, bucket), bucket, key)
+
+def __write_segment_vmaps(slots, bucket, asset_id):
+    # Break positions and slot labels are shared by every segment, which only
+    # decides its own ads (in batch, with its catalog and label weights)
+    time_offsets = __get_time_offsets(slots)
+    slot_labels = [__get_slot_labels(slot) for slot in slots]
+    slot_timestamps = [float(slot['Timestamp']) for slot in slots]
+    for segment in audience_segments:
+        key = SEGMENT_VMAP_KEY.format(asset_id, segment['Name'])
+        print('segment: {}'.format(segment['Name']))
+        ad_urls = __assign_ads(
+            __get_segment_catalog(segment),
+            slot_labels,
+            slot_timestamps,
+            random.Random(key),
+            segment.get('LabelWeights'))
+        __put_vmap(__render_vmap(time_offsets, ad_urls, bucket), bucket, key)
+
+def __get_time_offsets(slots):
+    return [__format_timedelta(datetime.timedelta(seconds=float(slot['Timestamp']))) for slot in slots]
+
+def __render_vmap(time_offsets, ad_urls, bucket):
     vmap = VMAP()
     i = 1
-    for slot in slots:
-        # Merging labels from before and after the slot into a single list
-        before_labels = [label['Name'] for label in slot['Context']['Labels']['Before']]
-        after_labels = [label['Name'] for label in slot['Context']['Labels']['After']]
-        labels = before_labels + list(set(after_labels) - set(before_labels))
+    for time_offset, ad_url in zip(time_offsets, ad_urls):
         # Adding ad break to VMAP file
         ad_break = vmap.attachAdBreak({
-            'timeOffset': __format_timedelta(datetime.timedelta(seconds=float(slot['Timestamp']))),
+            'timeOffset': time_offset,
             'breakType': 'linear',
             'breakId': 'midroll-{}'.format(i)
         })
         # Adding VAST ad source 
-        vast = VAST()
-        ad_break.attachAdSource(
-            'midroll-{}-ad-1'.format(i),
-            'false',
-            'true',
-            'VASTAdData',
-            vast)
-        ad = vast.attachAd({
-            'id': str(i),
-            'structure': 'inline',
-            'AdSystem': {'name': '2.0'},
-            'AdTitle': 'midroll-{}-ad-1'.format(i)
-        })
-        ad.attachImpression({})
-        creative = ad.attachCreative('Linear', {
-            'Duration' : '00:00:15'
-        })
-        # Setting media file URL referencing the ad server, passing labels as parameters
-        creative.attachMediaFile(__select_ad(labels), {
-            'id': 'midroll-{}-ad-1'.format(i),
-            'type': 'video/mp4',
-            'delivery': 'progressive',
-            'width': '1920',
-            'height': '1080'
-        })
+        if vast_delivery == 'inline':
+            ad_break.attachAdSource(
+                'midroll-{}-ad-1'.format(i),
+                'false',
+                'true',
+                'VASTAdData',
+                __get_vast(i, ad_url))
+        else:
+            # Breaks only reference the creative's VAST, stored once
+            vast_url = __store_vast(bucket, ad_url)
+            if vast_delivery == 'wrapper':
+                ad_break.attachAdSource(
+                    'midroll-{}-ad-1'.format(i),
+                    'false',
+                    'true',
+                    'VASTAdData',
+                    __build_wrapper(i, vast_url))
+            else:
+                ad_break.attachAdSource(
+                    'midroll-{}-ad-1'.format(i),
+                    'false',
+                    'true',
+                    'AdTagURI',
+                    vast_url,
+                    {'templateType': 'vast3'})
         i += 1
+    # Done building: children held in tuples while the VMAP is written
+    vmap.freeze()
     # Converting VMAP content to XML
-    vmap_content = vmap.xml()
-    print(vmap_content)
+    if vmap_serializer == 'minidom':
+        vmap_content = vmap.xml()
+    else:
+        vmap_content = vmap.serialize()
+    print('vmap size: {} bytes'.format(len(vmap_content)))
+    if fragment_cache is not None:
+        print('vast fragment cache hits: {}, misses: {}'.format(fragment_cache.hits, fragment_cache.misses))
+    return vmap_content
+
+def __put_vmap(vmap_content, bucket, key):
     # Putting VMAP file into dataplane bucket
-    s3.put_object(
-        Body=bytes(vmap_content),
-        Bucket=bucket,
-        Key=key
-    )
+    if vmap_output == 'variants':
+        # Compressed, content-hashed copies and their manifest, along with the
+        # unversioned key MediaTailor is configured with
+        write_variants(s3, bucket, key, vmap_content)
+        s3.put_object(
+            Body=vmap_content,
+            Bucket=bucket,
+            Key=key,
+            ContentType=CONTENT_TYPE,
+            CacheControl=MUTABLE_CACHE_CONTROL
+        )
+    else:
+        s3.put_object(
+            Body=vmap_content,
+            Bucket=bucket,
+            Key=key
+        )
+
+def __get_vast(i, ad_url):
+    fields = {
+        'AdId': str(i),
+        'AdTitle': 'midroll-{}-ad-1'.format(i),
+        'MediaFileId': 'midroll-{}-ad-1'.format(i)
+    }
+    if fragment_cache is None:
+        return __build_vast(fields, ad_url)
+    # Only the ad id, title and media file id change between breaks, the rest
+    # of the document is rendered once per creative and spliced
+    key = (ad_url, AD_DURATION, tuple(AD_MEDIA_FILE.items()))
+    fragment = fragment_cache.get(
+        key, lambda: VASTFragment(__build_vast({name: placeholder(name) for name in fields}, ad_url)))
+    return fragment.bind(fields)
+
+def __store_vast(bucket, ad_url):
+    # Inline VAST of a creative, keyed by its content so it can be cached
+    # indefinitely and shared by every break and VMAP using the creative
+    creative_id = 'creative-{}'.format(hashlib.sha256(ad_url.encode('utf-8')).hexdigest()[:12])
+    vast_content = __build_vast({
+        'AdId': creative_id,
+        'AdTitle': creative_id,
+        'MediaFileId': creative_id
+    }, ad_url).serialize()
+    vast_key = VAST_KEY.format(hashlib.sha256(vast_content).hexdigest()[:16])
+    if vast_key not in stored_vast_keys:
+        s3.put_object(
+            Body=vast_content,
+            Bucket=bucket,
+            Key=vast_key,
+            ContentType=CONTENT_TYPE,
+            CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+        stored_vast_keys.add(vast_key)
+    # The public URL drops the private/ prefix, as served by CloudFront
+    return '{}/{}'.format(vast_base_url.rstrip('/'), vast_key[len('private/'):])
+
+def __build_wrapper(i, vast_url):
+    vast = VAST()
+    ad = vast.attachAd({
+        'id': str(i),
+        'structure': 'wrapper',
+        'AdSystem': {'name': '2.0'},
+        'VASTAdTagURI': vast_url
+    })
+    ad.attachImpression({})
+    return vast
+
+def __build_vast(fields, ad_url):
+    vast = VAST()
+    ad = vast.attachAd({
+        'id': fields['AdId'],
+        'structure': 'inline',
+        'AdSystem': {'name': '2.0'},
+        'AdTitle': fields['AdTitle']
+    })
+    ad.attachImpression({})
+    creative = ad.attachCreative('Linear', {
+        'Duration' : AD_DURATION
+    })
+    # Setting media file URL referencing the ad server, passing labels as parameters
+    creative.attachMediaFile(ad_url, dict(AD_MEDIA_FILE, id=fields['MediaFileId']))
+    return vast
 
 def __format_timedelta(delta):
     hours, rem = divmod(delta.seconds, 3600)
@@ -140,20 +384,34 @@ def __format_timedelta(delta):
     milliseconds = int(delta.microseconds / 1000)
     return '{:02d}:{:02d}:{:02d}.{:03d}'.format(hours, minutes, seconds, milliseconds)
 
-def __select_ad(labels):
+def __get_slot_labels(slot):
+    # Merging labels from before and after the slot into a single list
+    if not slot['Context']:
+        # Slot detection only builds the contexts of the breaks it selects
+        # with the same settings (CONTEXT_SLOTS=breaks)
+        raise Exception('Missing context for the ad break at {}'.format(slot['Timestamp']))
+    context_labels = slot['Context']['Labels']
+    before_labels = [label['Name'] for label in context_labels['Before']]
+    after_labels = [label['Name'] for label in context_labels['After']]
+    return before_labels + list(set(after_labels) - set(before_labels))
+
+def __assign_ads(catalog, slot_labels, slot_timestamps, rng, label_weights=None):
+    print('slot labels: {}'.format(slot_labels))
+    ad_indexes = assign_ads(
+        catalog,
+        slot_labels,
+        slot_timestamps,
+        rng,
+        frequency_cap=ad_frequency_cap,
+        separation=ad_category_separation,
+        label_weights=label_weights)
+    print('assigned ads: {}'.format(ad_indexes))
+    return [catalog.urls[i] for i in ad_indexes]
+
+def __select_ad(catalog, labels, rng):
     print('labels: {}'.format(labels))
-    # Searching ads to find the one with most similar labels
-    top_similarity = -1.0
-    top_ad = None
-    slot_labels = set(labels)
-    random.shuffle(ads) # Shuffle to return a random ad in case none has similarity
-    for ad in ads:
-        print('ad: {}'.format(ad))
-        ad_labels = set(ad['labels'])
-        similarity = len(slot_labels.intersection(ad_labels)) / len(slot_labels.union(ad_labels))
-        if similarity > top_similarity:
-            top_similarity = similarity
-            top_ad = ad
+    # Searching ads sharing labels with the slot to find the most similar one
+    top_ad, top_similarity = catalog.select(labels, rng)
     print('top_ad: {}'.format(top_ad))
     print('top_similarity: {}'.format(top_similarity))
     # Return URL to selected ad video file
@@ -0,0 +1,72 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+
+def similarity_matrix(catalog, slot_labels, label_weights=None):
+    # Jaccard similarity of every slot with every ad, computed only over the
+    # label columns that appear in the slots (ads get them from the postings).
+    # Label weights (1.0 by default, 0.0 to ignore a label) turn it into a
+    # weighted Jaccard, the sum of shared weights over the sum of all weights
+    label_weights = label_weights or {}
+    names = sorted({name for labels in slot_labels for name in labels})
+    columns = {name: column for column, name in enumerate(names)}
+    weights = np.array([float(label_weights.get(name, 1.0)) for name in names], dtype=np.float32)
+    slot_matrix = np.zeros((len(slot_labels), len(names)), dtype=np.float32)
+    for row, labels in enumerate(slot_labels):
+        slot_matrix[row, [columns[name] for name in set(labels)]] = 1.0
+    slot_matrix *= weights
+    ad_matrix = np.zeros((len(catalog.urls), len(names)), dtype=np.float32)
+    for name, column in columns.items():
+        if name in catalog.vocabulary.ids:
+            ad_matrix[catalog.postings.get(catalog.vocabulary.ids[name], []), column] = 1.0
+    ad_weights = np.asarray(catalog.label_counts, dtype=np.float32)
+    for name, weight in label_weights.items():
+        if name in catalog.vocabulary.ids:
+            ad_weights[catalog.postings.get(catalog.vocabulary.ids[name], [])] += float(weight) - 1.0
+    intersections = slot_matrix @ ad_matrix.T
+    unions = slot_matrix.sum(axis=1)[:, None] + ad_weights[None, :] - intersections
+    return np.divide(intersections, unions, out=np.zeros_like(intersections), where=unions > 0)
+
+def assign_ads(catalog, slot_labels, slot_timestamps, rng, frequency_cap=1, separation=1, label_weights=None):
+    # Returns an ad index per slot. The best remaining slot/ad pair of the
+    # whole matrix is assigned first, then the slot row is closed, the ad
+    # column once it reaches its frequency cap, and the ad's category for
+    # the breaks within `separation` positions on the timeline (closed
+    # entries are set to -1)
+    slot_count = len(slot_labels)
+    ad_count = len(catalog.urls)
+    if slot_count == 0:
+        return []
+    # Random column order to break ties randomly
+    permutation = np.array(rng.sample(range(ad_count), ad_count))
+    similarities = similarity_matrix(catalog, slot_labels, label_weights)[:, permutation].astype(np.float64)
+    categories = np.array([catalog.categories[i] for i in permutation], dtype=object)
+    positions = np.empty(slot_count, dtype=int)
+    positions[np.argsort(slot_timestamps, kind="stable")] = np.arange(slot_count)
+    remaining = np.full(ad_count, frequency_cap if frequency_cap > 0 else slot_count)
+    assigned = np.full(slot_count, -1)
+    open_slots = np.ones(slot_count, dtype=bool)
+    for _ in range(slot_count):
+        slot, column = np.unravel_index(np.argmax(similarities), similarities.shape)
+        if similarities[slot, column] <= 0.0:
+            break
+        __assign(slot, column, similarities, assigned, open_slots, remaining, categories, positions, separation)
+    # Slots without any similar ad left get a random eligible ad (any ad when
+    # the constraints can't be met), as in the single-slot selection
+    for slot in np.flatnonzero(open_slots).tolist():
+        eligible = np.flatnonzero(similarities[slot] >= 0.0).tolist()
+        column = eligible[rng.randrange(len(eligible))] if eligible else rng.randrange(ad_count)
+        __assign(slot, column, similarities, assigned, open_slots, remaining, categories, positions, separation)
+    return permutation[assigned].tolist()
+
+def __assign(slot, column, similarities, assigned, open_slots, remaining, categories, positions, separation):
+    assigned[slot] = column
+    open_slots[slot] = False
+    similarities[slot] = -1.0
+    remaining[column] -= 1
+    if remaining[column] <= 0:
+        similarities[:, column] = -1.0
+    if separation > 0 and categories[column] is not None:
+        neighbours = open_slots & (np.abs(positions - positions[slot]) <= separation)
+        similarities[np.ix_(neighbours, categories == categories[column])] = -1.0
@@ -0,0 +1,34 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import re
+import json
+import math
+
+# Segment names are part of the S3 key of their VMAP
+SEGMENT_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def parse_audience_segments(config):
+    # JSON list of {"Name", "CatalogKey" (optional), "LabelWeights" (optional)},
+    # checked once at load so a bad segment fails the deployment, not a workflow
+    segments = json.loads(config)
+    if not isinstance(segments, list):
+        raise ValueError('Audience segments must be a JSON list')
+    names = set()
+    for segment in segments:
+        name = segment.get('Name') if isinstance(segment, dict) else None
+        if not isinstance(name, str) or not SEGMENT_NAME.match(name):
+            raise ValueError('Invalid audience segment name {!r}: 1 to 64 letters, digits, _ or -'.format(name))
+        if name in names:
+            raise ValueError('Duplicate audience segment name {!r}'.format(name))
+        names.add(name)
+        label_weights = segment.get('LabelWeights') or {}
+        if not isinstance(label_weights, dict):
+            raise ValueError('LabelWeights of audience segment {} must be an object'.format(name))
+        for label, weight in label_weights.items():
+            # Weights scale the label in a weighted Jaccard, 0 ignores it
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) \
+                    or not math.isfinite(weight) or weight < 0:
+                raise ValueError('Invalid weight {!r} of label {!r} in audience segment {}: '
+                                 'must be a non-negative number'.format(weight, label, name))
+    return segments
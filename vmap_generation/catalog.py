@@ -0,0 +1,105 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+
+from labels import LabelVocabulary, jaccard
+
+MINHASH_PRIME = (1 << 61) - 1
+
+def compile_ads(ads):
+    # Compact indexed form of the catalog: interned label names, a URL table,
+    # one label bitset per ad and the postings of every label id
+    vocabulary = LabelVocabulary()
+    bitsets = []
+    postings = []
+    for i, ad in enumerate(ads):
+        bitsets.append(vocabulary.bitset(ad['labels']))
+        postings.extend([] for _ in range(len(vocabulary.names) - len(postings)))
+        for name in set(ad['labels']):
+            postings[vocabulary.ids[name]].append(i)
+    return {
+        'Names': vocabulary.names,
+        'Urls': [ad['url'] for ad in ads],
+        'Categories': [ad.get('category') for ad in ads],
+        'Bitsets': bitsets,
+        'Postings': postings
+    }
+
+class AdCatalog(object):
+    def __init__(self, compiled, minhash_bands=0, minhash_rows=4, seed=0):
+        self.urls = compiled['Urls']
+        self.vocabulary = LabelVocabulary()
+        for name in compiled['Names']:
+            self.vocabulary.label_id(name)
+        self.bitsets = compiled['Bitsets']
+        # Ads of the same category are kept apart by the batch ad decision
+        self.categories = compiled.get('Categories') or [None] * len(self.urls)
+        # Inverted index from label id to the ads having that label
+        self.postings = dict(enumerate(compiled['Postings']))
+        # Label ids and names of every ad
+        ad_ids = [[] for _ in self.urls]
+        for label_id, ad_indexes in self.postings.items():
+            for i in ad_indexes:
+                ad_ids[i].append(label_id)
+        self.ad_labels = [[self.vocabulary.names[label_id] for label_id in ids] for ids in ad_ids]
+        # Label count of every ad from its postings, popcount of wide bitsets
+        # is most of the time spent indexing a large catalog
+        self.label_counts = [len(ids) for ids in ad_ids]
+        # Optional MinHash/LSH tables for approximate top-1 on large catalogs
+        self.minhash_rows = minhash_rows
+        self.hashes = []
+        self.label_hashes = {}
+        self.lsh_tables = []
+        if minhash_bands > 0:
+            rng = random.Random(seed)
+            self.hashes = [(rng.randrange(1, MINHASH_PRIME), rng.randrange(MINHASH_PRIME))
+                           for _ in range(minhash_bands * minhash_rows)]
+            self.lsh_tables = [{} for _ in range(minhash_bands)]
+            for i, ids in enumerate(ad_ids):
+                for table, band in zip(self.lsh_tables, self.__bands(ids)):
+                    table.setdefault(band, []).append(i)
+
+    def ad(self, i):
+        return {
+            'url': self.urls[i],
+            'labels': self.ad_labels[i]
+        }
+
+    def select(self, labels, rng=random):
+        # Returns the most similar ad and its similarity, or a random ad when
+        # no ad shares a label with the slot
+        # Labels no ad has are only counted in the union, never added to the vocabulary
+        slot_bitset, unknown = self.vocabulary.lookup(labels)
+        candidates = self.candidates(labels)
+        if not candidates:
+            return self.ad(rng.randrange(len(self.urls))), 0.0
+        # Shuffle to break ties randomly
+        rng.shuffle(candidates)
+        similarities = [jaccard(slot_bitset, self.bitsets[i], unknown) for i in candidates]
+        top = max(range(len(candidates)), key=similarities.__getitem__)
+        return self.ad(candidates[top]), similarities[top]
+
+    def candidates(self, labels):
+        candidates = set()
+        if self.lsh_tables:
+            ids = [self.vocabulary.ids[name] for name in set(labels) if name in self.vocabulary.ids]
+            for table, band in zip(self.lsh_tables, self.__bands(ids)):
+                candidates.update(table.get(band, ()))
+            if candidates:
+                return sorted(candidates)
+        for name in set(labels):
+            if name in self.vocabulary.ids:
+                candidates.update(self.postings.get(self.vocabulary.ids[name], ()))
+        return sorted(candidates)
+
+    def __bands(self, ids):
+        if not ids:
+            return []
+        # Hash values are computed once per label and reduced per signature position
+        for x in ids:
+            if x not in self.label_hashes:
+                self.label_hashes[x] = [(a * x + b) % MINHASH_PRIME for a, b in self.hashes]
+        signature = [min(values) for values in zip(*[self.label_hashes[x] for x in ids])]
+        rows = self.minhash_rows
+        return [tuple(signature[i:i + rows]) for i in range(0, len(signature), rows)]
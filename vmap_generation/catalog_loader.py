@@ -0,0 +1,104 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import json
+
+from botocore.exceptions import ClientError
+
+from catalog import AdCatalog, compile_ads
+
+# Compiled catalogs (in S3 and in /tmp) are JSON documents: no code runs when
+# loading one, whoever wrote it. Cold starts still parse the cached document,
+# which is about a quarter of loading a large catalog, the rest is decoding
+# bitsets and indexing (tests/benchmarks/bench_catalog_load.py)
+COMPILED_FORMAT = 'compiled-ads-catalog/1'
+
+class CatalogLoader(object):
+    # Keeps the compiled catalog in memory and in /tmp, and revalidates it
+    # against the S3 object ETag on every get()
+    def __init__(self, s3, bucket, key, cache_path, **catalog_options):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.cache_path = cache_path
+        self.catalog_options = catalog_options
+        self.etag = None
+        self.catalog = None
+
+    def get(self):
+        if self.catalog is None:
+            self.__read_cache()
+        params = {'Bucket': self.bucket, 'Key': self.key}
+        if self.etag is not None:
+            params['IfNoneMatch'] = self.etag
+        try:
+            response = self.s3.get_object(**params)
+        except ClientError as error:
+            status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            if status == 304:
+                return self.catalog
+            if self.catalog is None:
+                raise
+            # Serving the last good catalog when S3 can't be reached
+            print('Unable to revalidate ads catalog, using ETag {}: {}'.format(self.etag, error))
+            return self.catalog
+        print('Compiling ads catalog s3://{}/{} (ETag {})'.format(self.bucket, self.key, response['ETag']))
+        compiled = load_compiled(response['Body'].read())
+        self.catalog = AdCatalog(compiled, **self.catalog_options)
+        self.etag = response['ETag']
+        self.__write_cache(compiled)
+        return self.catalog
+
+    def __read_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                cached = json.load(cache_file)
+            if cached['Bucket'] != self.bucket or cached['Key'] != self.key:
+                return
+            self.catalog = AdCatalog(decode_compiled(cached['Compiled']), **self.catalog_options)
+            self.etag = cached['ETag']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            print('No compiled ads catalog in {}: {}'.format(self.cache_path, error))
+
+    def __write_cache(self, compiled):
+        cached = {'Bucket': self.bucket, 'Key': self.key, 'ETag': self.etag, 'Compiled': encode_compiled(compiled)}
+        # Writing to a temporary file first so a concurrent reader never sees a partial catalog
+        tmp_path = '{}.{}'.format(self.cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(cached, cache_file, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as error:
+            print('Unable to write compiled ads catalog to {}: {}'.format(self.cache_path, error))
+
+def load_compiled(data):
+    # Ads catalogs ({"ads": [...]}) are compiled on load, compiled catalogs
+    # are only decoded
+    document = json.loads(data)
+    if 'ads' in document:
+        return compile_ads(document['ads'])
+    return decode_compiled(document)
+
+def encode_compiled(compiled):
+    # Bitsets are written in hex, which parses in linear time at any size
+    encoded = dict(compiled, Bitsets=[format(bits, 'x') for bits in compiled['Bitsets']])
+    encoded['Format'] = COMPILED_FORMAT
+    return encoded
+
+def decode_compiled(encoded):
+    if encoded.get('Format') != COMPILED_FORMAT:
+        raise ValueError('Unsupported compiled ads catalog format: {}'.format(encoded.get('Format')))
+    compiled = {key: value for key, value in encoded.items() if key != 'Format'}
+    compiled['Bitsets'] = [int(bits, 16) for bits in encoded['Bitsets']]
+    return compiled
+
+if __name__ == '__main__':
+    # Compiling a catalog ahead of time: python catalog_loader.py ads.json ads.catalog.json
+    with open(sys.argv[1]) as json_file:
+        compiled = compile_ads(json.load(json_file)['ads'])
+    with open(sys.argv[2], 'w') as catalog_file:
+        json.dump(encode_compiled(compiled), catalog_file, separators=(',', ':'))
@@ -0,0 +1,60 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import OrderedDict
+
+from xml_writer import XMLWriter, escape_attribute
+
+# Per-break fields are rendered as NUL-delimited names, which cannot occur in XML
+FIELD_DELIMITER = "\x00"
+
+
+def placeholder(name):
+    return FIELD_DELIMITER + name + FIELD_DELIMITER
+
+
+class VASTFragment(object):
+    __slots__ = ("parts",)
+
+    def __init__(self, vast):
+        # Rendered markup split around its placeholders: even parts are
+        # static markup and odd parts are field names
+        self.parts = vast.writeTo(XMLWriter()).getstring().split(FIELD_DELIMITER)
+
+    def bind(self, fields):
+        parts = list(self.parts)
+        # Fields can be attribute values, so whitespace is escaped as well
+        for i in range(1, len(parts), 2):
+            parts[i] = escape_attribute(fields[parts[i]])
+        return SplicedVAST("".join(parts))
+
+
+class SplicedVAST(object):
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content
+
+    def writeTo(self, writer):
+        return writer.raw(self.content)
+
+
+class FragmentCache(object):
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        if key in self.fragments:
+            self.hits += 1
+            self.fragments.move_to_end(key)
+            return self.fragments[key]
+        self.misses += 1
+        fragment = render()
+        self.fragments[key] = fragment
+        # Evicting the least recently used fragment
+        if len(self.fragments) > self.max_size:
+            self.fragments.popitem(last=False)
+        return fragment
@@ -37,11 +37,16 @@ def validateWrapperSettings(settings):
 
 
 class Ad(object):
+    __slots__ = ("errors", "surveys", "impressions", "creatives", "VASTAdTagURI", "id", "sequence",
+                 "structure", "AdSystem", "AdTitle", "Error", "Description", "Advertiser", "Pricing",
+                 "Extensions")
+
     def __init__(self, settings={}):
         self.errors = []
         self.surveys = []
         self.impressions = []
         self.creatives = []
+        self.VASTAdTagURI = None
 
         if settings["structure"].lower() == 'wrapper':
             validateWrapperSettings(settings)
@@ -53,7 +58,7 @@ class Ad(object):
         self.sequence = settings.get("sequence", None)
         self.structure = settings["structure"]
         self.AdSystem = settings["AdSystem"]
-        self.AdTitle = settings["AdTitle"]
+        self.AdTitle = settings.get("AdTitle", None)
 
         # optional elements
         self.Error = settings.get("Error", None)
@@ -76,4 +81,12 @@ class Ad(object):
     def attachCreative(self, _type, options):
         creative = Creative(_type, options)
         self.creatives.append(creative)
-        return creative
\ No newline at end of file
+        return creative
+
+    def freeze(self):
+        self.errors = tuple(self.errors)
+        self.surveys = tuple(self.surveys)
+        self.impressions = tuple(self.impressions)
+        self.creatives = tuple(self.creatives)
+        for creative in self.creatives:
+            creative.freeze()
@@ -19,6 +19,9 @@ from vast_xml.trackingevent import TrackingEvent
 
 
 class CompanionAd(object):
+    __slots__ = ("resource", "type", "url", "AdParameters", "AltText", "CompanionClickThrough",
+                 "CompanionClickTracking", "width", "height", "trackingEvents")
+
     def __init__(self, resource, settings={}):
         self.resource = resource
         self.type = settings.get("type", None)
@@ -32,4 +35,7 @@ class CompanionAd(object):
         self.trackingEvents = []
 
     def attachTrackingEvent(self, type, url):
-        self.trackingEvents.append(TrackingEvent(type, url))
\ No newline at end of file
+        self.trackingEvents.append(TrackingEvent(type, url))
+
+    def freeze(self):
+        self.trackingEvents = tuple(self.trackingEvents)
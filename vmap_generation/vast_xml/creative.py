@@ -15,13 +15,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import namedtuple
+
 from vast_xml.icon import Icon
 from vast_xml.trackingevent import TrackingEvent
 
 VALID_VIDEO_CLICKS = ['ClickThrough', 'ClickTracking', 'CustomClick']
 
+MediaFile = namedtuple("MediaFile", ("url", "attributes"))
+
 
 class Creative(object):
+    __slots__ = ("type", "mediaFiles", "trackingEvents", "videoClicks", "clickThroughs", "clicks",
+                 "resources", "icons", "AdParameters", "_adParameters", "attributes", "duration",
+                 "skipoffset", "nonLinearClickThrough", "nonLinearClickTracking")
+
     def __init__(self, _type, settings=None):
         settings = {} if settings is None else settings
         self.type = _type
@@ -64,30 +72,29 @@ class Creative(object):
             self.attributes["apiFramework"] = settings["apiFramework"]
 
     def attachMediaFile(self, url, settings={}):
-        media_file = {"attributes": {}}
-        media_file["url"] = url
-        media_file["attributes"]["type"] = settings.get("type", 'video/mp4')
-        media_file["attributes"]["width"] = settings.get("width", '640')
-        media_file["attributes"]["height"] = settings.get("height", '360')
-        media_file["attributes"]["delivery"] = settings.get("delivery", 'progressive')
+        media_file = MediaFile(url, {})
+        media_file.attributes["type"] = settings.get("type", 'video/mp4')
+        media_file.attributes["width"] = settings.get("width", '640')
+        media_file.attributes["height"] = settings.get("height", '360')
+        media_file.attributes["delivery"] = settings.get("delivery", 'progressive')
         if "id" not in settings:
             raise Exception('an `id` is required for all media files')
 
-        media_file["attributes"]["id"] = settings["id"]
+        media_file.attributes["id"] = settings["id"]
         if "bitrate" in settings:
-            media_file["attributes"]["bitrate"] = settings["bitrate"]
+            media_file.attributes["bitrate"] = settings["bitrate"]
         if "minBitrate" in settings:
-            media_file["attributes"]["minBitrate"] = settings["minBitrate"]
+            media_file.attributes["minBitrate"] = settings["minBitrate"]
         if "maxBitrate" in settings:
-            media_file["attributes"]["maxBitrate"] = settings["maxBitrate"]
+            media_file.attributes["maxBitrate"] = settings["maxBitrate"]
         if "scalable" in settings:
-            media_file["attributes"]["scalable"] = settings["scalable"]
+            media_file.attributes["scalable"] = settings["scalable"]
         if "codec" in settings:
-            media_file["attributes"]["codec"] = settings["codec"]
+            media_file.attributes["codec"] = settings["codec"]
         if "apiFramework" in settings:
-            media_file["attributes"]["apiFramework"] = settings["apiFramework"]
+            media_file.attributes["apiFramework"] = settings["apiFramework"]
         if "maintainAspectRatio" in settings:
-            media_file["attributes"]["maintainAspectRatio"] = settings["maintainAspectRatio"]
+            media_file.attributes["maintainAspectRatio"] = settings["maintainAspectRatio"]
 
         self.mediaFiles.append(media_file)
         return self
@@ -134,4 +141,15 @@ class Creative(object):
         self.nonLinearClickThrough = url
 
     def attachNonLinearClickTracking(self, url):
-        self.nonLinearClickTracking = url
\ No newline at end of file
+        self.nonLinearClickTracking = url
+
+    def freeze(self):
+        # Children are only appended while building, a serialized creative
+        # keeps them in tuples
+        self.mediaFiles = tuple(self.mediaFiles)
+        self.trackingEvents = tuple(self.trackingEvents)
+        self.videoClicks = tuple(self.videoClicks)
+        self.clickThroughs = tuple(self.clickThroughs)
+        self.clicks = tuple(self.clicks)
+        self.resources = tuple(self.resources)
+        self.icons = tuple(self.icons)
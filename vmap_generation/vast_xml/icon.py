@@ -19,6 +19,8 @@ REQURED_ATTRIBUTES = ["program", "width", "height", "xPosition", "yPosition"]
 
 
 class Icon(object):
+    __slots__ = ("attributes", "resource", "clickThrough", "click", "view")
+
     def __init__(self, settings=dict()):
         keys = settings.keys()
         for required in keys:
@@ -39,6 +39,8 @@ VALID_TRACKING_EVENT_TYPES = [
 
 
 class TrackingEvent(object):
+    __slots__ = ("offset", "event", "url")
+
     def __init__(self, event, url, offset=None):
         self.offset = None
         self.event = None
@@ -17,9 +17,15 @@
 
 from vast_xml.ad import Ad
 from xml.dom.minidom import Document
+from xml_writer import XMLWriter
+
+# Linear creatives carry vmap:TrackingEvents, so standalone documents declare it
+VMAP_NAMESPACE = "http://www.iab.net/videosuite/vmap"
 
 
 class VAST(object):
+    __slots__ = ("ads", "version", "VASTErrorURI")
+
     def __init__(self, settings={}):
         self.ads = []
         self.version = settings.get("version", "3.0")
@@ -30,14 +36,151 @@ class VAST(object):
         self.ads.append(ad)
         return ad
 
+    def freeze(self):
+        # Opt-in, for documents that are done being built: their lists of
+        # children become tuples, and attaching more of them fails
+        self.ads = tuple(self.ads)
+        for ad in self.ads:
+            ad.freeze()
+
     def xml(self):
         doc = Document()
-        doc.appendChild(self.toElement(doc))
+        doc.appendChild(self.toElement(doc, standalone=True))
         return doc.toxml('utf-8')
 
-    def toElement(self, doc):
+    def serialize(self):
+        writer = XMLWriter().declaration('utf-8')
+        self.writeTo(writer, standalone=True)
+        return writer.getvalue('utf-8')
+
+    def writeTo(self, writer, standalone=False):
+        attributes = {"version": self.version}
+        if standalone:
+            attributes["xmlns:vmap"] = VMAP_NAMESPACE
+        writer.start("VAST", attributes)
+        if len(self.ads) == 0 and self.VASTErrorURI:
+            writer.element("Error", cdata=self.VASTErrorURI)
+            return writer.end("VAST")
+        for ad in self.ads:
+            wrapper = ad.structure.lower() == "wrapper"
+            writer.start("Ad")
+            writer.start("Wrapper" if wrapper else "InLine")
+            writer.element("AdSystem", text=ad.AdSystem["name"])
+            if wrapper:
+                writer.element("VASTAdTagURI", cdata=ad.VASTAdTagURI)
+            else:
+                writer.element("AdTitle", text=ad.AdTitle)
+                writer.element("Description", cdata=ad.Description or "")
+                for survey in ad.surveys:
+                    writer.element("Survey", {"type": survey["type"]} if survey.get("type") else None, cdata=survey["url"])
+            if ad.Error:
+                writer.element("Error", cdata=ad.Error)
+            for impression in ad.impressions:
+                writer.element("Impression", cdata=impression.get("url"))
+
+            # Wrappers only carry creatives when they add tracking to them
+            if wrapper and len(ad.creatives) == 0:
+                writer.end("Wrapper")
+                writer.end("Ad")
+                continue
+            writer.start("Creatives")
+            linearCreatives = [c for c in ad.creatives if c.type == "Linear"]
+            nonLinearCreatives = [c for c in ad.creatives if c.type == "NonLinear"]
+            companionAdCreatives = [c for c in ad.creatives if c.type == "CompanionAd"]
+            for creative in linearCreatives:
+                writer.start("Creative")
+                writer.start("Linear", {"skipoffset": creative.skipoffset} if creative.skipoffset else None)
+                if len(creative.icons) > 0:
+                    writer.start("Icons")
+                    for icon in creative.icons:
+                        writer.start("Icon", icon.attributes)
+                        writer.element(icon.resource["type"], self.__creativeType(icon.resource), cdata=icon.resource["uri"])
+                        if icon.click or icon.clickThrough:
+                            writer.start("IconClicks")
+                            if icon.clickThrough:
+                                writer.element("IconClickThrough", cdata=icon.clickThrough)
+                            if icon.click:
+                                writer.element("IconClickTracking", cdata=icon.click)
+                            writer.end("IconClicks")
+                        if icon.view:
+                            writer.element("IconViewTracking", cdata=icon.view)
+                        writer.end("Icon")
+                    writer.end("Icons")
+                writer.element("Duration", text=creative.duration)
+                writer.start("vmap:TrackingEvents")
+                for event in creative.trackingEvents:
+                    attributes = {"event": event.event}
+                    if event.offset:
+                        attributes["offset"] = event.offset
+                    writer.element("vmap:Tracking", attributes, cdata=event.url)
+                writer.end("vmap:TrackingEvents")
+                if creative.AdParameters:
+                    writer.element("AdParameters", {"xmlEncoded": creative.AdParameters["xmlEncoded"]},
+                                   text=creative.AdParameters["data"])
+                if len(creative.videoClicks) > 0:
+                    writer.start("VideoClicks")
+                    for click in creative.videoClicks:
+                        writer.element(click["type"], {"id": click.get("id", "")}, cdata=click["url"])
+                    writer.end("VideoClicks")
+                writer.start("MediaFiles")
+                for media in creative.mediaFiles:
+                    writer.element("MediaFile", media.attributes, cdata=media.url)
+                writer.end("MediaFiles")
+                writer.end("Linear")
+                writer.end("Creative")
+
+            for creative in nonLinearCreatives:
+                writer.start("Creative")
+                writer.start("NonLinearAds")
+                writer.start("NonLinear", creative.attributes)
+                for resource in creative.resources:
+                    writer.element(resource["type"], self.__creativeType(resource), cdata=resource["uri"])
+                for click in creative.clicks:
+                    writer.element(click["type"], cdata=click["uri"])
+                if creative.AdParameters:
+                    writer.element("AdParameters", {"xmlEncoded": creative.AdParameters["xmlEncoded"]},
+                                   text=creative.AdParameters["data"])
+                if creative.nonLinearClickThrough:
+                    writer.element("NonLinearClickThrough", cdata=creative.nonLinearClickThrough)
+                if creative.nonLinearClickTracking:
+                    writer.element("NonLinearClickTracking", cdata=creative.nonLinearClickTracking)
+                writer.end("NonLinear")
+                writer.end("NonLinearAds")
+                writer.end("Creative")
+
+            if len(companionAdCreatives) > 0:
+                writer.start("CompanionAds")
+                for creative in companionAdCreatives:
+                    writer.start("Companion", creative.attributes)
+                    # toElement repeats resources and clicks once per attribute
+                    for _ in creative.attributes:
+                        for resource in creative.resources:
+                            writer.element(resource["type"], self.__creativeType(resource), cdata=resource["uri"])
+                            if "adParameters" in resource:
+                                writer.element("AdParameters", {"xmlEncoded": resource["adParameters"]["xmlEncoded"]},
+                                               text=resource["adParameters"]["data"])
+                        for click in creative.clickThroughs:
+                            writer.element("CompanionClickThrough", cdata=click)
+                        if creative.nonLinearClickTracking:
+                            writer.element("CompanionClickTracking", cdata=creative.nonLinearClickTracking)
+                    writer.end("Companion")
+                writer.end("CompanionAds")
+
+            writer.end("Creatives")
+            writer.end("Wrapper" if wrapper else "InLine")
+            writer.end("Ad")
+        return writer.end("VAST")
+
+    def __creativeType(self, resource):
+        if "creativeType" in resource:
+            return {"creativeType": resource["creativeType"]}
+        return None
+
+    def toElement(self, doc, standalone=False):
         vastElement = doc.createElement("VAST")
         vastElement.setAttribute("version", self.version)
+        if standalone:
+            vastElement.setAttribute("xmlns:vmap", VMAP_NAMESPACE)
         if len(self.ads) == 0 and self.VASTErrorURI:
             errorElement = doc.createElement("Error")
             errorElement.appendChild(doc.createCDATASection(self.VASTErrorURI))
@@ -51,25 +194,31 @@ class VAST(object):
             adElement = doc.createElement("Ad")
             vastElement.appendChild(adElement)
 
-            inLineElement = doc.createElement("InLine")
+            wrapper = ad.structure.lower() == "wrapper"
+            inLineElement = doc.createElement("Wrapper" if wrapper else "InLine")
             adSystemElement = doc.createElement("AdSystem")
             adSystemElement.appendChild(doc.createTextNode(ad.AdSystem["name"]))
             inLineElement.appendChild(adSystemElement)
 
-            adTitleElement = doc.createElement("AdTitle")
-            adTitleElement.appendChild(doc.createTextNode(ad.AdTitle))
-            inLineElement.appendChild(adTitleElement)
+            if wrapper:
+                adTagURIElement = doc.createElement("VASTAdTagURI")
+                adTagURIElement.appendChild(doc.createCDATASection(ad.VASTAdTagURI))
+                inLineElement.appendChild(adTagURIElement)
+            else:
+                adTitleElement = doc.createElement("AdTitle")
+                adTitleElement.appendChild(doc.createTextNode(ad.AdTitle))
+                inLineElement.appendChild(adTitleElement)
 
-            descriptionElement = doc.createElement("Description")
-            descriptionElement.appendChild(doc.createCDATASection(ad.Description or ""))
-            inLineElement.appendChild(descriptionElement)
+                descriptionElement = doc.createElement("Description")
+                descriptionElement.appendChild(doc.createCDATASection(ad.Description or ""))
+                inLineElement.appendChild(descriptionElement)
 
-            for survey in ad.surveys:
-                surveyElement = doc.createElement("Survey")
-                if survey.type:
-                    surveyElement.setAttribute("type", survey.type)
-                surveyElement.appendChild(doc.createCDATASection(survey.url))
-                inLineElement.appendChild(surveyElement)
+                for survey in ad.surveys:
+                    surveyElement = doc.createElement("Survey")
+                    if survey.type:
+                        surveyElement.setAttribute("type", survey.type)
+                    surveyElement.appendChild(doc.createCDATASection(survey.url))
+                    inLineElement.appendChild(surveyElement)
 
             if ad.Error:
                 errorElement = doc.createElement("Error")
@@ -142,8 +291,8 @@ class VAST(object):
                 mediaFilesElement = doc.createElement("MediaFiles")
                 for media in creative.mediaFiles:
                     mediaFileElement = doc.createElement("MediaFile")
-                    mediaFileElement.appendChild(doc.createCDATASection(media["url"]))
-                    for key, value in media["attributes"].items():
+                    mediaFileElement.appendChild(doc.createCDATASection(media.url))
+                    for key, value in media.attributes.items():
                         mediaFileElement.setAttribute(key, value)
                     mediaFilesElement.appendChild(mediaFileElement)
                 linearElement.appendChild(mediaFilesElement)
@@ -211,6 +360,7 @@ class VAST(object):
                     companionAdsElement.appendChild(companionElement)
                 creativesElement.appendChild(companionAdsElement)
 
-            inLineElement.appendChild(creativesElement)
+            if not wrapper or len(ad.creatives) > 0:
+                inLineElement.appendChild(creativesElement)
             adElement.appendChild(inLineElement)
         return vastElement
@@ -0,0 +1,59 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import json
+import hashlib
+import posixpath
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_TYPE = 'application/xml'
+# Versioned objects never change, the manifest and the unversioned VMAP do
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+MANIFEST_FILE = 'manifest.json'
+
+def write_variants(s3, bucket, key, content):
+    # Writes the VMAP as content-hashed identity, gzip and brotli objects next
+    # to `key`, then the manifest pointing to that version, and returns it
+    version = hashlib.sha256(content).hexdigest()[:16]
+    prefix, name = posixpath.split(key)
+    stem, extension = posixpath.splitext(name)
+    versioned_key = posixpath.join(prefix, '{}.{}{}'.format(stem, version, extension))
+    manifest = {
+        'Version': version,
+        'ContentType': CONTENT_TYPE,
+        'Size': len(content),
+        'Variants': {}
+    }
+    encodings = [('identity', '', content), ('gzip', '.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        encodings.append(('br', '.br', brotli.compress(content, quality=11)))
+    else:
+        print('brotli is not installed, skipping the br variant')
+    for encoding, suffix, body in encodings:
+        params = {
+            'Body': body,
+            'Bucket': bucket,
+            'Key': versioned_key + suffix,
+            'ContentType': CONTENT_TYPE,
+            'CacheControl': IMMUTABLE_CACHE_CONTROL
+        }
+        if encoding != 'identity':
+            params['ContentEncoding'] = encoding
+        s3.put_object(**params)
+        manifest['Variants'][encoding] = {'Key': versioned_key + suffix, 'Size': len(body)}
+        print('vmap {} variant: {} bytes'.format(encoding, len(body)))
+    # The manifest is written last so it only points to complete versions
+    s3.put_object(
+        Body=json.dumps(manifest).encode('utf-8'),
+        Bucket=bucket,
+        Key=posixpath.join(prefix, MANIFEST_FILE),
+        ContentType='application/json',
+        CacheControl='no-cache'
+    )
+    return manifest
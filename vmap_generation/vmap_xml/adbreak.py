@@ -15,12 +15,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import namedtuple
+
 from vmap_xml.events import TrackingEvent
 
 REQURED_ATTRIBUTES = ("timeOffset", "breakType")
 BREAK_TYPES = ("linear", "nonlinear", "display")
 
+AdSource = namedtuple("AdSource", ("id", "allowMultipleAds", "followRedirects", "type", "attributes", "source"))
+
 class AdBreak(object):
+    __slots__ = ("attributes", "trackingEvents", "adSource")
+
     def __init__(self, settings={}):
         self.attributes = {}
         self.trackingEvents = []
@@ -44,14 +50,13 @@ class AdBreak(object):
     def attachAdSource(self, _id, allow_mutiple_ads, follow_redirects, _type,  source, attributes={}):
         if _type != 'VASTAdData' and "templateType" not in attributes:
             raise Exception("templateType required by {type}".format(type=_type))
-        source = dict(_id=_id,
-                      allow_mutiple_ads=allow_mutiple_ads,
-                      follow_redirects=follow_redirects,
-                      attributes=attributes,
-                      source=source,
-                      type=_type
-        )
-        self.adSource = source
+        self.adSource = AdSource(_id, allow_mutiple_ads, follow_redirects, _type, attributes, source)
 
     def attachEvent(self, event, url):
         self.trackingEvents.append(TrackingEvent(event, url))
+
+    def freeze(self):
+        self.trackingEvents = tuple(self.trackingEvents)
+        # VAST ad data, or the URI of an ad tag
+        if self.adSource is not None and hasattr(self.adSource.source, "freeze"):
+            self.adSource.source.freeze()
@@ -22,6 +22,8 @@ VALID_TRACKING_EVENT_TYPES = [
 ]
 
 class TrackingEvent(object):
+    __slots__ = ("event", "url")
+
     def __init__(self, event, url):
         if event not in VALID_TRACKING_EVENT_TYPES:
             raise Exception("""The supplied Tracking `event` {event} is not a valid Tracking event.
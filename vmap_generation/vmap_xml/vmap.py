@@ -17,9 +17,12 @@
 
 from vmap_xml.adbreak import AdBreak
 from xml.dom.minidom import Document
+from xml_writer import XMLWriter
 
 
 class VMAP(object):
+    __slots__ = ("adBreaks", "version")
+
     def __init__(self, settings={}, version="1.0"):
         self.adBreaks = []
         self.version = version
@@ -29,38 +32,77 @@ class VMAP(object):
         self.adBreaks.append(adBreak)
         return adBreak
 
+    def freeze(self):
+        # Opt-in, for documents that are done being built: their lists of
+        # children become tuples, and attaching more of them fails
+        self.adBreaks = tuple(self.adBreaks)
+        for adBreak in self.adBreaks:
+            adBreak.freeze()
+
     def xml(self):
         doc = Document()
         doc.appendChild(self.toElement(doc))
         return doc.toxml('utf-8')
 
+    def serialize(self):
+        writer = XMLWriter().declaration('utf-8')
+        self.writeTo(writer)
+        return writer.getvalue('utf-8')
+
+    def writeTo(self, writer):
+        writer.start("vmap:VMAP", {"version": self.version, "xmlns:vmap": "http://www.iab.net/videosuite/vmap"})
+        for adBreak in self.adBreaks:
+            _type = adBreak.adSource.type
+            writer.start("vmap:AdBreak", adBreak.attributes)
+            writer.start("vmap:AdSource", {
+                "id": adBreak.adSource.id,
+                "allowMultipleAds": adBreak.adSource.allowMultipleAds,
+                "followRedirects": adBreak.adSource.followRedirects
+            })
+            writer.start("vmap:{type}".format(type=_type), adBreak.adSource.attributes)
+            if _type == "VASTAdData":
+                adBreak.adSource.source.writeTo(writer)
+            elif _type == 'AdTagURI':
+                writer.cdata(adBreak.adSource.source)
+            writer.end("vmap:{type}".format(type=_type))
+            writer.end("vmap:AdSource")
+
+            if len(adBreak.trackingEvents) > 0:
+                writer.start("vmap:TrackingEvents")
+                for event in adBreak.trackingEvents:
+                    writer.element("vmap:Tracking", {"event": event.event}, cdata=event.url)
+                writer.end("vmap:TrackingEvents")
+            writer.end("vmap:AdBreak")
+        writer.end("vmap:VMAP")
+        return writer
+
     def toElement(self, doc):
         vmapElement = doc.createElementNS('http://www.iab.net/videosuite/vmap', 'vmap:VMAP')
         vmapElement.setAttribute("version", self.version)
         vmapElement.setAttribute("xmlns:vmap", "http://www.iab.net/videosuite/vmap")
         for adBreak in self.adBreaks:
-            _type = adBreak.adSource["type"]
+            _type = adBreak.adSource.type
             adBreakElement = doc.createElementNS("http://www.iab.net/videosuite/vmap", "vmap:AdBreak")
             for key, value in adBreak.attributes.items():
                 adBreakElement.setAttribute(key, value)
             vmapElement.appendChild(adBreakElement)
 
             adSourceElement = doc.createElementNS("http://www.iab.net/videosuite/vmap", "vmap:AdSource")
-            adSourceElement.setAttribute("id", adBreak.adSource["_id"])
-            adSourceElement.setAttribute("allowMultipleAds", adBreak.adSource["allow_mutiple_ads"])
-            adSourceElement.setAttribute("followRedirects", adBreak.adSource["follow_redirects"])
+            adSourceElement.setAttribute("id", adBreak.adSource.id)
+            adSourceElement.setAttribute("allowMultipleAds", adBreak.adSource.allowMultipleAds)
+            adSourceElement.setAttribute("followRedirects", adBreak.adSource.followRedirects)
             adBreakElement.appendChild(adSourceElement)
             
             adTypedElement = doc.createElementNS("http://www.iab.net/videosuite/vmap", "vmap:{type}".format(type=_type))
-            for key, value in adBreak.adSource["attributes"].items():
+            for key, value in adBreak.adSource.attributes.items():
                 adTypedElement.setAttribute(key, value)
             adSourceElement.appendChild(adTypedElement)
 
             if _type == "VASTAdData":
-                vastElement = adBreak.adSource["source"].toElement(doc)
+                vastElement = adBreak.adSource.source.toElement(doc)
                 adTypedElement.appendChild(vastElement)
             elif _type == 'AdTagURI':
-                adTypedElement.appendChild(doc.createCDATASection(adBreak.adSource["source"]))
+                adTypedElement.appendChild(doc.createCDATASection(adBreak.adSource.source))
 
             if len(adBreak.trackingEvents) > 0:
                 trackingEventsElement = doc.createElementNS("http://www.iab.net/videosuite/vmap", "vmap:TrackingEvents")
@@ -0,0 +1,78 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Writes the same markup as xml.dom.minidom's toxml() without building a DOM,
+# except for whitespace in attribute values, which is written as character
+# references (as minidom does from Python 3.13) so parsers don't normalize it.
+# On the python3.9 runtime, VMAP_SERIALIZER=minidom writes it as is instead
+
+
+def escape(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def escape_attribute(data):
+    return escape(data).replace("\r", "&#13;").replace("\n", "&#10;").replace("\t", "&#9;")
+
+
+class XMLWriter(object):
+    def __init__(self):
+        self.parts = []
+        self.open = False
+
+    def declaration(self, encoding="utf-8"):
+        self.parts.append('<?xml version="1.0" encoding="{}"?>'.format(encoding))
+        return self
+
+    def start(self, tag, attributes=None):
+        self.__close_start()
+        self.parts.append("<" + tag)
+        if attributes:
+            for key, value in attributes.items():
+                self.parts.append(' {}="{}"'.format(key, escape_attribute(value)))
+        self.open = True
+        return self
+
+    def end(self, tag):
+        if self.open:
+            self.parts.append("/>")
+            self.open = False
+        else:
+            self.parts.append("</{}>".format(tag))
+        return self
+
+    def text(self, data):
+        self.__close_start()
+        self.parts.append(escape(data))
+        return self
+
+    def cdata(self, data):
+        if data.find("]]>") >= 0:
+            raise ValueError("']]>' not allowed in a CDATA section")
+        self.__close_start()
+        self.parts.append("<![CDATA[{}]]>".format(data))
+        return self
+
+    def element(self, tag, attributes=None, text=None, cdata=None):
+        self.start(tag, attributes)
+        if text is not None:
+            self.text(text)
+        if cdata is not None:
+            self.cdata(cdata)
+        return self.end(tag)
+
+    def raw(self, data):
+        self.__close_start()
+        self.parts.append(data)
+        return self
+
+    def getstring(self):
+        return "".join(self.parts)
+
+    def getvalue(self, encoding="utf-8"):
+        return "".join(self.parts).encode(encoding, "xmlcharrefreplace")
+
+    def __close_start(self):
+        if self.open:
+            self.parts.append(">")
+            self.open = False